@@ -23,6 +23,8 @@ from backend.models.entry import Entry
 from backend.models.metric import Metric
 from backend.models.tag import Tag
 from backend.models.audit import AuditLog
+from backend.models.rollup import MetricDailyRollup, EntryDailyRollup
+from backend.models.user_stats import UserStats
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
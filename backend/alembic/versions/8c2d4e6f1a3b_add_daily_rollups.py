@@ -0,0 +1,90 @@
+"""add_daily_rollups
+
+Revision ID: 8c2d4e6f1a3b
+Revises: 3f7c01f0e405
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2d4e6f1a3b'
+down_revision: Union[str, None] = '3f7c01f0e405'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('metric_daily_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('metric_name', sa.String(length=100), nullable=False),
+    sa.Column('record_count', sa.Integer(), nullable=False),
+    sa.Column('value_sum', sa.Numeric(precision=20, scale=2), nullable=False),
+    sa.Column('value_min', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('value_max', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'day', 'category_id', 'metric_name', name='uq_metric_daily_rollup')
+    )
+    op.create_index(op.f('ix_metric_daily_rollups_id'), 'metric_daily_rollups', ['id'], unique=False)
+    op.create_table('entry_daily_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('entry_count', sa.Integer(), nullable=False),
+    sa.Column('tag_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'day', name='uq_entry_daily_rollup')
+    )
+    op.create_index(op.f('ix_entry_daily_rollups_id'), 'entry_daily_rollups', ['id'], unique=False)
+
+    # Backfill rollups from the existing raw records
+    op.execute("""
+        INSERT INTO metric_daily_rollups
+            (user_id, day, category_id, metric_name, record_count,
+             value_sum, value_min, value_max, created_at, updated_at)
+        SELECT entries.user_id, DATE(metrics.created_at), metrics.category_id,
+               metrics.metric_name, COUNT(metrics.id), SUM(metrics.value),
+               MIN(metrics.value), MAX(metrics.value),
+               CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM metrics
+        JOIN entries ON entries.id = metrics.entry_id
+        GROUP BY entries.user_id, DATE(metrics.created_at),
+                 metrics.category_id, metrics.metric_name
+    """)
+    op.execute("""
+        INSERT INTO entry_daily_rollups
+            (user_id, day, entry_count, tag_count, created_at, updated_at)
+        SELECT entries.user_id, DATE(entries.created_at), COUNT(entries.id),
+               COALESCE(SUM(tag_links.tag_count), 0),
+               CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM entries
+        LEFT JOIN (
+            SELECT entry_id, COUNT(tag_id) AS tag_count
+            FROM entry_tags
+            GROUP BY entry_id
+        ) tag_links ON tag_links.entry_id = entries.id
+        GROUP BY entries.user_id, DATE(entries.created_at)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_entry_daily_rollups_id'), table_name='entry_daily_rollups')
+    op.drop_table('entry_daily_rollups')
+    op.drop_index(op.f('ix_metric_daily_rollups_id'), table_name='metric_daily_rollups')
+    op.drop_table('metric_daily_rollups')
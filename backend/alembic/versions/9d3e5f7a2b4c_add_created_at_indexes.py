@@ -0,0 +1,30 @@
+"""add_created_at_indexes
+
+Revision ID: 9d3e5f7a2b4c
+Revises: 8c2d4e6f1a3b
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3e5f7a2b4c'
+down_revision: Union[str, None] = '8c2d4e6f1a3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_entries_user_id_created_at', 'entries', ['user_id', 'created_at'], unique=False)
+    op.create_index('ix_metrics_entry_id_created_at', 'metrics', ['entry_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_metrics_entry_id_created_at', table_name='metrics')
+    op.drop_index('ix_entries_user_id_created_at', table_name='entries')
@@ -0,0 +1,29 @@
+"""add_metric_rollup_checksums
+
+Revision ID: a2b4c6d8e0f1
+Revises: f1a3b5c7d9e0
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2b4c6d8e0f1'
+down_revision: Union[str, None] = 'f1a3b5c7d9e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rollups are filled in by: python -m backend.services.rollups
+    op.add_column('metric_daily_rollups', sa.Column('value_checksum', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('metric_daily_rollups', 'value_checksum')
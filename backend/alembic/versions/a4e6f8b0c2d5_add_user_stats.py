@@ -0,0 +1,59 @@
+"""add_user_stats
+
+Revision ID: a4e6f8b0c2d5
+Revises: 9d3e5f7a2b4c
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e6f8b0c2d5'
+down_revision: Union[str, None] = '9d3e5f7a2b4c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('entry_count', sa.Integer(), nullable=False),
+    sa.Column('category_count', sa.Integer(), nullable=False),
+    sa.Column('distinct_tag_count', sa.Integer(), nullable=False),
+    sa.Column('metric_count', sa.Integer(), nullable=False),
+    sa.Column('last_entry_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill counters for existing users
+    op.execute("""
+        INSERT INTO user_stats (
+            user_id, entry_count, category_count, distinct_tag_count,
+            metric_count, last_entry_at, created_at, updated_at
+        )
+        SELECT
+            u.id,
+            (SELECT COUNT(*) FROM entries e WHERE e.user_id = u.id),
+            (SELECT COUNT(*) FROM categories c WHERE c.user_id = u.id),
+            (SELECT COUNT(DISTINCT et.tag_id) FROM entry_tags et
+                JOIN entries e ON e.id = et.entry_id WHERE e.user_id = u.id),
+            (SELECT COUNT(*) FROM metrics m
+                JOIN entries e ON e.id = m.entry_id WHERE e.user_id = u.id),
+            (SELECT MAX(e.created_at) FROM entries e WHERE e.user_id = u.id),
+            CURRENT_TIMESTAMP,
+            CURRENT_TIMESTAMP
+        FROM users u
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_stats')
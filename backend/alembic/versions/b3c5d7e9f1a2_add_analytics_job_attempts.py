@@ -0,0 +1,28 @@
+"""add_analytics_job_attempts
+
+Revision ID: b3c5d7e9f1a2
+Revises: a2b4c6d8e0f1
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3c5d7e9f1a2'
+down_revision: Union[str, None] = 'a2b4c6d8e0f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('analytics_jobs', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('analytics_jobs', 'attempts')
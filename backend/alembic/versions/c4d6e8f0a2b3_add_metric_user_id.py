@@ -0,0 +1,41 @@
+"""add_metric_user_id
+
+Revision ID: c4d6e8f0a2b3
+Revises: b3c5d7e9f1a2
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d6e8f0a2b3'
+down_revision: Union[str, None] = 'b3c5d7e9f1a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('metrics', sa.Column('user_id', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE metrics SET user_id = (SELECT entries.user_id FROM entries WHERE entries.id = metrics.entry_id)"
+    )
+    with op.batch_alter_table('metrics', schema=None) as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key('fk_metrics_user_id_users', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    # User-wide keyset pages walk this index instead of every user's metrics by (created_at, id)
+    op.create_index('ix_metrics_user_id_created_at_id', 'metrics', ['user_id', 'created_at', 'id'], unique=False)
+    op.drop_index('ix_metrics_created_at_id', table_name='metrics')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_metrics_created_at_id', 'metrics', ['created_at', 'id'], unique=False)
+    op.drop_index('ix_metrics_user_id_created_at_id', table_name='metrics')
+    with op.batch_alter_table('metrics', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_metrics_user_id_users', type_='foreignkey')
+        batch_op.drop_column('user_id')
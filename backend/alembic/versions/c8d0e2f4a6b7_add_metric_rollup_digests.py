@@ -0,0 +1,29 @@
+"""add_metric_rollup_digests
+
+Revision ID: c8d0e2f4a6b7
+Revises: b7c9d1e3f5a6
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8d0e2f4a6b7'
+down_revision: Union[str, None] = 'b7c9d1e3f5a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rollups are filled in by: python -m backend.services.rollups
+    op.add_column('metric_daily_rollups', sa.Column('digest', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('metric_daily_rollups', 'digest')
@@ -0,0 +1,43 @@
+"""add_updated_at_indexes
+
+Revision ID: d9e1f3a5b7c8
+Revises: c8d0e2f4a6b7
+Create Date: 2026-10-16 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9e1f3a5b7c8'
+down_revision: Union[str, None] = 'c8d0e2f4a6b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Every table using TimestampMixin
+TABLES = (
+    'users',
+    'categories',
+    'entries',
+    'metrics',
+    'tags',
+    'audit_log',
+    'metric_daily_rollups',
+    'entry_daily_rollups',
+    'user_stats',
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.create_index(op.f(f'ix_{table}_updated_at'), table, ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.drop_index(op.f(f'ix_{table}_updated_at'), table_name=table)
@@ -0,0 +1,50 @@
+"""add_analytics_jobs
+
+Revision ID: e0f2a4b6c8d9
+Revises: d9e1f3a5b7c8
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e0f2a4b6c8d9'
+down_revision: Union[str, None] = 'd9e1f3a5b7c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('analytics_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.JSON(), nullable=False),
+    sa.Column('status', sa.Enum('pending', 'running', 'succeeded', 'failed', name='analytics_job_status'), nullable=False),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_analytics_jobs_id'), 'analytics_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_analytics_jobs_user_id'), 'analytics_jobs', ['user_id'], unique=False)
+    op.create_index(op.f('ix_analytics_jobs_updated_at'), 'analytics_jobs', ['updated_at'], unique=False)
+    op.create_index('ix_analytics_jobs_status_created_at', 'analytics_jobs', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_analytics_jobs_status_created_at', table_name='analytics_jobs')
+    op.drop_index(op.f('ix_analytics_jobs_updated_at'), table_name='analytics_jobs')
+    op.drop_index(op.f('ix_analytics_jobs_user_id'), table_name='analytics_jobs')
+    op.drop_index(op.f('ix_analytics_jobs_id'), table_name='analytics_jobs')
+    op.drop_table('analytics_jobs')
@@ -0,0 +1,42 @@
+"""add_keyset_pagination_indexes
+
+Revision ID: f1a3b5c7d9e0
+Revises: e0f2a4b6c8d9
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a3b5c7d9e0'
+down_revision: Union[str, None] = 'e0f2a4b6c8d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The (owner, created_at, id) indexes replace the (owner, created_at) ones; they are
+    # created first so the foreign keys on user_id and entry_id always keep an index
+    op.create_index('ix_entries_user_id_created_at_id', 'entries', ['user_id', 'created_at', 'id'], unique=False)
+    op.drop_index('ix_entries_user_id_created_at', table_name='entries')
+    op.create_index('ix_metrics_entry_id_created_at_id', 'metrics', ['entry_id', 'created_at', 'id'], unique=False)
+    op.drop_index('ix_metrics_entry_id_created_at', table_name='metrics')
+    op.create_index('ix_metrics_created_at_id', 'metrics', ['created_at', 'id'], unique=False)
+    op.create_index('ix_categories_user_id_created_at_id', 'categories', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_tags_created_at_id', 'tags', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tags_created_at_id', table_name='tags')
+    op.drop_index('ix_categories_user_id_created_at_id', table_name='categories')
+    op.drop_index('ix_metrics_created_at_id', table_name='metrics')
+    op.create_index('ix_metrics_entry_id_created_at', 'metrics', ['entry_id', 'created_at'], unique=False)
+    op.drop_index('ix_metrics_entry_id_created_at_id', table_name='metrics')
+    op.create_index('ix_entries_user_id_created_at', 'entries', ['user_id', 'created_at'], unique=False)
+    op.drop_index('ix_entries_user_id_created_at_id', table_name='entries')
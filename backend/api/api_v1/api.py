@@ -4,17 +4,24 @@ This file centralizes all API endpoints and organizes them by feature.
 It provides a clean interface for the frontend to interact with the backend services.
 """
 
-from fastapi import APIRouter
-from backend.api.api_v1.endpoints import auth, users, categories, entries, metrics, tags, analytics
+from fastapi import APIRouter, Depends
+from backend.api import deps
+from backend.api.api_v1.endpoints import auth, users, categories, entries, metrics, tags, analytics, analytics_jobs, charts
 
 # Create the main API router
 api_router = APIRouter()
 
+# GETs on user data answer 304 while the user's data version is unchanged
+versioned = [Depends(deps.check_data_version)]
+
 # Register all feature-specific routers with their respective prefixes and tags
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
-api_router.include_router(users.router, prefix="/users", tags=["users"])
-api_router.include_router(categories.router, prefix="/categories", tags=["categories"])
-api_router.include_router(entries.router, prefix="/entries", tags=["entries"])
-api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
-api_router.include_router(tags.router, prefix="/tags", tags=["tags"])
-api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"]) 
\ No newline at end of file
+api_router.include_router(users.router, prefix="/users", tags=["users"], dependencies=versioned)
+api_router.include_router(categories.router, prefix="/categories", tags=["categories"], dependencies=versioned)
+api_router.include_router(entries.router, prefix="/entries", tags=["entries"], dependencies=versioned)
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"], dependencies=versioned)
+api_router.include_router(tags.router, prefix="/tags", tags=["tags"], dependencies=versioned)
+# Job status changes without a data version change, so job polls are never answered 304
+api_router.include_router(analytics_jobs.router, prefix="/analytics/jobs", tags=["analytics"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"], dependencies=versioned) 
+api_router.include_router(charts.router, prefix="/charts", tags=["charts"], dependencies=versioned)
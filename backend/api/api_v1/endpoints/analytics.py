@@ -1,165 +1,574 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+import math
+from collections import defaultdict
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from datetime import datetime, timedelta
+from sqlalchemy import Float, case, func, desc, type_coerce
+from datetime import date, datetime, timedelta
 from backend.api import deps
+from backend.core.config import settings
 from backend.models.metric import Metric
 from backend.models.entry import Entry
 from backend.models.user import User
 from backend.models.category import Category
-from backend.models.tag import Tag, entry_tags
+from backend.models.rollup import MetricDailyRollup, EntryDailyRollup
 from backend.schemas.metric import MetricResponse
+from backend.services import analytics as analytics_engine
+from backend.services.cache import analytics_cache
+from backend.services.warmup import cache_warmer
+from backend.services import series, series_cache, downsample, statistics, buckets, user_stats, rollups, sketches, budgets
 
 router = APIRouter()
 
+def _check_comparison(compare: Optional[str], bounded: bool) -> None:
+    """Validate the compare parameter against the requested range."""
+    if compare is None:
+        return
+    if compare not in analytics_engine.COMPARISONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported comparison: {compare}")
+    if not bounded:
+        raise HTTPException(status_code=400, detail="compare=previous requires a bounded range")
+
+def _check_accuracy(accuracy: str) -> None:
+    """Validate the accuracy parameter."""
+    if accuracy not in analytics_engine.ACCURACIES:
+        raise HTTPException(status_code=400, detail=f"Unsupported accuracy: {accuracy}")
+
+def _estimated_summary_stats(r, rate: float) -> dict:
+    """
+    Summary statistics of one series estimated from sampled daily rollups.
+    Sampled days are clusters of records: the record total is scaled up and
+    the average is a ratio estimate, each with a normal confidence interval.
+    """
+    z = analytics_engine.CONFIDENCE_Z
+    records = float(r.total_records)
+    average = float(r.value_sum) / records
+    spread = (1 - rate) / rate ** 2
+    total_records = records / rate
+    total_half_width = z * math.sqrt(spread * float(r.count_squares))
+    residuals = max(
+        float(r.sum_squares) - 2 * average * float(r.cross_products) + average ** 2 * float(r.count_squares),
+        0.0
+    )
+    average_half_width = z * math.sqrt(spread * residuals) / total_records
+    return {
+        "avg_value": average,
+        "min_value": float(r.min_value),
+        "max_value": float(r.max_value),
+        "total_records": round(total_records),
+        "intervals": {
+            "avg_value": [average - average_half_width, average + average_half_width],
+            "total_records": [
+                max(round(records), round(total_records - total_half_width)),
+                round(total_records + total_half_width)
+            ]
+        }
+    }
+
+def _summary_stats(value_sum, min_value, max_value, total_records) -> Optional[dict]:
+    """Summary statistics of one series in one period, or None without records."""
+    if not total_records:
+        return None
+    return {
+        "avg_value": float(value_sum) / total_records,
+        "min_value": float(min_value),
+        "max_value": float(max_value),
+        "total_records": int(total_records)
+    }
+
+def _summary_distributions(db: Session, user_id: int, rows, split_day, bins: int, rate: float = 1.0) -> dict:
+    """
+    Merge the daily digests of each summary series into percentiles and
+    a histogram, keyed by (category, metric_name, in_current). Without a
+    split_day every day counts as current. Histograms of sampled days are
+    scaled up by the sampling rate.
+    """
+    digests = defaultdict(list)
+    for r in rows:
+        if r.digest is not None:
+            digest = sketches.TDigest.from_json(r.digest)
+        else:
+            # Rollup written before digests were kept
+            digest = rollups.day_digest(db, user_id, r.day, r.category_id, r.metric_name)
+        in_current = split_day is None or r.day >= split_day
+        digests[(r.category, r.metric_name, in_current)].append(digest)
+    distributions = {
+        key: sketches.describe(
+            sketches.TDigest.merge_all(series_digests, settings.METRIC_DIGEST_COMPRESSION), bins
+        )
+        for key, series_digests in digests.items()
+    }
+    if rate < 1:
+        for described in distributions.values():
+            histogram = described["histogram"]
+            histogram["counts"] = [round(count / rate) for count in histogram["counts"]]
+    return distributions
+
 @router.get("/metrics/summary", response_model=dict)
+@analytics_cache.cached("metrics_summary")
+@budgets.limited("metrics_summary", empty={"summary": []})
 def get_metrics_summary(
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_analytics_db),
     current_user: User = Depends(deps.get_current_active_user),
     metric_type: str = None,
     start_date: datetime = None,
     end_date: datetime = None,
+    compare: Optional[str] = None,
+    distribution: bool = False,
+    bins: int = Query(10, ge=1, le=100),
+    accuracy: str = "exact",
 ) -> Any:
     """
     Get summary statistics for metrics.
+    Metric types are categories, so metric_type filters by category name.
+    Reads the daily rollups, so the date filters apply per whole day.
+    With compare=previous (which requires start_date) each series also
+    gets the statistics of the preceding range of equal length and the
+    deltas against it, from one scan over both ranges.
+    With distribution=true each series (and its previous range) also gets
+    approximate p50/p90/p99 and a histogram of bins equal-width bins,
+    merged from the per-day quantile digests; the histogram's counts are
+    estimates too, which it states with "approximate": true.
+    With accuracy=approx (not combinable with compare) the statistics are
+    estimated from a deterministic sample of daily rollups holding about
+    ANALYTICS_APPROX_SAMPLE_SIZE records, with confidence intervals;
+    min_value and max_value are then the extremes of the sample.
     """
-    query = db.query(
-        Metric.metric_type,
-        Metric.metric_name,
-        func.avg(Metric.value).label('avg_value'),
-        func.min(Metric.value).label('min_value'),
-        func.max(Metric.value).label('max_value'),
-        func.count(Metric.id).label('total_records')
-    ).join(Entry).filter(Entry.user_id == current_user.id)
-
-    if metric_type:
-        query = query.filter(Metric.metric_type == metric_type)
-    if start_date:
-        query = query.filter(Metric.created_at >= start_date)
-    if end_date:
-        query = query.filter(Metric.created_at <= end_date)
-
-    results = query.group_by(Metric.metric_type, Metric.metric_name).all()
-    
+    _check_comparison(compare, bounded=start_date is not None)
+    _check_accuracy(accuracy)
+    if accuracy == "approx" and compare is not None:
+        raise HTTPException(status_code=400, detail="accuracy=approx does not support compare")
+
+    rate = 1.0
+    if accuracy == "approx":
+        # Sized from the records of the requested window, not the user's all-time count
+        rate = analytics_engine.sample_rate(
+            analytics_engine.metric_population(db, current_user.id, metric_type, start_date, end_date),
+            settings.ANALYTICS_APPROX_SAMPLE_SIZE
+        )
+
+    start_day = None
+    if compare is None:
+        query = db.query(
+            Category.name.label('category'),
+            MetricDailyRollup.metric_name,
+            func.sum(MetricDailyRollup.value_sum).label('value_sum'),
+            func.min(MetricDailyRollup.value_min).label('min_value'),
+            func.max(MetricDailyRollup.value_max).label('max_value'),
+            func.sum(MetricDailyRollup.record_count).label('total_records')
+        )
+        if rate < 1:
+            # Sums of squares and cross products for the interval estimates
+            count = MetricDailyRollup.record_count
+            value_sum = type_coerce(MetricDailyRollup.value_sum, Float)
+            query = query.add_columns(
+                func.sum(count * count).label('count_squares'),
+                func.sum(value_sum * value_sum).label('sum_squares'),
+                func.sum(value_sum * count).label('cross_products')
+            )
+    else:
+        # Whole days, so the previous range has the same number of days
+        start_day = start_date.date()
+        end_day = (end_date or datetime.utcnow()).date()
+        previous_start = start_day - (end_day - start_day) - timedelta(days=1)
+        in_current = MetricDailyRollup.day >= start_day
+
+        def current(column):
+            return case((in_current, column))
+
+        def previous(column):
+            return case((~in_current, column))
+
+        query = db.query(
+            Category.name.label('category'),
+            MetricDailyRollup.metric_name,
+            func.sum(current(MetricDailyRollup.value_sum)).label('value_sum'),
+            func.min(current(MetricDailyRollup.value_min)).label('min_value'),
+            func.max(current(MetricDailyRollup.value_max)).label('max_value'),
+            func.sum(current(MetricDailyRollup.record_count)).label('total_records'),
+            func.sum(previous(MetricDailyRollup.value_sum)).label('previous_value_sum'),
+            func.min(previous(MetricDailyRollup.value_min)).label('previous_min_value'),
+            func.max(previous(MetricDailyRollup.value_max)).label('previous_max_value'),
+            func.sum(previous(MetricDailyRollup.record_count)).label('previous_total_records')
+        )
+        start_date = datetime.combine(previous_start, datetime.min.time())
+
+    def scoped(query):
+        query = query.outerjoin(
+            Category, Category.id == MetricDailyRollup.category_id
+        ).filter(MetricDailyRollup.user_id == current_user.id)
+        if metric_type:
+            query = query.filter(Category.name == metric_type)
+        if start_date:
+            query = query.filter(MetricDailyRollup.day >= start_date.date())
+        if end_date:
+            query = query.filter(MetricDailyRollup.day <= end_date.date())
+        if rate < 1:
+            query = query.filter(analytics_engine.sampled(MetricDailyRollup.id, rate))
+        return query
+
+    results = scoped(query).group_by(Category.name, MetricDailyRollup.metric_name).all()
+
+    distributions = {}
+    if distribution:
+        digest_rows = scoped(db.query(
+            Category.name.label('category'),
+            MetricDailyRollup.category_id,
+            MetricDailyRollup.metric_name,
+            MetricDailyRollup.day,
+            MetricDailyRollup.digest
+        )).all()
+        distributions = _summary_distributions(db, current_user.id, digest_rows, start_day, bins, rate)
+
+    if compare is None:
+        summary = []
+        for r in results:
+            item = {"metric_type": r.category, "metric_name": r.metric_name}
+            if rate < 1:
+                item.update(_estimated_summary_stats(r, rate))
+            else:
+                item.update(_summary_stats(r.value_sum, r.min_value, r.max_value, r.total_records))
+            if distribution:
+                item.update(distributions[(r.category, r.metric_name, True)])
+            summary.append(item)
+        response = {"summary": summary}
+        if rate < 1:
+            response["approximation"] = {
+                "sampleRate": rate,
+                "sampledRecords": sum(int(r.total_records) for r in results),
+                "confidence": analytics_engine.CONFIDENCE,
+                "lowerBounds": ["max_value"],
+                "upperBounds": ["min_value"]
+            }
+        return response
+
+    summary = []
+    for r in results:
+        current_stats = _summary_stats(r.value_sum, r.min_value, r.max_value, r.total_records)
+        previous_stats = _summary_stats(
+            r.previous_value_sum, r.previous_min_value, r.previous_max_value, r.previous_total_records
+        )
+        item = {"metric_type": r.category, "metric_name": r.metric_name}
+        item.update(current_stats or dict.fromkeys(("avg_value", "min_value", "max_value"), None))
+        item["total_records"] = current_stats["total_records"] if current_stats else 0
+        item["previous"] = previous_stats
+        item["deltas"] = {
+            key: analytics_engine.delta(item[key], previous_stats[key] if previous_stats else None)
+            for key in ("avg_value", "min_value", "max_value")
+        }
+        item["deltas"]["total_records"] = analytics_engine.delta(
+            item["total_records"], previous_stats["total_records"] if previous_stats else 0
+        )
+        if distribution:
+            empty = dict.fromkeys([name for name, _ in sketches.PERCENTILES] + ["histogram"])
+            item.update(distributions.get((r.category, r.metric_name, True), empty))
+            if previous_stats:
+                previous_stats.update(distributions[(r.category, r.metric_name, False)])
+        summary.append(item)
+
     return {
-        "summary": [
-            {
-                "metric_type": r.metric_type,
-                "metric_name": r.metric_name,
-                "avg_value": float(r.avg_value),
-                "min_value": float(r.min_value),
-                "max_value": float(r.max_value),
-                "total_records": r.total_records
+        "summary": summary,
+        "comparison": {
+            "currentRange": {"start": start_day.isoformat(), "end": end_day.isoformat()},
+            "previousRange": {
+                "start": previous_start.isoformat(),
+                "end": (start_day - timedelta(days=1)).isoformat()
             }
-            for r in results
-        ]
+        }
     }
 
+def _resolve_buckets(granularity: str, tz: str, days: int = 30):
+    """Validate trend bucketing parameters, returning the time zone."""
+    if granularity not in buckets.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Unsupported granularity: {granularity}")
+    if buckets.bucket_count(granularity, days) > buckets.MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many {granularity} buckets in {days} days; at most {buckets.MAX_BUCKETS} are returned"
+        )
+    try:
+        return buckets.resolve_timezone(tz)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/metrics/trend", response_model=dict)
+@analytics_cache.cached("metrics_trend")
+@budgets.limited("metrics_trend", empty={"trend": []})
 def get_metrics_trend(
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_active_user),
     metric_type: str = None,
     metric_name: str = None,
-    days: int = 30,
+    days: int = Query(30, ge=1, le=3660),
+    granularity: str = "day",
+    tz: str = "UTC",
+    series_format: Optional[str] = Depends(deps.get_series_format),
 ) -> Any:
     """
-    Get daily trend data for specific metrics.
+    Get trend data for specific metrics over the last days (at most ten
+    years, and at most buckets.MAX_BUCKETS buckets), bucketed by hour, day,
+    week or month in the given IANA time zone. Empty buckets are returned
+    with a null avg_value and a zero count.
+    Metric types are categories, so metric_type filters by category name.
+    Columnar clients can request the series through the Accept header.
     """
+    zone = _resolve_buckets(granularity, tz, days)
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
 
-    query = db.query(
-        func.date(Metric.created_at).label('date'),
-        func.avg(Metric.value).label('avg_value')
-    ).join(Entry).filter(
-        Entry.user_id == current_user.id,
-        Metric.created_at >= start_date,
-        Metric.created_at <= end_date
-    )
+    if granularity != "hour" and buckets.is_utc(zone, start_date, end_date):
+        # UTC days, weeks and months are served from the daily rollups
+        bucket = buckets.bucket_label(db, MetricDailyRollup.day, granularity)
+        query = db.query(
+            bucket.label(buckets.BUCKET_LABEL),
+            func.sum(MetricDailyRollup.value_sum).label('value_sum'),
+            func.sum(MetricDailyRollup.record_count).label('record_count')
+        ).filter(
+            MetricDailyRollup.user_id == current_user.id,
+            MetricDailyRollup.day >= start_date.date()
+        )
+        if metric_type:
+            query = query.join(
+                Category, Category.id == MetricDailyRollup.category_id
+            ).filter(Category.name == metric_type)
+        if metric_name:
+            query = query.filter(MetricDailyRollup.metric_name == metric_name)
+    else:
+        local = buckets.localize(db, Metric.created_at, zone, start_date, end_date)
+        bucket = buckets.bucket_label(db, local, granularity)
+        query = db.query(
+            bucket.label(buckets.BUCKET_LABEL),
+            func.sum(Metric.value).label('value_sum'),
+            func.count(Metric.id).label('record_count')
+        ).join(Entry).filter(
+            Entry.user_id == current_user.id,
+            Metric.created_at >= start_date,
+            Metric.created_at <= end_date
+        )
+        if metric_type:
+            query = query.join(
+                Category, Category.id == Metric.category_id
+            ).filter(Category.name == metric_type)
+        if metric_name:
+            query = query.filter(Metric.metric_name == metric_name)
 
-    if metric_type:
-        query = query.filter(Metric.metric_type == metric_type)
-    if metric_name:
-        query = query.filter(Metric.metric_name == metric_name)
+    results = query.group_by(buckets.grouped_by_bucket()).all()
+    filled = buckets.fill(results, granularity, zone, start_date, end_date)
 
-    results = query.group_by(func.date(Metric.created_at)).all()
+    if series_format:
+        starts = [buckets.to_utc(moment, zone) for moment, _ in filled]
+        sums = [totals[0] if totals else float("nan") for _, totals in filled]
+        counts = [totals[1] if totals else 1 for _, totals in filled]
+        trend = series.Series(
+            metric_type or "",
+            metric_name or "",
+            series.to_epoch_ms(starts),
+            series.to_float64(sums) / series.to_float64(counts)
+        )
+        return Response(series.encode([trend], series_format), media_type=series_format)
 
     return {
+        "granularity": granularity,
+        "tz": zone.key,
         "trend": [
             {
-                "date": r.date.isoformat(),
-                "avg_value": float(r.avg_value)
+                "date": buckets.format_bucket(moment, granularity),
+                "avg_value": float(totals[0]) / totals[1] if totals else None,
+                "count": int(totals[1]) if totals else 0
             }
-            for r in results
+            for moment, totals in filled
         ]
     }
 
+@router.get("/metrics/rolling", response_model=dict)
+@analytics_cache.cached("metrics_rolling")
+@budgets.limited("metrics_rolling", empty={"statistics": {}})
+def get_metrics_rolling(
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    category: str = Query(...),
+    metric_name: str = Query(...),
+    window: int = Query(7, ge=1),
+    span: Optional[int] = Query(None, ge=1),
+) -> Any:
+    """
+    Get rolling statistics for one category/metric name series.
+    Returns rolling mean, median and standard deviation over window points,
+    an EWMA with the given span, the rate of change per day and rolling
+    z-scores, as one list per statistic aligned with created_at.
+    """
+    try:
+        loaded = series_cache.load_series(db, current_user, category, metric_name)
+        if loaded:
+            timestamps = loaded[0].series.timestamps.astype("datetime64[ms]")
+            values = loaded[0].series.values
+        else:
+            timestamps, values = (), ()
+        limit = budgets.row_limit()
+        if limit is not None and len(values) > limit:
+            # Over the row budget, only the most recent points are used
+            timestamps, values = timestamps[-limit:], values[-limit:]
+            budgets.mark_truncated()
+
+        frame = statistics.rolling_statistics(timestamps, values, window, span)
+        return {
+            "category": category,
+            "metric_name": metric_name,
+            "window": window,
+            "span": span or window,
+            "statistics": statistics.to_columns(frame)
+        }
+    except budgets.BudgetExceeded:
+        raise
+    except Exception as e:
+        print(f"Error in metrics rolling endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/metrics/correlation", response_model=dict)
+@analytics_cache.cached("metrics_correlation")
+@budgets.limited("metrics_correlation", empty={"series": [], "matrix": [], "observations": []})
+def get_metrics_correlation(
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    method: str = "pearson",
+    granularity: str = "day",
+    days: int = Query(90, ge=1),
+    min_periods: int = Query(3, ge=2),
+) -> Any:
+    """
+    Get the correlation matrix of all of the user's category/metric name
+    series. Series are averaged onto a common daily or hourly UTC grid over
+    the last days days; pairs with fewer than min_periods shared buckets
+    get a null coefficient.
+    """
+    if method not in statistics.CORRELATION_METHODS:
+        raise HTTPException(status_code=400, detail=f"Unsupported correlation method: {method}")
+    if granularity not in ("day", "hour"):
+        raise HTTPException(status_code=400, detail=f"Unsupported granularity: {granularity}")
+    try:
+        return analytics_engine.compute_correlation(
+            db, current_user.id, method, granularity, days, min_periods
+        )
+    except budgets.BudgetExceeded:
+        raise
+    except Exception as e:
+        print(f"Error in metrics correlation endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @router.get("/entries/count", response_model=dict)
+@analytics_cache.cached("entries_count")
+@budgets.limited("entries_count", empty={"entries_count": []})
 def get_entries_count(
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_analytics_db),
     current_user: User = Depends(deps.get_current_active_user),
     days: int = 30,
 ) -> Any:
     """
     Get count of entries by category over time.
+    Entries are categorised through their metrics, so this counts the
+    metric records logged per category in the period.
     """
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days)
+    start_day = (datetime.utcnow() - timedelta(days=days)).date()
 
     results = db.query(
-        Entry.category_id,
-        func.count(Entry.id).label('count')
+        MetricDailyRollup.category_id,
+        func.sum(MetricDailyRollup.record_count).label('count')
     ).filter(
-        Entry.user_id == current_user.id,
-        Entry.created_at >= start_date,
-        Entry.created_at <= end_date
-    ).group_by(Entry.category_id).all()
+        MetricDailyRollup.user_id == current_user.id,
+        MetricDailyRollup.day >= start_day
+    ).group_by(MetricDailyRollup.category_id).all()
 
     return {
         "entries_count": [
             {
                 "category_id": r.category_id,
-                "count": r.count
+                "count": int(r.count)
             }
             for r in results
         ]
     }
 
+@router.get("/calendar", response_model=dict)
+@analytics_cache.cached("calendar")
+@budgets.limited("calendar", empty={"entries": [], "metrics": []})
+def get_calendar(
+    db: Session = Depends(deps.get_analytics_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    year: Optional[int] = Query(None, ge=1970, le=9998),
+) -> Any:
+    """
+    Get a calendar heatmap of one year (the current one by default).
+    entries and metrics hold one value per UTC day from January 1st:
+    the number of entries and of metric records logged that day.
+    """
+    year = year or datetime.utcnow().year
+    first_day = date(year, 1, 1)
+    next_year = date(year + 1, 1, 1)
+    days = (next_year - first_day).days
+    try:
+        # Both rollups are keyed (user_id, day, ...), so each query is an index range scan
+        entry_days = db.query(
+            EntryDailyRollup.day,
+            EntryDailyRollup.entry_count
+        ).filter(
+            EntryDailyRollup.user_id == current_user.id,
+            EntryDailyRollup.day >= first_day,
+            EntryDailyRollup.day < next_year
+        ).all()
+
+        metric_days = db.query(
+            MetricDailyRollup.day,
+            func.sum(MetricDailyRollup.record_count).label('count')
+        ).filter(
+            MetricDailyRollup.user_id == current_user.id,
+            MetricDailyRollup.day >= first_day,
+            MetricDailyRollup.day < next_year
+        ).group_by(MetricDailyRollup.day).all()
+
+        entries = [0] * days
+        for r in entry_days:
+            entries[(r.day - first_day).days] = int(r.entry_count)
+        metrics = [0] * days
+        for r in metric_days:
+            metrics[(r.day - first_day).days] = int(r.count)
+
+        return {
+            "year": year,
+            "start": first_day.isoformat(),
+            "days": days,
+            "entries": entries,
+            "metrics": metrics,
+            "totals": {"entries": sum(entries), "metrics": sum(metrics)},
+            "max": {"entries": max(entries), "metrics": max(metrics)}
+        }
+    except budgets.BudgetExceeded:
+        raise
+    except Exception as e:
+        print(f"Error in calendar endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @router.get("/dashboard", response_model=dict)
+@analytics_cache.cached("dashboard")
+@budgets.limited("dashboard", empty={"recentEntries": [], "entriesByCategory": [], "entriesByDate": []})
 def get_dashboard_stats(
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_active_user),
+    granularity: str = "day",
+    tz: str = "UTC",
 ) -> Any:
     """
     Get dashboard statistics including total entries, categories, tags,
-    entries by category, and entries over time.
+    entries by category, and entries over time bucketed by granularity
+    in the given time zone.
     """
+    zone = _resolve_buckets(granularity, tz)
     try:
-        # Get total counts
-        total_entries = db.query(func.count(Entry.id)).filter(
-            Entry.user_id == current_user.id
-        ).scalar() or 0
-        
-        print(f"Total entries for user {current_user.id}: {total_entries}")
-        
-        total_categories = db.query(func.count(Category.id)).filter(
-            Category.user_id == current_user.id
-        ).scalar() or 0
-        
-        print(f"Total categories for user {current_user.id}: {total_categories}")
-        
-        # Get total tags (unique tags used by the user)
-        total_tags = db.query(func.count(func.distinct(Tag.id))).join(
-            entry_tags, Tag.id == entry_tags.c.tag_id, isouter=True
-        ).join(
-            Entry, Entry.id == entry_tags.c.entry_id, isouter=True
-        ).filter(
-            Entry.user_id == current_user.id
-        ).scalar() or 0
-        
-        print(f"Total tags for user {current_user.id}: {total_tags}")
+        # Get total counts from the user's counters row
+        stats = user_stats.get_stats(db, current_user.id)
+        total_entries = stats.entry_count
+        total_categories = stats.category_count
+        total_tags = stats.distinct_tag_count
         
         # Get recent entries
         recent_entries = db.query(
@@ -173,18 +582,15 @@ def get_dashboard_stats(
             desc(Entry.created_at)
         ).limit(5).all()
         
-        # Get entries by category (using metrics)
+        # Get entries by category (using metric rollups)
         entries_by_category = db.query(
             Category.name.label('category'),
-            func.count(Metric.id).label('count')
+            func.sum(MetricDailyRollup.record_count).label('count')
         ).join(
-            Metric,
-            Metric.category_id == Category.id
-        ).join(
-            Entry,
-            Entry.id == Metric.entry_id
+            MetricDailyRollup,
+            MetricDailyRollup.category_id == Category.id
         ).filter(
-            Entry.user_id == current_user.id
+            MetricDailyRollup.user_id == current_user.id
         ).group_by(
             Category.name
         ).all()
@@ -193,20 +599,35 @@ def get_dashboard_stats(
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=30)
         
-        entries_by_date_query = db.query(
-            func.date(Entry.created_at).label('date'),
-            func.count(Entry.id).label('count')
-        ).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date,
-            Entry.created_at <= end_date
-        ).group_by(
-            func.date(Entry.created_at)
-        ).all()
+        if granularity != "hour" and buckets.is_utc(zone, start_date, end_date):
+            bucket = buckets.bucket_label(db, EntryDailyRollup.day, granularity)
+            entries_by_date_query = db.query(
+                bucket.label(buckets.BUCKET_LABEL),
+                func.sum(EntryDailyRollup.entry_count).label('count')
+            ).filter(
+                EntryDailyRollup.user_id == current_user.id,
+                EntryDailyRollup.day >= start_date.date()
+            )
+        else:
+            local = buckets.localize(db, Entry.created_at, zone, start_date, end_date)
+            bucket = buckets.bucket_label(db, local, granularity)
+            entries_by_date_query = db.query(
+                bucket.label(buckets.BUCKET_LABEL),
+                func.count(Entry.id).label('count')
+            ).filter(
+                Entry.user_id == current_user.id,
+                Entry.created_at >= start_date,
+                Entry.created_at <= end_date
+            )
+        
+        entries_by_date = buckets.fill(
+            entries_by_date_query.group_by(buckets.grouped_by_bucket()).all(),
+            granularity, zone, start_date, end_date
+        )
         
         # Format for the response
         response = {
-            "totalEntries": total_entries,
+            "totalEntries": int(total_entries),
             "totalCategories": total_categories,
             "totalTags": total_tags,
             "recentEntries": [
@@ -221,226 +642,61 @@ def get_dashboard_stats(
             "entriesByCategory": [
                 {
                     "category": r.category,
-                    "count": r.count
+                    "count": int(r.count)
                 }
                 for r in entries_by_category
             ],
             "entriesByDate": [
                 {
-                    "date": r.date.isoformat(),
-                    "count": r.count
+                    "date": buckets.format_bucket(moment, granularity),
+                    "count": int(totals[0]) if totals else 0
                 }
-                for r in entries_by_date_query
+                for moment, totals in entries_by_date
             ]
         }
         
-        print(f"Dashboard response: {response}")
         return response
+    except budgets.BudgetExceeded:
+        raise
     except Exception as e:
         print(f"Error in dashboard endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/", response_model=dict)
+@analytics_cache.cached("analytics")
+@budgets.limited(
+    "analytics", empty={"entriesByCategory": [], "entriesByDate": []}, fallback={"accuracy": "approx"}
+)
 def get_analytics(
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_analytics_db),
     current_user: User = Depends(deps.get_current_active_user),
     time_range: str = "30d",
+    compare: Optional[str] = None,
+    accuracy: str = "exact",
 ) -> Any:
     """
     Get comprehensive analytics based on time range.
     Supported time ranges: 7d, 30d, 90d, all
+    With compare=previous the preceding range of equal length and the
+    deltas against it are added under comparison.
+    With accuracy=approx counts are estimated from a deterministic sample
+    of entries, with confidence intervals under approximation.
     """
+    _check_comparison(compare, bounded=time_range in analytics_engine.TIME_RANGES)
+    _check_accuracy(accuracy)
     try:
-        # Determine the date range based on the time_range parameter
-        end_date = datetime.utcnow()
-        
-        if time_range == "7d":
-            start_date = end_date - timedelta(days=7)
-        elif time_range == "30d":
-            start_date = end_date - timedelta(days=30)
-        elif time_range == "90d":
-            start_date = end_date - timedelta(days=90)
-        else:  # "all" or any other value
-            start_date = datetime.min
-        
-        # Get total entries within the time range
-        total_entries = db.query(func.count(Entry.id)).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date if time_range != "all" else True
-        ).scalar() or 0
-        
-        # Get total categories used in this time range
-        total_categories = db.query(func.count(func.distinct(Category.id))).join(
-            Metric, Metric.category_id == Category.id
-        ).join(
-            Entry, Entry.id == Metric.entry_id
-        ).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date if time_range != "all" else True
-        ).scalar() or 0
-        
-        # Get total tags used in this time range
-        total_tags = db.query(func.count(func.distinct(Tag.id))).join(
-            entry_tags, Tag.id == entry_tags.c.tag_id
-        ).join(
-            Entry, Entry.id == entry_tags.c.entry_id
-        ).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date if time_range != "all" else True
-        ).scalar() or 0
-        
-        # Calculate days in range for average
-        days_in_range = (end_date - start_date).days or 1  # Avoid division by zero
-        average_entries_per_day = total_entries / days_in_range if days_in_range > 0 else 0
-        
-        # Find most active day
-        most_active_day_query = db.query(
-            func.date(Entry.created_at).label('date'),
-            func.count(Entry.id).label('count')
-        ).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date if time_range != "all" else True
-        ).group_by(
-            func.date(Entry.created_at)
-        ).order_by(
-            desc('count')
-        ).first()
-        
-        most_active_day = most_active_day_query.date.strftime('%Y-%m-%d') if most_active_day_query else 'N/A'
-        
-        # Find most used category
-        most_used_category_query = db.query(
-            Category.name,
-            func.count(Metric.id).label('count')
-        ).join(
-            Metric, Metric.category_id == Category.id
-        ).join(
-            Entry, Entry.id == Metric.entry_id
-        ).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date if time_range != "all" else True
-        ).group_by(
-            Category.name
-        ).order_by(
-            desc('count')
-        ).first()
-        
-        most_used_category = most_used_category_query.name if most_used_category_query else 'N/A'
-        
-        # Find most used tag
-        most_used_tag_query = db.query(
-            Tag.name,
-            func.count(entry_tags.c.entry_id).label('count')
-        ).join(
-            entry_tags, Tag.id == entry_tags.c.tag_id
-        ).join(
-            Entry, Entry.id == entry_tags.c.entry_id
-        ).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date if time_range != "all" else True
-        ).group_by(
-            Tag.name
-        ).order_by(
-            desc('count')
-        ).first()
-        
-        most_used_tag = most_used_tag_query.name if most_used_tag_query else 'N/A'
-        
-        # Get entries by category stats for distribution
-        category_distribution = []
-        
-        # Use metrics to determine category distribution
-        category_metrics = db.query(
-            Category.name.label('category'),
-            func.count(Metric.id).label('count')
-        ).join(
-            Metric, Metric.category_id == Category.id
-        ).join(
-            Entry, Entry.id == Metric.entry_id
-        ).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date if time_range != "all" else True
-        ).group_by(
-            Category.name
-        ).all()
-        
-        total_metrics = sum([r.count for r in category_metrics]) if category_metrics else 0
-        
-        for r in category_metrics:
-            percentage = (r.count / total_metrics * 100) if total_metrics > 0 else 0
-            category_distribution.append({
-                "category": r.category,
-                "count": r.count,
-                "percentage": round(percentage, 1)
-            })
-        
-        # Sort by percentage descending
-        category_distribution.sort(key=lambda x: x["percentage"], reverse=True)
-        
-        # Get entries by date
-        entries_by_date_query = db.query(
-            func.date(Entry.created_at).label('date'),
-            func.count(Entry.id).label('count')
-        ).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date if time_range != "all" else True
-        ).group_by(
-            func.date(Entry.created_at)
-        ).order_by(
-            'date'
-        ).all()
-        
-        # Get entries by tag
-        entries_by_tag = db.query(
-            Tag.name.label('tag'),
-            func.count(entry_tags.c.entry_id).label('count')
-        ).join(
-            entry_tags, Tag.id == entry_tags.c.tag_id
-        ).join(
-            Entry, Entry.id == entry_tags.c.entry_id
-        ).filter(
-            Entry.user_id == current_user.id,
-            Entry.created_at >= start_date if time_range != "all" else True
-        ).group_by(
-            Tag.name
-        ).all()
-        
-        # Format the response
-        response = {
-            "totalEntries": total_entries,
-            "totalCategories": total_categories,
-            "totalTags": total_tags,
-            "averageEntriesPerDay": average_entries_per_day,
-            "mostActiveDay": most_active_day,
-            "mostUsedCategory": most_used_category,
-            "mostUsedTag": most_used_tag,
-            "entriesByCategory": category_distribution,
-            "entriesByDate": [
-                {
-                    "date": r.date.isoformat(),
-                    "count": r.count
-                }
-                for r in entries_by_date_query
-            ],
-            "entriesByTag": [
-                {
-                    "tag": r.tag,
-                    "count": r.count
-                }
-                for r in entries_by_tag
-            ]
-        }
-        
-        print(f"Analytics response for time_range={time_range}: {response}")
-        return response
-        
+        return analytics_engine.compute_analytics(db, current_user.id, time_range, compare, accuracy)
+    except budgets.BudgetExceeded:
+        raise
     except Exception as e:
         print(f"Error in analytics endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/metrics/by-category", response_model=dict)
+@analytics_cache.cached("metrics_by_category")
+@budgets.limited("metrics_by_category", empty={"metrics_by_category": []})
 def get_metrics_by_category(
-    db: Session = Depends(deps.get_db),
+    db: Session = Depends(deps.get_analytics_db),
     current_user: User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
@@ -448,45 +704,24 @@ def get_metrics_by_category(
     Returns data suitable for visualization.
     """
     try:
-        # Get metrics grouped by category and metric_name
+        # Get metrics grouped by category and metric_name from the daily rollups
         metrics_data = db.query(
             Category.name.label('category'),
-            Metric.metric_name,
-            func.avg(Metric.value).label('avg_value'),
-            func.min(Metric.value).label('min_value'),
-            func.max(Metric.value).label('max_value'),
-            func.count(Metric.id).label('count')
+            MetricDailyRollup.metric_name,
+            func.sum(MetricDailyRollup.value_sum).label('value_sum'),
+            func.min(MetricDailyRollup.value_min).label('min_value'),
+            func.max(MetricDailyRollup.value_max).label('max_value'),
+            func.sum(MetricDailyRollup.record_count).label('count')
         ).join(
-            Entry, Entry.id == Metric.entry_id
-        ).join(
-            Category, Category.id == Metric.category_id
+            Category, Category.id == MetricDailyRollup.category_id
         ).filter(
-            Entry.user_id == current_user.id
+            MetricDailyRollup.user_id == current_user.id
         ).group_by(
-            Category.name, Metric.metric_name
+            Category.name, MetricDailyRollup.metric_name
         ).all()
         
-        # Get all metrics to extract units
-        all_metrics = db.query(
-            Category.name.label('category'),
-            Metric.metric_name,
-            Metric.unit
-        ).join(
-            Entry, Entry.id == Metric.entry_id
-        ).join(
-            Category, Category.id == Metric.category_id
-        ).filter(
-            Entry.user_id == current_user.id
-        ).all()
-        
-        # Create a dictionary to store units for each category and metric name
-        units_dict = {}
-        for metric in all_metrics:
-            key = f"{metric.category}:{metric.metric_name}"
-            if key not in units_dict:
-                units_dict[key] = []
-            if metric.unit:
-                units_dict[key].append(metric.unit)
+        # Most common unit of each series, computed in the database
+        units = analytics_engine.modal_units(db, current_user.id)
         
         # Organize data by category for visualization
         categories = {}
@@ -494,24 +729,13 @@ def get_metrics_by_category(
             if metric.category not in categories:
                 categories[metric.category] = []
             
-            # Get the most common unit
-            key = f"{metric.category}:{metric.metric_name}"
-            units = units_dict.get(key, [])
-            most_common_unit = ''
-            if units:
-                # Find the most common unit
-                unit_count = {}
-                for unit in units:
-                    unit_count[unit] = unit_count.get(unit, 0) + 1
-                most_common_unit = max(unit_count.keys(), key=lambda k: unit_count[k])
-            
             categories[metric.category].append({
                 'metric_name': metric.metric_name,
-                'avg_value': float(metric.avg_value),
+                'avg_value': float(metric.value_sum) / metric.count,
                 'min_value': float(metric.min_value),
                 'max_value': float(metric.max_value),
-                'count': metric.count,
-                'unit': most_common_unit
+                'count': int(metric.count),
+                'unit': units.get((metric.category, metric.metric_name), '')
             })
         
         # Format for response
@@ -525,47 +749,114 @@ def get_metrics_by_category(
         return {
             'metrics_by_category': result
         }
+    except budgets.BudgetExceeded:
+        raise
     except Exception as e:
         print(f"Error in metrics by category endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def _downsampled_values(db: Session, loaded: list, max_points: int, method: str) -> dict:
+    """
+    Build the nested metric_values payload from cached series,
+    downsampling each series. Only the kept points' units and timestamps
+    are read from the database. Points synthesized by the avg method
+    carry no id and the unit of the series' first point.
+    """
+    sampled_series = [downsample.downsample(cached.series, max_points, method) for cached in loaded]
+    wanted = set()
+    for cached, sampled in zip(loaded, sampled_series):
+        if sampled.indices is not None:
+            wanted.update(cached.ids[sampled.indices].tolist())
+        elif len(cached.ids):
+            wanted.add(int(cached.ids[0]))
+    details = {
+        row.id: row for row in db.query(Metric.id, Metric.unit, Metric.created_at).filter(
+            Metric.id.in_(wanted)
+        )
+    } if wanted else {}
+
+    result = {}
+    for cached, sampled in zip(loaded, sampled_series):
+        item = cached.series
+        if sampled.indices is not None:
+            # Kept points are original rows
+            points = [
+                {
+                    'id': metric_id,
+                    'value': value,
+                    'unit': details[metric_id].unit,
+                    'created_at': details[metric_id].created_at.isoformat()
+                }
+                for metric_id, value in zip(
+                    cached.ids[sampled.indices].tolist(), item.values[sampled.indices].tolist()
+                )
+            ]
+        else:
+            unit = details[int(cached.ids[0])].unit if len(cached.ids) else None
+            timestamps = sampled.series.timestamps.astype("datetime64[ms]").astype(object)
+            points = [
+                {
+                    'id': None,
+                    'value': value,
+                    'unit': unit,
+                    'created_at': timestamp.isoformat()
+                }
+                for value, timestamp in zip(sampled.series.values.tolist(), timestamps)
+            ]
+        result.setdefault(item.category, {})[item.metric_name] = points
+    return result
+
 @router.get("/metrics/values", response_model=dict)
+@budgets.limited("metric_values", empty={"metric_values": {}})
 def get_metric_values(
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_active_user),
     category: str = None,
     metric_name: str = None,
+    output_format: str = Query("json", alias="format"),
+    series_format: Optional[str] = Depends(deps.get_series_format),
+    max_points: Optional[int] = Query(None, ge=2),
+    method: str = "lttb",
 ) -> Any:
     """
     Get individual metric values for each category/metric name.
     Returns data suitable for detailed visualization of actual values.
+    With format=ndjson the values are streamed one JSON object per line,
+    within this endpoint's wall clock (a stream cut short ends with a
+    degraded line); columnar clients can request the series through the Accept header.
+    With max_points, each series longer than that is downsampled using
+    method (lttb, minmax or avg); NDJSON streams always carry every point.
     """
-    try:
-        # Base query to get all metrics with their values
-        query = db.query(
-            Metric.id,
-            Category.name.label('category'),
-            Metric.metric_name,
-            Metric.value,
-            Metric.unit,
-            Metric.created_at
-        ).join(
-            Entry, Entry.id == Metric.entry_id
-        ).join(
-            Category, Category.id == Metric.category_id
-        ).filter(
-            Entry.user_id == current_user.id
-        ).order_by(
-            Category.name, Metric.metric_name, Metric.created_at
+    if method not in downsample.METHODS:
+        raise HTTPException(status_code=400, detail=f"Unsupported downsampling method: {method}")
+
+    if series_format:
+        grouped = [
+            cached.series for cached in series_cache.load_series(db, current_user, category, metric_name)
+        ]
+        if max_points:
+            grouped = [downsample.downsample(item, max_points, method).series for item in grouped]
+        return Response(series.encode(grouped, series_format), media_type=series_format)
+
+    if output_format == "ndjson":
+        return StreamingResponse(
+            analytics_engine.iter_metric_values_ndjson(
+                current_user.id, category, metric_name, budget=budgets.current_budget()
+            ),
+            media_type="application/x-ndjson"
         )
-        
-        # Apply filters if provided
-        if category:
-            query = query.filter(Category.name == category)
-        if metric_name:
-            query = query.filter(Metric.metric_name == metric_name)
-        
-        metrics = query.all()
+
+    try:
+        query = analytics_engine.metric_values_query(db, current_user.id, category, metric_name)
+
+        if max_points:
+            loaded = series_cache.load_series(db, current_user, category, metric_name)
+            return {
+                'metric_values': _downsampled_values(db, loaded, max_points, method),
+                'downsampling': {'method': method, 'max_points': max_points}
+            }
+
+        metrics = budgets.fetch_all(query)
         
         # Organize data by category and metric_name
         result = {}
@@ -586,6 +877,14 @@ def get_metric_values(
         return {
             'metric_values': result
         }
+    except budgets.BudgetExceeded:
+        raise
     except Exception as e:
         print(f"Error in metric values endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+# Payloads recomputed in the background after entry and metric writes
+for warm_range in ("7d", "30d", "90d", "all"):
+    cache_warmer.register(get_analytics, time_range=warm_range, accuracy="exact")
+cache_warmer.register(get_dashboard_stats, granularity="day", tz="UTC")
+cache_warmer.register(get_calendar, year=None)
@@ -0,0 +1,72 @@
+"""
+Analytics job endpoints for the Personal Memo System.
+Expensive reports are queued with POST /analytics/jobs and computed by
+the background worker pool; clients poll GET /analytics/jobs/{id} until
+the job has succeeded or failed.
+"""
+
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from backend.api import deps
+from backend.models.analytics_job import AnalyticsJob
+from backend.models.user import User
+from backend.schemas.analytics_job import JOB_PARAMS, AnalyticsJobCreate, AnalyticsJobResponse
+from backend.services import analytics as analytics_engine
+from backend.services import export
+from backend.services.jobs import job_runner
+
+router = APIRouter()
+
+@router.post("/", response_model=AnalyticsJobResponse, status_code=202)
+def create_job(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    job_in: AnalyticsJobCreate,
+) -> Any:
+    """
+    Queue an analytics report.
+    Kinds are analytics (the / endpoint's report, all-time by default),
+    correlation (the correlation matrix over ten years by default) and
+    export (every category, tag, entry and metric of the user).
+    """
+    try:
+        params = JOB_PARAMS[job_in.kind](**job_in.params)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    return job_runner.submit(db, current_user, job_in.kind, params.model_dump())
+
+@router.get("/{job_id}", response_model=AnalyticsJobResponse)
+def read_job(
+    *,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    job_id: int,
+) -> Any:
+    """
+    Get a job's status, and its result or error once finished.
+    """
+    job = db.query(AnalyticsJob).filter(
+        AnalyticsJob.id == job_id,
+        AnalyticsJob.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Job kinds call the analytics engine directly rather than the cached endpoints:
+# a request coalesced onto a job would wait under the job's budget, and a job
+# coalesced onto a request would store the request's degraded payload
+job_runner.register(
+    "analytics",
+    lambda db, user, **params: analytics_engine.compute_analytics(db, user.id, **params),
+    validate=analytics_engine.check_analytics_params
+)
+job_runner.register(
+    "correlation",
+    lambda db, user, **params: analytics_engine.compute_correlation(db, user.id, **params),
+    validate=lambda method, granularity, **params: analytics_engine.check_correlation_params(method, granularity)
+)
+job_runner.register("export", lambda db, user: export.export_user_data(db, user.id))
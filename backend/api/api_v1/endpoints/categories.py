@@ -1,27 +1,30 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from backend.api import deps
 from backend.models.category import Category
 from backend.models.user import User
 from backend.schemas.category import CategoryCreate, CategoryUpdate, CategoryResponse
+from backend.services import pagination, rollups, user_stats, versioning
 
 router = APIRouter()
 
 @router.get("/", response_model=List[CategoryResponse])
 def read_categories(
+    *,
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_active_user),
+    response: Response,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
 ) -> Any:
     """
-    Retrieve categories.
+    Retrieve categories, oldest first.
+    Pass a page's X-Next-Cursor header as cursor to get the next page.
     """
-    categories = db.query(Category).filter(
-        Category.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
-    return categories
+    query = db.query(Category).filter(Category.user_id == current_user.id)
+    return pagination.paginate(query, Category, response, cursor, skip, limit)
 
 @router.post("/", response_model=CategoryResponse)
 def create_category(
@@ -38,6 +41,9 @@ def create_category(
         user_id=current_user.id
     )
     db.add(category)
+    db.flush()
+    user_stats.update(db, current_user.id, categories=1)
+    versioning.bump(db, [current_user.id])
     db.commit()
     db.refresh(category)
     return category
@@ -64,6 +70,7 @@ def update_category(
         setattr(category, field, value)
     
     db.add(category)
+    versioning.bump(db, [current_user.id])
     db.commit()
     db.refresh(category)
     return category
@@ -78,6 +85,7 @@ def delete_category(
     """
     Delete a category.
     """
+    rollups.lock_users(db, [current_user.id])
     category = db.query(Category).filter(
         Category.id == category_id,
         Category.user_id == current_user.id
@@ -85,6 +93,10 @@ def delete_category(
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
+    rollups.detach_category(db, current_user.id, category.id)
     db.delete(category)
+    db.flush()
+    user_stats.update(db, current_user.id, categories=-1)
+    versioning.bump(db, [current_user.id])
     db.commit()
     return {"status": "success"} 
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Chart endpoints for the Personal Memo System.
+These routes render the analytics views as PNG or SVG images for clients
+that cannot draw charts themselves. Images are cached per user data
+version and parameters, so repeated renders are served from the cache.
+"""
+
+from concurrent.futures import TimeoutError as RenderTimeoutError
+from typing import Any, Callable
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from backend.api import deps
+from backend.api.api_v1.endpoints import analytics
+from backend.core.config import settings
+from backend.models.user import User
+from backend.services import budgets, charts, downsample, series_cache
+from backend.services.cache import analytics_cache
+
+router = APIRouter()
+
+def _chart_response(
+    current_user: User, chart: str, params: dict, output_format: str, draw: Callable[[], bytes]
+) -> Response:
+    """Serve a chart from the cache, rendering it on a miss."""
+    if output_format not in charts.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported chart format: {output_format}")
+    key = charts.cache_key(
+        current_user.id, current_user.data_version or 0, chart, {**params, "format": output_format}
+    )
+    try:
+        image = analytics_cache.get_or_compute_bytes(key, draw, settings.CHART_CACHE_TTL_SECONDS)
+    except HTTPException:
+        raise
+    except RenderTimeoutError:
+        raise HTTPException(status_code=503, detail="Chart rendering timed out")
+    except Exception as e:
+        print(f"Error rendering {chart} chart: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    return Response(image, media_type=charts.FORMATS[output_format])
+
+def _chart_data(result: dict) -> dict:
+    """
+    Data of an analytics endpoint to draw. A result degraded by its query
+    budget is empty or partial, so it is answered with 503 instead of being
+    drawn and cached for the unchanged data version.
+    """
+    if budgets.is_degraded(result):
+        raise HTTPException(status_code=503, detail="Chart data unavailable: analytics query budget exceeded")
+    return result
+
+@router.get("/trend")
+def get_trend_chart(
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    metric_type: str = None,
+    metric_name: str = None,
+    days: int = 30,
+    granularity: str = "day",
+    tz: str = "UTC",
+    output_format: str = Query("png", alias="format"),
+    width: int = Query(800, ge=200, le=2000),
+    height: int = Query(400, ge=150, le=2000),
+) -> Any:
+    """
+    Render the metrics trend as a line chart.
+    Takes the parameters of /analytics/metrics/trend.
+    """
+    params = {
+        "metric_type": metric_type, "metric_name": metric_name, "days": days,
+        "granularity": granularity, "tz": tz, "width": width, "height": height
+    }
+
+    def draw() -> bytes:
+        trend = _chart_data(analytics.get_metrics_trend(
+            db=db, current_user=current_user, metric_type=metric_type, metric_name=metric_name,
+            days=days, granularity=granularity, tz=tz, series_format=None
+        ))["trend"]
+        title = " / ".join(filter(None, [metric_type, metric_name])) or "All metrics"
+        return charts.render(
+            charts.render_trend,
+            [point["date"] for point in trend],
+            [point["avg_value"] for point in trend],
+            f"{title} ({granularity})", output_format, width, height
+        )
+
+    return _chart_response(current_user, "trend", params, output_format, draw)
+
+@router.get("/categories")
+def get_category_chart(
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    time_range: str = "30d",
+    output_format: str = Query("png", alias="format"),
+    width: int = Query(800, ge=200, le=2000),
+    height: int = Query(400, ge=150, le=2000),
+) -> Any:
+    """
+    Render the category distribution of /analytics/ as a bar chart.
+    """
+    params = {"time_range": time_range, "width": width, "height": height}
+
+    def draw() -> bytes:
+        distribution = _chart_data(analytics.get_analytics(
+            db=db, current_user=current_user, time_range=time_range, compare=None
+        ))["entriesByCategory"]
+        return charts.render(
+            charts.render_distribution,
+            [item["category"] for item in distribution],
+            [item["count"] for item in distribution],
+            f"Records by category ({time_range})", output_format, width, height
+        )
+
+    return _chart_response(current_user, "categories", params, output_format, draw)
+
+@router.get("/scatter")
+def get_scatter_chart(
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+    category: str = None,
+    metric_name: str = None,
+    max_points: int = Query(2000, ge=2),
+    output_format: str = Query("png", alias="format"),
+    width: int = Query(800, ge=200, le=2000),
+    height: int = Query(400, ge=150, le=2000),
+) -> Any:
+    """
+    Render individual metric values as a scatter plot, one color per
+    category/metric name. Series longer than max_points are downsampled
+    with LTTB before drawing.
+    """
+    params = {
+        "category": category, "metric_name": metric_name, "max_points": max_points,
+        "width": width, "height": height
+    }
+
+    def draw() -> bytes:
+        plotted = []
+        for cached in series_cache.load_series(db, current_user, category, metric_name):
+            item = downsample.downsample(cached.series, max_points, "lttb").series
+            plotted.append((
+                f"{item.category} / {item.metric_name}",
+                item.timestamps.astype("datetime64[ms]"),
+                item.values
+            ))
+        title = " / ".join(filter(None, [category, metric_name])) or "Metric values"
+        return charts.render(charts.render_scatter, plotted, title, output_format, width, height)
+
+    return _chart_response(current_user, "scatter", params, output_format, draw)
@@ -1,5 +1,5 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Response
 from sqlalchemy.orm import Session
 from datetime import datetime
 from backend.api import deps
@@ -10,52 +10,29 @@ from backend.models.tag import Tag
 from backend.models.category import Category
 from backend.schemas.entry import EntryCreate, EntryUpdate, EntryResponse
 from backend.schemas.metric import MetricCreate
+from backend.services import pagination, rollups, user_stats, versioning
+from backend.services.entries import with_relations, serialize_entry
+from backend.services.warmup import cache_warmer
 
 router = APIRouter()
 
 @router.get("/", response_model=List[EntryResponse])
 def read_entries(
+    *,
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_active_user),
+    response: Response,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
 ) -> Any:
     """
-    Retrieve entries.
+    Retrieve entries, oldest first.
+    Pass a page's X-Next-Cursor header as cursor to get the next page.
     """
-    query = db.query(Entry).filter(Entry.user_id == current_user.id)
-    entries = query.offset(skip).limit(limit).all()
-    
-    # Add tag lists to the response
-    result = []
-    for entry in entries:
-        entry_dict = {
-            "id": entry.id,
-            "user_id": entry.user_id,
-            "title": entry.title,
-            "content": entry.content,
-            "priority": entry.priority,
-            "status": entry.status,
-            "created_at": entry.created_at,
-            "updated_at": entry.updated_at,
-            "tags": [tag.name for tag in entry.tags] if entry.tags else [],
-            "metrics": [
-                {
-                    "id": metric.id,
-                    "metric_name": metric.metric_name,
-                    "value": float(metric.value),
-                    "unit": metric.unit,
-                    "entry_id": metric.entry_id,
-                    "category_id": metric.category_id,
-                    "category_name": metric.category.name if metric.category else None,
-                    "created_at": metric.created_at,
-                    "updated_at": metric.updated_at
-                } for metric in entry.metrics
-            ] if entry.metrics else []
-        }
-        result.append(entry_dict)
-    
-    return result
+    query = with_relations(db.query(Entry)).filter(Entry.user_id == current_user.id)
+    entries = pagination.paginate(query, Entry, response, cursor, skip, limit)
+    return [serialize_entry(entry) for entry in entries]
 
 @router.post("/", response_model=EntryResponse)
 def create_entry(
@@ -67,6 +44,7 @@ def create_entry(
     """
     Create new entry.
     """
+    rollups.lock_users(db, [current_user.id])
     # Extract tags and metrics from the input
     entry_data = entry_in.model_dump()
     tag_names = entry_data.pop("tags", []) if "tags" in entry_data else []
@@ -89,8 +67,7 @@ def create_entry(
         user_id=current_user.id
     )
     db.add(entry)
-    db.commit()
-    db.refresh(entry)
+    db.flush()
     
     # Process tags
     if tag_names:
@@ -104,16 +81,14 @@ def create_entry(
             if not tag:
                 tag = Tag(name=tag_name)
                 db.add(tag)
-                db.commit()
-                db.refresh(tag)
+                db.flush()
             
             # Associate tag with entry
             entry.tags.append(tag)
-        
-        db.commit()
-        db.refresh(entry)
     
     # Process metrics
+    new_metrics = []
+    new_categories = 0
     if metrics_data:
         for metric_data in metrics_data:
             # Skip metrics with empty metric_name
@@ -139,47 +114,38 @@ def create_entry(
                             user_id=current_user.id
                         )
                         db.add(new_category)
-                        db.commit()
-                        db.refresh(new_category)
+                        db.flush()
+                        new_categories += 1
                         metric_data["category_id"] = new_category.id
             
-            # Add entry_id to metric data
+            # Add entry_id and its owner to metric data
             metric_data["entry_id"] = entry.id
+            metric_data["user_id"] = current_user.id
             
             # Create metric
             metric = Metric(**metric_data)
             db.add(metric)
-        
-        db.commit()
-        db.refresh(entry)
+            new_metrics.append(metric)
     
-    # Prepare response
-    response = {
-        "id": entry.id,
-        "user_id": entry.user_id,
-        "title": entry.title,
-        "content": entry.content,
-        "priority": entry.priority,
-        "status": entry.status,
-        "created_at": entry.created_at,
-        "updated_at": entry.updated_at,
-        "tags": [tag.name for tag in entry.tags] if entry.tags else [],
-        "metrics": [
-            {
-                "id": metric.id,
-                "metric_name": metric.metric_name,
-                "value": float(metric.value),
-                "unit": metric.unit,
-                "entry_id": metric.entry_id,
-                "category_id": metric.category_id,
-                "category_name": metric.category.name if metric.category else None,
-                "created_at": metric.created_at,
-                "updated_at": metric.updated_at
-            } for metric in entry.metrics
-        ] if entry.metrics else []
-    }
+    # Update daily rollups in the same transaction as the entry
+    db.flush()
+    rollups.add_entries(db, current_user.id, [rollups.entry_point(entry)])
+    rollups.add_metrics(db, current_user.id, [rollups.metric_point(m) for m in new_metrics])
+    user_stats.update(
+        db, current_user.id,
+        entries=1,
+        categories=new_categories,
+        metrics=len(new_metrics),
+        linked_tags=[tag.id for tag in entry.tags]
+    )
+    versioning.bump(db, [current_user.id])
+    entry_id = entry.id
+    db.commit()
+    cache_warmer.schedule(current_user.id)
     
-    return response
+    # Reload with tags and metrics for the response
+    entry = with_relations(db.query(Entry)).populate_existing().filter(Entry.id == entry_id).one()
+    return serialize_entry(entry)
 
 @router.put("/{entry_id}", response_model=EntryResponse)
 def update_entry(
@@ -192,12 +158,15 @@ def update_entry(
     """
     Update an entry.
     """
+    rollups.lock_users(db, [current_user.id])
     entry = db.query(Entry).filter(
         Entry.id == entry_id,
         Entry.user_id == current_user.id
     ).first()
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
+    old_entry_point = rollups.entry_point(entry)
+    old_tag_ids = {tag.id for tag in entry.tags}
     
     # Extract tags and metrics and handle created_at
     entry_data = entry_in.model_dump(exclude_unset=True)
@@ -235,15 +204,22 @@ def update_entry(
             if not tag:
                 tag = Tag(name=tag_name)
                 db.add(tag)
-                db.commit()
-                db.refresh(tag)
+                db.flush()
             
             # Associate tag with entry
             entry.tags.append(tag)
     
     # Handle metrics if provided
+    old_metrics = []
+    new_metrics = []
+    new_categories = 0
     if metrics_data is not None:
         # Delete existing metrics for this entry
+        old_metrics = [
+            rollups.metric_point(m) for m in db.query(
+                Metric.created_at, Metric.category_id, Metric.metric_name, Metric.value, Metric.id
+            ).filter(Metric.entry_id == entry.id)
+        ]
         db.query(Metric).filter(Metric.entry_id == entry.id).delete()
         
         # Create new metrics
@@ -271,48 +247,41 @@ def update_entry(
                             user_id=current_user.id
                         )
                         db.add(new_category)
-                        db.commit()
-                        db.refresh(new_category)
+                        db.flush()
+                        new_categories += 1
                         metric_data["category_id"] = new_category.id
             
-            # Add entry_id to metric data
+            # Add entry_id and its owner to metric data
             metric_data["entry_id"] = entry.id
+            metric_data["user_id"] = current_user.id
             
             # Create metric
             metric = Metric(**metric_data)
             db.add(metric)
+            new_metrics.append(metric)
     
     db.add(entry)
-    db.commit()
-    db.refresh(entry)
     
-    # Prepare response
-    response = {
-        "id": entry.id,
-        "user_id": entry.user_id,
-        "title": entry.title,
-        "content": entry.content,
-        "priority": entry.priority,
-        "status": entry.status,
-        "created_at": entry.created_at,
-        "updated_at": entry.updated_at,
-        "tags": [tag.name for tag in entry.tags] if entry.tags else [],
-        "metrics": [
-            {
-                "id": metric.id,
-                "metric_name": metric.metric_name,
-                "value": float(metric.value),
-                "unit": metric.unit,
-                "entry_id": metric.entry_id,
-                "category_id": metric.category_id,
-                "category_name": metric.category.name if metric.category else None,
-                "created_at": metric.created_at,
-                "updated_at": metric.updated_at
-            } for metric in entry.metrics
-        ] if entry.metrics else []
-    }
+    # Update daily rollups in the same transaction as the entry
+    db.flush()
+    rollups.replace_entry(db, current_user.id, old_entry_point, rollups.entry_point(entry))
+    rollups.replace_metrics(db, current_user.id, old_metrics, [rollups.metric_point(m) for m in new_metrics])
+    new_tag_ids = {tag.id for tag in entry.tags}
+    user_stats.update(
+        db, current_user.id,
+        categories=new_categories,
+        metrics=len(new_metrics) - len(old_metrics),
+        linked_tags=new_tag_ids - old_tag_ids,
+        unlinked_tags=old_tag_ids - new_tag_ids,
+        entry_dates_changed="created_at" in entry_data
+    )
+    versioning.bump(db, [current_user.id])
+    db.commit()
+    cache_warmer.schedule(current_user.id)
     
-    return response
+    # Reload with tags and metrics for the response
+    entry = with_relations(db.query(Entry)).populate_existing().filter(Entry.id == entry_id).one()
+    return serialize_entry(entry)
 
 @router.delete("/{entry_id}")
 def delete_entry(
@@ -324,15 +293,30 @@ def delete_entry(
     """
     Delete an entry.
     """
+    rollups.lock_users(db, [current_user.id])
     entry = db.query(Entry).filter(
         Entry.id == entry_id,
         Entry.user_id == current_user.id
     ).first()
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
+    entry_point = rollups.entry_point(entry)
+    metric_points = [rollups.metric_point(m) for m in entry.metrics]
+    tag_ids = [tag.id for tag in entry.tags]
     
     db.delete(entry)
+    db.flush()
+    rollups.remove_entries(db, current_user.id, [entry_point])
+    rollups.remove_metrics(db, current_user.id, metric_points)
+    user_stats.update(
+        db, current_user.id,
+        entries=-1,
+        metrics=-len(metric_points),
+        unlinked_tags=tag_ids
+    )
+    versioning.bump(db, [current_user.id])
     db.commit()
+    cache_warmer.schedule(current_user.id)
     return {"status": "success"}
 
 @router.get("/{entry_id}", response_model=EntryResponse)
@@ -345,37 +329,11 @@ def read_entry(
     """
     Get entry by ID.
     """
-    entry = db.query(Entry).filter(
+    entry = with_relations(db.query(Entry)).filter(
         Entry.id == entry_id,
         Entry.user_id == current_user.id
     ).first()
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     
-    # Prepare response
-    response = {
-        "id": entry.id,
-        "user_id": entry.user_id,
-        "title": entry.title,
-        "content": entry.content,
-        "priority": entry.priority,
-        "status": entry.status,
-        "created_at": entry.created_at,
-        "updated_at": entry.updated_at,
-        "tags": [tag.name for tag in entry.tags] if entry.tags else [],
-        "metrics": [
-            {
-                "id": metric.id,
-                "metric_name": metric.metric_name,
-                "value": float(metric.value),
-                "unit": metric.unit,
-                "entry_id": metric.entry_id,
-                "category_id": metric.category_id,
-                "category_name": metric.category.name if metric.category else None,
-                "created_at": metric.created_at,
-                "updated_at": metric.updated_at
-            } for metric in entry.metrics
-        ] if entry.metrics else []
-    }
-    
-    return response 
\ No newline at end of file
+    return serialize_entry(entry) 
\ No newline at end of file
@@ -1,33 +1,39 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from backend.api import deps
+from backend.models.category import Category
 from backend.models.metric import Metric
 from backend.models.entry import Entry
 from backend.models.user import User
 from backend.schemas.metric import MetricCreate, MetricUpdate, MetricResponse
+from backend.services import pagination, rollups, user_stats, versioning
+from backend.services.warmup import cache_warmer
 
 router = APIRouter()
 
 @router.get("/", response_model=List[MetricResponse])
 def read_metrics(
+    *,
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_active_user),
+    response: Response,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
     entry_id: int = None,
     category: str = None,
 ) -> Any:
     """
-    Retrieve metrics.
+    Retrieve metrics, oldest first.
+    Pass a page's X-Next-Cursor header as cursor to get the next page.
     """
-    query = db.query(Metric).join(Entry).filter(Entry.user_id == current_user.id)
+    query = db.query(Metric).filter(Metric.user_id == current_user.id)
     if entry_id:
         query = query.filter(Metric.entry_id == entry_id)
     if category:
-        query = query.filter(Metric.category == category)
-    metrics = query.offset(skip).limit(limit).all()
-    return metrics
+        query = query.join(Category, Category.id == Metric.category_id).filter(Category.name == category)
+    return pagination.paginate(query, Metric, response, cursor, skip, limit)
 
 @router.post("/", response_model=MetricResponse)
 def create_metric(
@@ -39,6 +45,7 @@ def create_metric(
     """
     Create new metric.
     """
+    rollups.lock_users(db, [current_user.id])
     # Verify entry belongs to user
     entry = db.query(Entry).filter(
         Entry.id == metric_in.entry_id,
@@ -47,9 +54,14 @@ def create_metric(
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     
-    metric = Metric(**metric_in.model_dump())
+    metric = Metric(**metric_in.model_dump(), user_id=current_user.id)
     db.add(metric)
+    db.flush()
+    rollups.add_metrics(db, current_user.id, [rollups.metric_point(metric)])
+    user_stats.update(db, current_user.id, metrics=1)
+    versioning.bump(db, [current_user.id])
     db.commit()
+    cache_warmer.schedule(current_user.id)
     db.refresh(metric)
     return metric
 
@@ -64,18 +76,33 @@ def update_metric(
     """
     Update a metric.
     """
+    rollups.lock_users(db, [current_user.id])
     metric = db.query(Metric).join(Entry).filter(
         Metric.id == metric_id,
         Entry.user_id == current_user.id
     ).first()
     if not metric:
         raise HTTPException(status_code=404, detail="Metric not found")
+    old_point = rollups.metric_point(metric)
+    updates = metric_in.model_dump(exclude_unset=True)
+    if updates.get("entry_id", metric.entry_id) != metric.entry_id:
+        # Metrics only move between the user's own entries
+        entry = db.query(Entry).filter(
+            Entry.id == updates["entry_id"],
+            Entry.user_id == current_user.id
+        ).first()
+        if not entry:
+            raise HTTPException(status_code=404, detail="Entry not found")
     
-    for field, value in metric_in.model_dump(exclude_unset=True).items():
+    for field, value in updates.items():
         setattr(metric, field, value)
     
     db.add(metric)
+    db.flush()
+    rollups.replace_metrics(db, current_user.id, [old_point], [rollups.metric_point(metric)])
+    versioning.bump(db, [current_user.id])
     db.commit()
+    cache_warmer.schedule(current_user.id)
     db.refresh(metric)
     return metric
 
@@ -89,13 +116,20 @@ def delete_metric(
     """
     Delete a metric.
     """
+    rollups.lock_users(db, [current_user.id])
     metric = db.query(Metric).join(Entry).filter(
         Metric.id == metric_id,
         Entry.user_id == current_user.id
     ).first()
     if not metric:
         raise HTTPException(status_code=404, detail="Metric not found")
+    point = rollups.metric_point(metric)
     
     db.delete(metric)
+    db.flush()
+    rollups.remove_metrics(db, current_user.id, [point])
+    user_stats.update(db, current_user.id, metrics=-1)
+    versioning.bump(db, [current_user.id])
     db.commit()
+    cache_warmer.schedule(current_user.id)
     return {"status": "success"} 
\ No newline at end of file
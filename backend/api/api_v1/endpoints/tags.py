@@ -1,28 +1,37 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from backend.api import deps
 from backend.models.tag import Tag
 from backend.models.entry import Entry
 from backend.models.user import User
 from backend.schemas.tag import TagCreate, TagUpdate, TagResponse
+from backend.services import pagination, rollups, user_stats, versioning
 
 router = APIRouter()
 
+def _linked_user_ids(db: Session, tag_id: int) -> List[int]:
+    """Return the users whose entries carry a tag; tags are shared between users."""
+    rows = db.query(Entry.user_id).join(Entry.tags).filter(Tag.id == tag_id).distinct().all()
+    return [row.user_id for row in rows]
+
 @router.get("/", response_model=List[TagResponse])
 def read_tags(
+    *,
     db: Session = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_active_user),
+    response: Response,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
 ) -> Any:
     """
-    Retrieve tags.
+    Retrieve the tags used on the user's entries, oldest first.
+    Pass a page's X-Next-Cursor header as cursor to get the next page.
     """
-    tags = db.query(Tag).join(Tag.entries).filter(
-        Entry.user_id == current_user.id
-    ).distinct().offset(skip).limit(limit).all()
-    return tags
+    # EXISTS rather than a join and DISTINCT, so pages can walk the tags index in order
+    query = db.query(Tag).filter(Tag.entries.any(Entry.user_id == current_user.id))
+    return pagination.paginate(query, Tag, response, cursor, skip, limit)
 
 @router.post("/", response_model=TagResponse)
 def create_tag(
@@ -36,6 +45,7 @@ def create_tag(
     """
     tag = Tag(**tag_in.model_dump())
     db.add(tag)
+    versioning.bump(db, [current_user.id])
     db.commit()
     db.refresh(tag)
     return tag
@@ -62,6 +72,8 @@ def update_tag(
         setattr(tag, field, value)
     
     db.add(tag)
+    user_ids = _linked_user_ids(db, tag.id)
+    versioning.bump(db, user_ids)
     db.commit()
     db.refresh(tag)
     return tag
@@ -83,6 +95,13 @@ def delete_tag(
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
     
+    user_ids = _linked_user_ids(db, tag.id)
+    rollups.lock_users(db, user_ids)
+    rollups.detach_tag(db, tag)
     db.delete(tag)
+    db.flush()
+    for user_id in user_ids:
+        user_stats.update(db, user_id, unlinked_tags=[tag_id])
+    versioning.bump(db, user_ids)
     db.commit()
     return {"status": "success"} 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
@@ -9,6 +9,8 @@ from backend.core.config import settings
 from backend.db.session import get_db
 from backend.models.user import User
 from backend.schemas.token import TokenPayload
+from backend.services import series, versioning
+from backend.services.olap import olap_replica
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
@@ -36,4 +38,47 @@ def get_current_active_user(
 ) -> User:
     if not current_user.status == "active":
         raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user 
\ No newline at end of file
+    return current_user 
+
+def get_series_format(
+    accept: Optional[str] = Header(None),
+) -> Optional[str]:
+    """Columnar media type requested through the Accept header, or None for JSON."""
+    return series.negotiate(accept)
+
+def check_data_version(
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+) -> None:
+    """
+    Conditional GET support for user data routes.
+    Answers 304 when If-None-Match matches the user's current data version;
+    otherwise records the ETag for the response.
+    """
+    if request.method != "GET":
+        return
+    etag = versioning.etag_for(current_user, request.headers.get("accept"))
+    if versioning.matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+        )
+    request.state.etag = etag
+
+def get_analytics_db(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Generator:
+    """
+    Database session for read-only analytics.
+    Uses the DuckDB replica when it holds the user's current data version,
+    and the request's primary database session otherwise.
+    """
+    if not olap_replica.is_current(current_user):
+        yield db
+        return
+    replica = olap_replica.session()
+    try:
+        yield replica
+    finally:
+        replica.close()
@@ -11,6 +11,9 @@ from backend.models.entry import Entry
 from backend.models.metric import Metric
 from backend.models.tag import Tag
 from backend.models.audit import AuditLog
+from backend.models.rollup import MetricDailyRollup, EntryDailyRollup
+from backend.models.user_stats import UserStats
+from backend.models.analytics_job import AnalyticsJob
 
 # Import all models here for Alembic to detect them
 # This list is used by Alembic for database migrations
@@ -21,5 +24,9 @@ __all__ = [
     "Entry",
     "Metric",
     "Tag",
-    "AuditLog"
+    "AuditLog",
+    "MetricDailyRollup",
+    "EntryDailyRollup",
+    "UserStats",
+    "AnalyticsJob"
 ] 
\ No newline at end of file
@@ -4,16 +4,36 @@ This file initializes the FastAPI application, configures CORS, and sets up all
 It serves as the central configuration point for the entire backend application.
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from backend.core.config import settings
 from backend.api.api_v1.api import api_router
+from backend.services.warmup import cache_warmer
+from backend.services.olap import olap_replica
+from backend.services.jobs import job_runner
+from backend.services.versioning import ETagHeaderMiddleware
+from backend.services import charts
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the background workers for the application's lifetime."""
+    await cache_warmer.start()
+    await olap_replica.start()
+    if settings.ANALYTICS_JOBS_IN_API:
+        await job_runner.start()
+    yield
+    await job_runner.stop()
+    await olap_replica.stop()
+    await cache_warmer.stop()
+    charts.shutdown()
 
 # Initialize FastAPI application with project metadata
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Configure CORS middleware for frontend communication
@@ -24,8 +44,13 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Lets browser clients read the cursor of the next list page
+        expose_headers=["X-Next-Cursor"],
     )
 
+# Attach data-version ETags to successful GET responses
+app.add_middleware(ETagHeaderMiddleware)
+
 # Register all API routes under the API version prefix
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -0,0 +1,42 @@
+"""
+Analytics job model for the Personal Memo System.
+Defines the queue of expensive reports (all-time analytics, correlation
+matrices, full exports) computed in the background and polled by clients.
+"""
+
+from sqlalchemy import Column, Integer, String, Text, Enum, JSON, DateTime, ForeignKey, Index
+from .base import Base, TimestampMixin
+
+class AnalyticsJob(Base, TimestampMixin):
+    """
+    A queued analytics report.
+    Holds the report kind and parameters, its status and, once finished,
+    its result or error. Workers claim pending jobs by moving them to
+    running in a single conditional update that also increments attempts,
+    and store an outcome only while attempts still matches their claim.
+    """
+    __tablename__ = "analytics_jobs"
+    __table_args__ = (
+        # Workers pick the oldest pending job
+        Index("ix_analytics_jobs_status_created_at", "status", "created_at"),
+    )
+
+    # Primary key and owner
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    # Requested report
+    kind = Column(String(50), nullable=False)
+    params = Column(JSON, nullable=False)
+
+    # Progress and outcome
+    status = Column(
+        Enum('pending', 'running', 'succeeded', 'failed', name='analytics_job_status'),
+        nullable=False,
+        default='pending'
+    )
+    result = Column(JSON)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
@@ -16,4 +16,5 @@ class TimestampMixin:
     Automatically tracks creation and update times for database records.
     """
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
+    # Indexed for incremental loads into the analytics replica
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True) 
\ No newline at end of file
@@ -3,7 +3,7 @@ Category model for organizing metrics in the Personal Memo System.
 Defines the database schema for categories and their hierarchical relationships.
 """
 
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base, TimestampMixin
 
@@ -13,6 +13,10 @@ class Category(Base, TimestampMixin):
     Supports hierarchical categories and user-specific organization.
     """
     __tablename__ = "categories"
+    __table_args__ = (
+        # Keyset pages of a user's categories
+        Index("ix_categories_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     # Primary key and basic category information
     id = Column(Integer, primary_key=True, index=True)
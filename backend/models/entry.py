@@ -4,7 +4,7 @@ Defines the database schema for entries and their relationships with
 tags, and metrics.
 """
 
-from sqlalchemy import Column, Integer, String, Text, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Enum, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base, TimestampMixin
 
@@ -14,6 +14,10 @@ class Entry(Base, TimestampMixin):
     Stores the main content and metadata for each memo entry.
     """
     __tablename__ = "entries"
+    __table_args__ = (
+        # Time-windowed scans of a user's entries (trends, dashboard) and keyset pages
+        Index("ix_entries_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     # Primary key and basic entry information
     id = Column(Integer, primary_key=True, index=True)
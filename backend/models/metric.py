@@ -4,7 +4,7 @@ Defines the database schema for storing different types of metrics
 associated with entries and categories.
 """
 
-from sqlalchemy import Column, Integer, String, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base, TimestampMixin
 
@@ -15,9 +15,17 @@ class Metric(Base, TimestampMixin):
     Links to both entries and categories.
     """
     __tablename__ = "metrics"
+    __table_args__ = (
+        # Time-windowed scans of metrics for local-time bucketing and keyset pages
+        Index("ix_metrics_entry_id_created_at_id", "entry_id", "created_at", "id"),
+        # Keyset pages over all of a user's metrics
+        Index("ix_metrics_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     # Primary key and basic metric information
     id = Column(Integer, primary_key=True, index=True)
+    # Owner of the entry, copied so a user's metrics can be listed without going through entries
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     entry_id = Column(Integer, ForeignKey("entries.id", ondelete="CASCADE"), nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
     
@@ -0,0 +1,54 @@
+"""
+Daily rollup models for the Personal Memo System.
+Defines pre-aggregated per-day tables that are maintained on every write,
+so analytics can be answered from one row per day instead of raw records.
+"""
+
+from sqlalchemy import BigInteger, Column, Integer, String, Numeric, Date, Text, ForeignKey, UniqueConstraint
+from .base import Base, TimestampMixin
+
+class MetricDailyRollup(Base, TimestampMixin):
+    """
+    Per-day aggregate of a user's metric values.
+    Holds count, sum, min, max, a serialized t-digest of the values and a
+    checksum of the metric ids and values for each (user, day, category,
+    metric name).
+    """
+    __tablename__ = "metric_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", "category_id", "metric_name", name="uq_metric_daily_rollup"),
+    )
+
+    # Primary key and rollup key
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
+    metric_name = Column(String(100), nullable=False)
+
+    # Aggregated values
+    record_count = Column(Integer, nullable=False, default=0)
+    value_sum = Column(Numeric(20, 2), nullable=False, default=0)
+    value_min = Column(Numeric(10, 2))
+    value_max = Column(Numeric(10, 2))
+    digest = Column(Text, nullable=True)
+    value_checksum = Column(BigInteger, nullable=True)
+
+class EntryDailyRollup(Base, TimestampMixin):
+    """
+    Per-day aggregate of a user's entries.
+    Holds the number of entries and of entry-tag links created on each day.
+    """
+    __tablename__ = "entry_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", name="uq_entry_daily_rollup"),
+    )
+
+    # Primary key and rollup key
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+
+    # Aggregated values
+    entry_count = Column(Integer, nullable=False, default=0)
+    tag_count = Column(Integer, nullable=False, default=0)
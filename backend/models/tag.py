@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Table, ForeignKey
+from sqlalchemy import Column, Integer, String, Table, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base, TimestampMixin
 
@@ -12,6 +12,10 @@ entry_tags = Table(
 
 class Tag(Base, TimestampMixin):
     __tablename__ = "tags"
+    __table_args__ = (
+        # Keyset pages of tags; tags are shared, so pages filter them by the user's entries
+        Index("ix_tags_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), unique=True, nullable=False)
@@ -25,6 +25,9 @@ class User(Base, TimestampMixin):
     status = Column(Enum('active', 'inactive', 'suspended', name='user_status'), default='active')
     last_login = Column(DateTime)
 
+    # Incremented by every write to the user's data; used for ETags
+    data_version = Column(Integer, nullable=False, default=0)
+
     # Relationships with other entities
     categories = relationship("Category", back_populates="user", cascade="all, delete-orphan")
     entries = relationship("Entry", back_populates="user", cascade="all, delete-orphan") 
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""
+User statistics model for the Personal Memo System.
+Defines a per-user counters row that is maintained on every write, so
+dashboard totals are read from one row instead of counted on each load.
+"""
+
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from .base import Base, TimestampMixin
+
+class UserStats(Base, TimestampMixin):
+    """
+    Running totals of a user's records.
+    Holds entry, category, distinct tag and metric counts and the time of
+    the most recent entry.
+    """
+    __tablename__ = "user_stats"
+
+    # One row per user
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+    # Counters
+    entry_count = Column(Integer, nullable=False, default=0)
+    category_count = Column(Integer, nullable=False, default=0)
+    distinct_tag_count = Column(Integer, nullable=False, default=0)
+    metric_count = Column(Integer, nullable=False, default=0)
+    last_entry_at = Column(DateTime)
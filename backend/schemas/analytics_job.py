@@ -0,0 +1,43 @@
+from typing import Any, Dict, Literal, Optional
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field
+from .base import BaseSchema
+
+class AnalyticsJobParams(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+class AnalyticsReportParams(AnalyticsJobParams):
+    time_range: str = "all"
+    compare: Optional[str] = None
+    accuracy: str = "exact"
+
+class CorrelationReportParams(AnalyticsJobParams):
+    method: str = "pearson"
+    granularity: str = "day"
+    days: int = Field(3650, ge=1)
+    min_periods: int = Field(3, ge=2)
+
+class ExportParams(AnalyticsJobParams):
+    pass
+
+# Parameters accepted by each job kind
+JOB_PARAMS = {
+    "analytics": AnalyticsReportParams,
+    "correlation": CorrelationReportParams,
+    "export": ExportParams,
+}
+
+class AnalyticsJobCreate(BaseModel):
+    kind: Literal["analytics", "correlation", "export"]
+    params: Dict[str, Any] = {}
+
+class AnalyticsJobResponse(BaseSchema):
+    id: int
+    kind: str
+    params: Dict[str, Any]
+    status: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
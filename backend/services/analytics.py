@@ -0,0 +1,626 @@
+"""
+Analytics engine for the Personal Memo System.
+This module computes the aggregates behind the analytics endpoints from a
+single shared, filtered set of entries, so that each request scans the
+user's entries, metrics and tags once instead of once per statistic.
+
+With accuracy=approx the aggregates are computed from a deterministic
+sample of rows (by a multiplicative hash of their id) and scaled up, with
+95% confidence intervals, so all-time views of large accounts stay fast.
+"""
+
+import json
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import Float, Integer, String, case, cast, func, literal, null, select, type_coerce, union_all
+from sqlalchemy.orm import Session
+from backend.db.session import SessionLocal
+from backend.models.entry import Entry
+from backend.models.metric import Metric
+from backend.models.category import Category
+from backend.models.tag import Tag, entry_tags
+from backend.models.rollup import EntryDailyRollup, MetricDailyRollup
+from backend.core.config import settings
+from backend.services import budgets, buckets, statistics
+
+# Rows fetched per round trip when streaming metric values
+STREAM_BATCH_SIZE = 1000
+
+# Supported time ranges and the number of days they cover
+TIME_RANGES = {
+    "7d": 7,
+    "30d": 30,
+    "90d": 90,
+}
+
+# Supported values of the compare parameter
+COMPARISONS = ("previous",)
+
+# Supported values of the accuracy parameter
+ACCURACIES = ("exact", "approx")
+
+# Sampling maps ids onto 2**32 slots with Knuth's multiplicative hash;
+# a row is sampled when its slot falls below rate * 2**32
+_HASH_MULTIPLIER = 2654435761
+_HASH_SLOTS = 2 ** 32
+
+# Confidence level of approximate results and its normal quantile
+CONFIDENCE = 0.95
+CONFIDENCE_Z = 1.96
+
+def resolve_time_range(time_range: str, now: datetime = None) -> Tuple[datetime, datetime]:
+    """
+    Translate a time range identifier into a (start_date, end_date) window.
+
+    Args:
+        time_range: One of 7d, 30d, 90d or all. Unknown values mean all.
+        now: Optional reference time, defaults to the current UTC time
+
+    Returns:
+        Tuple[datetime, datetime]: The window; start_date is datetime.min for all
+    """
+    end_date = now or datetime.utcnow()
+    days = TIME_RANGES.get(time_range)
+    start_date = end_date - timedelta(days=days) if days else datetime.min
+    return start_date, end_date
+
+def format_day(value: Any) -> str:
+    """
+    Format a grouped date value as YYYY-MM-DD.
+    MySQL returns date objects for DATE() while SQLite returns strings.
+    """
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+def previous_window(start_date: datetime, end_date: datetime) -> Tuple[datetime, datetime]:
+    """Return the window of equal length immediately preceding start_date."""
+    return start_date - (end_date - start_date), start_date
+
+def sample_rate(population: int, target: int) -> float:
+    """Sampling rate that leaves about target of population rows (1.0 for all)."""
+    if not population or population <= target:
+        return 1.0
+    return target / population
+
+def entry_population(db: Session, user_id: int, start_date: datetime) -> int:
+    """Number of a user's entries created since start_date, summed from the daily rollups."""
+    query = db.query(func.sum(EntryDailyRollup.entry_count)).filter(EntryDailyRollup.user_id == user_id)
+    if start_date != datetime.min:
+        query = query.filter(EntryDailyRollup.day >= start_date.date())
+    return int(query.scalar() or 0)
+
+def metric_population(
+    db: Session,
+    user_id: int,
+    category: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> int:
+    """
+    Number of a user's metric records in a window, optionally of one
+    category, summed from the daily rollups (whole days, like the summary).
+    """
+    query = db.query(func.sum(MetricDailyRollup.record_count)).filter(MetricDailyRollup.user_id == user_id)
+    if category:
+        query = query.join(Category, Category.id == MetricDailyRollup.category_id).filter(Category.name == category)
+    if start_date:
+        query = query.filter(MetricDailyRollup.day >= start_date.date())
+    if end_date:
+        query = query.filter(MetricDailyRollup.day <= end_date.date())
+    return int(query.scalar() or 0)
+
+def sampled(column, rate: float):
+    """
+    Deterministic sample predicate on an integer id column.
+    The same id is always in or out of the sample for a given rate, so
+    repeated requests return the same estimates.
+    """
+    return (column * _HASH_MULTIPLIER) % _HASH_SLOTS < int(rate * _HASH_SLOTS)
+
+def count_estimate(count: int, rate: float, squares: Optional[float] = None) -> Tuple[float, List[float]]:
+    """
+    Scale a count observed in a sample of entries up to the population,
+    with its confidence interval. The lower bound never drops below the
+    observed count.
+
+    Args:
+        count: Sum over the sampled entries of what each contributes
+        rate: Sampling rate of the entries
+        squares: Sum over the sampled entries of the square of what each
+            contributes, when an entry can contribute more than one (such
+            as its metrics of a category); by default each contributes 0 or 1
+    """
+    estimate = count / rate
+    half_width = CONFIDENCE_Z * math.sqrt((count if squares is None else squares) * (1 - rate)) / rate
+    return estimate, [max(float(count), estimate - half_width), estimate + half_width]
+
+def scoped_entries(
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    split_at: Optional[datetime] = None,
+    rate: float = 1.0
+):
+    """
+    Build the shared CTE of a user's entries within the requested window.
+
+    Args:
+        user_id: Owner of the entries
+        start_date: Optional lower bound on Entry.created_at
+        split_at: Optional start of the current period when comparing;
+            entries before it belong to the previous period
+        rate: Fraction of entries to keep in a deterministic sample
+
+    Returns:
+        CTE exposing entry_id, created_at and in_current (1 for entries of
+        the current period, 0 for the previous one) columns
+    """
+    in_current = literal(1) if split_at is None else case(
+        (Entry.created_at >= split_at, 1), else_=0
+    )
+    query = select(
+        Entry.id.label("entry_id"),
+        Entry.created_at,
+        in_current.label("in_current")
+    ).where(Entry.user_id == user_id)
+    if start_date is not None and start_date != datetime.min:
+        query = query.where(Entry.created_at >= start_date)
+    if rate < 1:
+        query = query.where(sampled(Entry.id, rate))
+    return query.cte("scoped_entries")
+
+def _period_sums(in_current, per_entry=None, squares: bool = False) -> list:
+    """
+    Conditional sums of what each entry contributes (1, or per_entry) to
+    the current and previous periods, optionally with sums of squares.
+    """
+    current, previous = in_current, 1 - in_current
+    if per_entry is None:
+        # Contributions of 0 or 1 are their own squares
+        current_squares, previous_squares = current, previous
+    else:
+        current_squares, previous_squares = per_entry * per_entry * current, per_entry * per_entry * previous
+        current, previous = per_entry * current, per_entry * previous
+    columns = [func.sum(current).label("count"), func.sum(previous).label("previous_count")]
+    if squares:
+        columns += [
+            func.sum(current_squares).label("count_squares"),
+            func.sum(previous_squares).label("previous_count_squares")
+        ]
+    return columns
+
+def _grouped_scan(db: Session, scoped, squares: bool = False) -> list:
+    """
+    Run the per-day, per-category and per-tag groupings over the scoped
+    entries as one UNION ALL statement. Each row carries a kind
+    discriminator, an optional reference id, a label and, through
+    conditional aggregation, the counts of the current and previous periods.
+    With squares, rows also carry the sums of the squared per-entry counts
+    that sampled estimates need; an entry adds at most one to a day or a
+    tag, but any number of metrics to a category.
+    """
+    day = func.date(scoped.c.created_at)
+    by_day = select(
+        literal("day").label("kind"),
+        cast(null(), Integer).label("ref_id"),
+        cast(day, String).label("label"),
+        *_period_sums(scoped.c.in_current, squares=squares)
+    ).group_by(day)
+
+    if squares:
+        # Each entry's metrics per category first, so their squares can be summed
+        per_entry = select(
+            Metric.category_id,
+            scoped.c.in_current,
+            func.count(Metric.id).label("metrics")
+        ).select_from(
+            scoped.join(Metric, Metric.entry_id == scoped.c.entry_id)
+        ).group_by(scoped.c.entry_id, scoped.c.in_current, Metric.category_id).subquery()
+        by_category = select(
+            literal("category").label("kind"),
+            Category.id.label("ref_id"),
+            Category.name.label("label"),
+            *_period_sums(per_entry.c.in_current, per_entry.c.metrics, squares=True)
+        ).select_from(
+            per_entry.join(Category, Category.id == per_entry.c.category_id)
+        ).group_by(Category.id, Category.name)
+    else:
+        by_category = select(
+            literal("category").label("kind"),
+            Category.id.label("ref_id"),
+            Category.name.label("label"),
+            *_period_sums(scoped.c.in_current)
+        ).select_from(
+            scoped.join(Metric, Metric.entry_id == scoped.c.entry_id)
+            .join(Category, Category.id == Metric.category_id)
+        ).group_by(Category.id, Category.name)
+
+    by_tag = select(
+        literal("tag").label("kind"),
+        Tag.id.label("ref_id"),
+        Tag.name.label("label"),
+        *_period_sums(scoped.c.in_current, squares=squares)
+    ).select_from(
+        scoped.join(entry_tags, entry_tags.c.entry_id == scoped.c.entry_id)
+        .join(Tag, Tag.id == entry_tags.c.tag_id)
+    ).group_by(Tag.id, Tag.name)
+
+    return db.execute(union_all(by_day, by_category, by_tag)).all()
+
+def _most_used(counts: Dict[str, int]) -> str:
+    """Return the label with the highest count, or N/A when there is none."""
+    if not counts:
+        return "N/A"
+    return max(counts.items(), key=lambda item: item[1])[0]
+
+def _payload(
+    rows: list, count_field: str, start_date: datetime, end_date: datetime, rate: float = 1.0
+) -> Dict[str, Any]:
+    """
+    Build the analytics payload of one period from the grouped scan rows.
+    With a sampling rate below 1 the counts are scaled up to estimates,
+    each with an interval, and the payload gets an approximation block;
+    the rows must then come from a grouped scan with squares.
+    """
+    entries_by_date: Dict[str, int] = {}
+    category_counts: Dict[str, int] = {}
+    category_squares: Dict[str, int] = {}
+    category_ids = set()
+    tag_counts: Dict[str, int] = {}
+    for row in rows:
+        count = int(getattr(row, count_field) or 0)
+        if not count:
+            continue
+        if row.kind == "day":
+            day = format_day(row.label)
+            entries_by_date[day] = entries_by_date.get(day, 0) + count
+        elif row.kind == "category":
+            # Categories are grouped by id, but reported by name
+            category_ids.add(row.ref_id)
+            category_counts[row.label] = category_counts.get(row.label, 0) + count
+            if rate < 1:
+                squares = int(getattr(row, f"{count_field}_squares") or 0)
+                category_squares[row.label] = category_squares.get(row.label, 0) + squares
+        else:
+            tag_counts[row.label] = count
+
+    sampled_entries = sum(entries_by_date.values())
+    days_in_range = (end_date - start_date).days or 1  # Avoid division by zero
+    total_metrics = sum(category_counts.values())
+
+    def counted(item: Dict[str, Any], count: int, squares: Optional[int] = None) -> Dict[str, Any]:
+        if rate < 1:
+            estimate, interval = count_estimate(count, rate, squares)
+            item.update({"count": round(estimate), "interval": [round(bound) for bound in interval]})
+        else:
+            item["count"] = count
+        return item
+
+    category_distribution = [
+        counted({
+            "category": name,
+            "percentage": round(count / total_metrics * 100, 1) if total_metrics > 0 else 0
+        }, count, category_squares.get(name))
+        for name, count in category_counts.items()
+    ]
+    # Sort by percentage descending
+    category_distribution.sort(key=lambda x: x["percentage"], reverse=True)
+
+    total_entries, total_interval = count_estimate(sampled_entries, rate)
+    payload = {
+        "totalEntries": round(total_entries),
+        "totalCategories": len(category_ids),
+        "totalTags": len(tag_counts),
+        "averageEntriesPerDay": total_entries / days_in_range,
+        "mostActiveDay": _most_used(entries_by_date),
+        "mostUsedCategory": _most_used(category_counts),
+        "mostUsedTag": _most_used(tag_counts),
+        "entriesByCategory": category_distribution,
+        "entriesByDate": [
+            counted({"date": day}, count)
+            for day, count in sorted(entries_by_date.items())
+        ],
+        "entriesByTag": [
+            counted({"tag": name}, count)
+            for name, count in tag_counts.items()
+        ]
+    }
+    if rate < 1:
+        payload["approximation"] = {
+            "sampleRate": rate,
+            "sampledEntries": sampled_entries,
+            "confidence": CONFIDENCE,
+            "intervals": {
+                "totalEntries": [round(bound) for bound in total_interval],
+                "averageEntriesPerDay": [bound / days_in_range for bound in total_interval]
+            },
+            # Categories and tags missing from the sample are not counted
+            "lowerBounds": ["totalCategories", "totalTags"]
+        }
+    return payload
+
+def delta(current: Optional[float], previous: Optional[float]) -> Dict[str, Optional[float]]:
+    """Absolute and percentage change of a statistic between two periods."""
+    if current is None or previous is None:
+        return {"change": None, "percentChange": None}
+    return {
+        "change": current - previous,
+        "percentChange": round((current - previous) / previous * 100, 1) if previous else None
+    }
+
+def check_analytics_params(time_range: str = "30d", compare: Optional[str] = None, accuracy: str = "exact") -> None:
+    """
+    Validate compute_analytics parameters.
+
+    Raises:
+        ValueError: If compare or accuracy is unsupported, or compare is asked of an unbounded time_range
+    """
+    if accuracy not in ACCURACIES:
+        raise ValueError(f"Unsupported accuracy: {accuracy}")
+    if compare is None:
+        return
+    if compare not in COMPARISONS:
+        raise ValueError(f"Unsupported comparison: {compare}")
+    if time_range not in TIME_RANGES:
+        raise ValueError("compare=previous requires a bounded time_range")
+
+def compute_analytics(
+    db: Session,
+    user_id: int,
+    time_range: str = "30d",
+    compare: Optional[str] = None,
+    accuracy: str = "exact"
+) -> Dict[str, Any]:
+    """
+    Compute the comprehensive analytics payload for a user.
+
+    Args:
+        db: Database session
+        user_id: The user whose data is analysed
+        time_range: One of 7d, 30d, 90d or all
+        compare: previous to add the preceding equal-length range and the
+            deltas against it; requires a bounded time_range
+        accuracy: exact, or approx to estimate from a sample of about
+            ANALYTICS_APPROX_SAMPLE_SIZE of the user's entries in the scanned window
+
+    Returns:
+        Dict[str, Any]: The response served by GET /analytics/
+
+    Raises:
+        ValueError: If compare or accuracy is unsupported or time_range is unbounded
+    """
+    check_analytics_params(time_range, compare, accuracy)
+    start_date, end_date = resolve_time_range(time_range)
+    rate = 1.0
+    if accuracy == "approx":
+        # Sized from the entries of the scanned window, including the previous range when comparing
+        scanned_from = start_date
+        if compare is not None and start_date != datetime.min:
+            scanned_from = previous_window(start_date, end_date)[0]
+        rate = sample_rate(
+            entry_population(db, user_id, scanned_from), settings.ANALYTICS_APPROX_SAMPLE_SIZE
+        )
+
+    if compare is None:
+        rows = _grouped_scan(db, scoped_entries(user_id, start_date, rate=rate), squares=rate < 1)
+        return _payload(rows, "count", start_date, end_date, rate)
+
+    # One scan over both periods, split by conditional aggregation
+    previous_start, previous_end = previous_window(start_date, end_date)
+    rows = _grouped_scan(db, scoped_entries(user_id, previous_start, split_at=start_date, rate=rate), squares=rate < 1)
+    response = _payload(rows, "count", start_date, end_date, rate)
+    previous = _payload(rows, "previous_count", previous_start, previous_end, rate)
+    response["comparison"] = {
+        "currentRange": {"start": start_date.isoformat(), "end": end_date.isoformat()},
+        "previousRange": {"start": previous_start.isoformat(), "end": previous_end.isoformat()},
+        "previous": previous,
+        "deltas": {
+            key: delta(response[key], previous[key])
+            for key in ("totalEntries", "totalCategories", "totalTags", "averageEntriesPerDay")
+        }
+    }
+    return response
+
+def check_correlation_params(method: str = "pearson", granularity: str = "day") -> None:
+    """
+    Validate compute_correlation parameters.
+
+    Raises:
+        ValueError: If method or granularity is unsupported
+    """
+    if method not in statistics.CORRELATION_METHODS:
+        raise ValueError(f"Unsupported correlation method: {method}")
+    if granularity not in ("day", "hour"):
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+def compute_correlation(
+    db: Session,
+    user_id: int,
+    method: str = "pearson",
+    granularity: str = "day",
+    days: int = 90,
+    min_periods: int = 3
+) -> Dict[str, Any]:
+    """
+    Compute the correlation matrix of all of a user's category/metric name
+    series, averaged onto a common daily or hourly UTC grid.
+
+    Args:
+        db: Database session
+        user_id: The user whose data is analysed
+        method: One of statistics.CORRELATION_METHODS
+        granularity: day (from the rollups) or hour (from raw metrics)
+        days: Length of the window ending now
+        min_periods: Shared buckets needed for a coefficient
+
+    Returns:
+        Dict[str, Any]: The response served by GET /analytics/metrics/correlation
+
+    Raises:
+        ValueError: If method or granularity is unsupported
+    """
+    check_correlation_params(method, granularity)
+
+    start_date = datetime.utcnow() - timedelta(days=days)
+    if granularity == "day":
+        # Daily means straight from the rollups
+        rows = budgets.fetch_all(db.query(
+            Category.name.label('category'),
+            MetricDailyRollup.metric_name,
+            MetricDailyRollup.day.label('bucket'),
+            # Float, so the mean is not rounded to the sum's two decimals
+            type_coerce(
+                MetricDailyRollup.value_sum / MetricDailyRollup.record_count, Float
+            ).label('value')
+        ).outerjoin(
+            Category, Category.id == MetricDailyRollup.category_id
+        ).filter(
+            MetricDailyRollup.user_id == user_id,
+            MetricDailyRollup.day >= start_date.date()
+        ))
+    else:
+        bucket = buckets.bucket_label(db, Metric.created_at, "hour")
+        rows = budgets.fetch_all(db.query(
+            Category.name.label('category'),
+            Metric.metric_name,
+            bucket.label(buckets.BUCKET_LABEL),
+            func.avg(Metric.value).label('value')
+        ).join(
+            Entry, Entry.id == Metric.entry_id
+        ).outerjoin(
+            Category, Category.id == Metric.category_id
+        ).filter(
+            Entry.user_id == user_id,
+            Metric.created_at >= start_date
+        ).group_by(
+            Category.name, Metric.metric_name, buckets.grouped_by_bucket()
+        ))
+
+    result = statistics.correlation_matrix(rows, method, min_periods)
+    result.update({"method": method, "granularity": granularity, "days": days})
+    return result
+
+def metric_values_query(
+    db: Session, user_id: int, category: Optional[str] = None, metric_name: Optional[str] = None
+):
+    """
+    Build the query for a user's individual metric values, ordered by
+    category, metric name and time.
+
+    Args:
+        db: Database session
+        user_id: Owner of the metrics
+        category: Optional category name filter
+        metric_name: Optional metric name filter
+
+    Returns:
+        Query yielding id, category, metric_name, value, unit and created_at
+    """
+    query = db.query(
+        Metric.id,
+        Category.name.label('category'),
+        Metric.metric_name,
+        Metric.value,
+        Metric.unit,
+        Metric.created_at
+    ).join(
+        Entry, Entry.id == Metric.entry_id
+    ).join(
+        Category, Category.id == Metric.category_id
+    ).filter(
+        Entry.user_id == user_id
+    ).order_by(
+        Category.name, Metric.metric_name, Metric.created_at
+    )
+
+    if category:
+        query = query.filter(Category.name == category)
+    if metric_name:
+        query = query.filter(Metric.metric_name == metric_name)
+    return query
+
+def modal_units(db: Session, user_id: int) -> Dict[Tuple[str, str], str]:
+    """
+    Find the most common unit of each (category, metric_name) series.
+    Units are counted per series in SQL and ranked with a window function,
+    so only one row per series is returned; ties go to the first unit
+    alphabetically. Empty units are ignored.
+
+    Returns:
+        Dict mapping (category, metric_name) to its modal unit
+    """
+    unit_counts = db.query(
+        Category.name.label('category'),
+        Metric.metric_name.label('metric_name'),
+        Metric.unit.label('unit'),
+        func.count(Metric.id).label('unit_count')
+    ).join(
+        Entry, Entry.id == Metric.entry_id
+    ).join(
+        Category, Category.id == Metric.category_id
+    ).filter(
+        Entry.user_id == user_id,
+        Metric.unit.isnot(None),
+        Metric.unit != ''
+    ).group_by(
+        Category.name, Metric.metric_name, Metric.unit
+    ).subquery()
+
+    ranked = db.query(
+        unit_counts.c.category,
+        unit_counts.c.metric_name,
+        unit_counts.c.unit,
+        func.row_number().over(
+            partition_by=(unit_counts.c.category, unit_counts.c.metric_name),
+            order_by=(unit_counts.c.unit_count.desc(), unit_counts.c.unit)
+        ).label('unit_rank')
+    ).subquery()
+
+    rows = db.query(
+        ranked.c.category, ranked.c.metric_name, ranked.c.unit
+    ).filter(ranked.c.unit_rank == 1).all()
+    return {(row.category, row.metric_name): row.unit for row in rows}
+
+def iter_metric_values_ndjson(
+    user_id: int,
+    category: Optional[str] = None,
+    metric_name: Optional[str] = None,
+    batch_size: int = STREAM_BATCH_SIZE,
+    budget: Optional[budgets.Budget] = None
+) -> Iterator[str]:
+    """
+    Stream a user's metric values as NDJSON, one JSON object per line.
+    Rows are read through a server-side cursor in batches, so memory stays
+    flat regardless of history size. The generator opens its own session
+    because the request session is closed before a streamed body is sent.
+
+    The stream runs after its endpoint has returned, outside the request's
+    budget, so it checks the budget's wall clock itself between batches.
+    A stream cut short ends with a line holding only a degraded block.
+    """
+    deadline = time.monotonic() + budget.wall_clock_seconds if budget is not None else None
+    db = SessionLocal()
+    try:
+        query = metric_values_query(db, user_id, category, metric_name).yield_per(batch_size)
+        lines = []
+        for metric in query:
+            lines.append(json.dumps({
+                "id": metric.id,
+                "category": metric.category,
+                "metric_name": metric.metric_name,
+                "value": float(metric.value),
+                "unit": metric.unit,
+                "created_at": metric.created_at.isoformat()
+            }))
+            if len(lines) >= batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+                if deadline is not None and time.monotonic() >= deadline:
+                    yield json.dumps({"degraded": {"reason": budgets.WALL_CLOCK, "budget": budget.describe()}}) + "\n"
+                    return
+        if lines:
+            yield "\n".join(lines) + "\n"
+    finally:
+        db.close()
@@ -0,0 +1,206 @@
+"""
+Time bucketing helpers for trend analytics.
+This module builds dialect-aware SQL expressions that shift UTC
+timestamps into a user's time zone and label them by hour, day, week
+(starting Monday) or month, so grouping happens in the database. It also
+gap-fills the grouped rows so every bucket in the window is returned.
+
+Time zone shifts are piecewise: the window is split at the zone's UTC
+offset transitions (e.g. DST changes) and a CASE expression applies the
+right offset to each timestamp, so one query covers the whole window.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import Integer, case, func, literal, literal_column
+from sqlalchemy.orm import Session
+
+GRANULARITIES = ("hour", "day", "week", "month")
+
+# Most buckets one window may be gap-filled with
+MAX_BUCKETS = 10000
+
+# Shortest length of each bucket, in hours
+_BUCKET_HOURS = {"hour": 1, "day": 24, "week": 24 * 7, "month": 24 * 28}
+
+# Name under which the bucket label is selected and grouped
+BUCKET_LABEL = "bucket"
+
+def resolve_timezone(name: str) -> ZoneInfo:
+    """
+    Look up an IANA time zone by name.
+
+    Raises:
+        ValueError: If the zone is unknown
+    """
+    try:
+        return ZoneInfo(name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {name}")
+
+def bucket_count(granularity: str, days: int) -> int:
+    """Upper bound on the number of buckets in a window of days."""
+    return days * 24 // _BUCKET_HOURS[granularity] + 2
+
+def _offset_minutes(zone: ZoneInfo, instant: datetime) -> int:
+    """UTC offset of a zone, in minutes, at a naive UTC instant."""
+    offset = instant.replace(tzinfo=timezone.utc).astimezone(zone).utcoffset()
+    return int(offset.total_seconds() // 60)
+
+def offset_segments(zone: ZoneInfo, start: datetime, end: datetime) -> List[Tuple[Optional[datetime], int]]:
+    """
+    Split a naive UTC window into segments of constant UTC offset.
+
+    Returns:
+        List of (segment_end, offset_minutes); the last segment_end is None
+    """
+    segments = []
+    current = _offset_minutes(zone, start)
+    day = start
+    while day < end:
+        following = min(day + timedelta(days=1), end)
+        offset = _offset_minutes(zone, following)
+        if offset != current:
+            # Narrow the transition down to the minute
+            low, high = day, following
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if _offset_minutes(zone, middle) == current:
+                    low = middle
+                else:
+                    high = middle
+            segments.append((high, current))
+            current = offset
+        day = following
+    segments.append((None, current))
+    return segments
+
+def is_utc(zone: ZoneInfo, start: datetime, end: datetime) -> bool:
+    """Whether a zone has a zero UTC offset throughout the window."""
+    return offset_segments(zone, start, end) == [(None, 0)]
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+def localize(db: Session, column, zone: ZoneInfo, start: datetime, end: datetime):
+    """
+    Shift a naive UTC timestamp column into local wall time for the window.
+    """
+    segments = offset_segments(zone, start, end)
+    if len(segments) == 1:
+        offset = literal(segments[0][1], Integer)
+        if segments[0][1] == 0:
+            return column
+    else:
+        offset = case(
+            *[(column < segment_end, minutes) for segment_end, minutes in segments[:-1]],
+            else_=segments[-1][1]
+        )
+    if _dialect(db) == "sqlite":
+        return func.datetime(column, offset.concat(" minutes"))
+    return func.timestampadd(literal_column("MINUTE"), offset, column)
+
+def bucket_label(db: Session, local_column, granularity: str):
+    """
+    Build the SQL expression labelling a local timestamp (or date) with
+    the start of its bucket, as 'YYYY-MM-DD' or 'YYYY-MM-DD HH:00:00'.
+
+    Raises:
+        ValueError: If the granularity is unsupported
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    if _dialect(db) == "sqlite":
+        if granularity == "hour":
+            return func.strftime("%Y-%m-%d %H:00:00", local_column)
+        if granularity == "day":
+            return func.date(local_column)
+        if granularity == "week":
+            # Move forward to Sunday, then back to that week's Monday
+            return func.date(local_column, "weekday 0", "-6 days")
+        return func.strftime("%Y-%m-01", local_column)
+    if granularity == "hour":
+        return func.date_format(local_column, "%Y-%m-%d %H:00:00")
+    if granularity == "day":
+        return func.date_format(local_column, "%Y-%m-%d")
+    if granularity == "week":
+        return func.date_format(
+            func.subdate(func.date(local_column), func.weekday(local_column)), "%Y-%m-%d"
+        )
+    return func.date_format(local_column, "%Y-%m-01")
+
+def grouped_by_bucket():
+    """GROUP BY target for the bucket label, referenced by its alias."""
+    return literal_column(BUCKET_LABEL)
+
+def floor_bucket(moment: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing a local wall-clock time."""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(moment: datetime, granularity: str) -> datetime:
+    """Start of the bucket following the one starting at moment."""
+    if granularity == "hour":
+        return moment + timedelta(hours=1)
+    if granularity == "week":
+        return moment + timedelta(days=7)
+    if granularity == "month":
+        return (moment + timedelta(days=32)).replace(day=1)
+    return moment + timedelta(days=1)
+
+def parse_label(label) -> datetime:
+    """Parse a bucket label returned by the database into a naive local datetime."""
+    if isinstance(label, datetime):
+        return label
+    if isinstance(label, date):
+        return datetime.combine(label, datetime.min.time())
+    return datetime.fromisoformat(str(label))
+
+def format_bucket(moment: datetime, granularity: str) -> str:
+    """Format a bucket start for responses."""
+    if granularity == "hour":
+        return moment.isoformat(timespec="minutes")
+    return moment.date().isoformat()
+
+def to_utc(moment: datetime, zone: ZoneInfo) -> datetime:
+    """Convert a naive local wall-clock time into a naive UTC datetime."""
+    return moment.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+def fill(
+    rows: Sequence, granularity: str, zone: ZoneInfo, start: datetime, end: datetime
+) -> List[Tuple[datetime, tuple]]:
+    """
+    Gap-fill grouped rows over a naive UTC window.
+
+    Args:
+        rows: Rows of (bucket label, *aggregates)
+        granularity: Bucket size
+        zone: Time zone the labels are expressed in
+        start: Window start (naive UTC)
+        end: Window end (naive UTC)
+
+    Returns:
+        List of (local bucket start, aggregates or None) for every bucket in the window
+    """
+    found: Dict[datetime, tuple] = {
+        parse_label(row[0]): tuple(row[1:]) for row in rows
+    }
+    local_start = start.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None)
+    local_end = end.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None)
+    moment = floor_bucket(local_start, granularity)
+    last = floor_bucket(local_end, granularity)
+    filled = []
+    while moment <= last:
+        filled.append((moment, found.pop(moment, None)))
+        moment = next_bucket(moment, granularity)
+    # Rows outside the computed range (e.g. whole-day rollups) are kept in order
+    filled.extend(found.items())
+    filled.sort(key=lambda item: item[0])
+    return filled
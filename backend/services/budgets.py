@@ -0,0 +1,335 @@
+"""
+Query budgets for analytics endpoints in the Personal Memo System.
+Each analytics endpoint runs under a budget: a timeout per SQL statement,
+a wall-clock limit for the whole request and a maximum number of rows
+fetched by its row-returning queries. A request over its budget is
+cancelled cleanly and answered with a degraded payload, instead of
+holding a database connection and a worker thread for as long as its
+queries take.
+
+Statement timeouts are enforced by the database where it supports it:
+MySQL queries carry a MAX_EXECUTION_TIME hint on their top-level SELECT
+(after any WITH clause), SQLite statements are interrupted from a
+progress handler and DuckDB statements (the analytics replica) from a
+timer calling the connection's interrupt(). On other databases the wall
+clock is checked before each statement.
+
+The budget of the running request is kept in a context variable, so the
+engine event hooks below apply it to whichever session the endpoint uses.
+A request's wall clock starts when its endpoint is entered, or earlier
+inside clock_started(), so time spent waiting on another request's
+coalesced computation counts against it too.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from backend.core.config import settings
+
+# Reasons a request can exceed its budget
+STATEMENT_TIMEOUT = "statement_timeout"
+WALL_CLOCK = "wall_clock"
+ROW_LIMIT = "row_limit"
+
+# MySQL error raised when MAX_EXECUTION_TIME interrupts a statement
+_MYSQL_QUERY_TIMEOUT = 3024
+
+# SQLite virtual machine instructions between progress handler calls
+_SQLITE_PROGRESS_STEPS = 10000
+
+# Statements that are queries, with or without a WITH clause
+_QUERY_START = re.compile(r"\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+# Quoted literals and identifiers, parentheses and SELECT keywords, in statement order
+_SQL_TOKENS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|[()]|\bSELECT\b", re.IGNORECASE)
+
+@dataclass(frozen=True)
+class Budget:
+    """Limits of one analytics request."""
+    statement_timeout_ms: int
+    wall_clock_seconds: float
+    max_rows: int
+
+    def describe(self) -> dict:
+        return {
+            "statementTimeoutMs": self.statement_timeout_ms,
+            "wallClockSeconds": self.wall_clock_seconds,
+            "maxRows": self.max_rows
+        }
+
+class BudgetExceeded(Exception):
+    """Raised when a request runs past its statement timeout or wall clock."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Analytics query budget exceeded: {reason}")
+        self.reason = reason
+
+class _Usage:
+    """The running request's budget and what it has used so far."""
+
+    def __init__(self, budget: Budget, started: Optional[float] = None):
+        self.budget = budget
+        self.deadline = (started if started is not None else time.monotonic()) + budget.wall_clock_seconds
+        self.statement_deadline: Optional[float] = None
+        self.interrupted: Optional[str] = None
+        self.truncated = False
+
+    def statement_seconds(self) -> float:
+        """Time the next statement may take: its timeout, capped by the wall clock."""
+        return max(0.0, min(self.budget.statement_timeout_ms / 1000, self.deadline - time.monotonic()))
+
+_current: contextvars.ContextVar[Optional[_Usage]] = contextvars.ContextVar("analytics_budget", default=None)
+
+# When the running request's wall clock started, if before its endpoint applied its budget
+_clock_start: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("analytics_clock_start", default=None)
+
+def budget_for(endpoint: str) -> Budget:
+    """
+    Budget of an endpoint: the ANALYTICS_* defaults, overridden by the
+    endpoint's entry in ANALYTICS_BUDGET_OVERRIDES, a JSON object such as
+    {"metrics_correlation": {"max_rows": 500000}}.
+    """
+    budget = Budget(
+        statement_timeout_ms=settings.ANALYTICS_STATEMENT_TIMEOUT_MS,
+        wall_clock_seconds=settings.ANALYTICS_WALL_CLOCK_SECONDS,
+        max_rows=settings.ANALYTICS_MAX_ROWS
+    )
+    overrides = json.loads(settings.ANALYTICS_BUDGET_OVERRIDES or "{}").get(endpoint)
+    return replace(budget, **overrides) if overrides else budget
+
+def row_limit() -> Optional[int]:
+    """Maximum rows the running request may fetch, or None outside a budget."""
+    usage = _current.get()
+    return usage.budget.max_rows if usage is not None else None
+
+def fetch_all(query) -> list:
+    """
+    Run a query under the row budget. At most max_rows rows are fetched;
+    when more exist the request is flagged as truncated.
+    """
+    limit = row_limit()
+    if limit is None:
+        return query.all()
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        mark_truncated()
+        return rows[:limit]
+    return rows
+
+def current_budget() -> Optional[Budget]:
+    """Budget of the running request, or None outside a budget."""
+    usage = _current.get()
+    return usage.budget if usage is not None else None
+
+@contextlib.contextmanager
+def clock_started():
+    """Start the wall clock of the request whose endpoint runs inside the block."""
+    token = _clock_start.set(time.monotonic())
+    try:
+        yield
+    finally:
+        _clock_start.reset(token)
+
+def remaining_seconds(endpoint: str) -> Optional[float]:
+    """
+    Wall-clock seconds left to a request for the endpoint, counted from
+    the running budget or clock_started(); None when budgets are off.
+    """
+    usage = _current.get()
+    if usage is not None:
+        return max(0.0, usage.deadline - time.monotonic())
+    if not settings.ANALYTICS_BUDGETS_ENABLED:
+        return None
+    started = _clock_start.get()
+    elapsed = time.monotonic() - started if started is not None else 0.0
+    return max(0.0, budget_for(endpoint).wall_clock_seconds - elapsed)
+
+def mark_truncated() -> None:
+    """Flag the running request's result as partial after cutting it to the row budget."""
+    usage = _current.get()
+    if usage is not None:
+        usage.truncated = True
+
+@contextlib.contextmanager
+def applied(budget: Budget):
+    """
+    Run a block under a budget, such as a background job's. Endpoints
+    called inside it use this budget instead of their own, and raise
+    BudgetExceeded instead of returning a degraded payload. Yields the
+    block's usage, whose truncated flag tells whether a result was cut to
+    the row budget.
+    """
+    usage = _Usage(budget)
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+
+def limited(endpoint: str, empty: Dict[str, Any], fallback: Optional[Dict[str, Any]] = None) -> Callable:
+    """
+    Decorator running an analytics endpoint under its budget.
+    Place it below analytics_cache.cached, so degraded results are never
+    cached. A request over its statement timeout or wall clock returns
+    empty plus a degraded block; with fallback, it is first retried once
+    with those parameters replaced (for example accuracy=approx), within
+    what is left of the wall clock. Results cut to the row budget are
+    returned with a degraded block as well.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(**kwargs):
+            if not settings.ANALYTICS_BUDGETS_ENABLED:
+                return func(**kwargs)
+            outer = _current.get()
+            if outer is not None:
+                outer.truncated = False
+                result = func(**kwargs)
+                if outer.truncated and isinstance(result, dict):
+                    return {**result, "degraded": {"reason": ROW_LIMIT, "budget": outer.budget.describe()}}
+                return result
+
+            budget = budget_for(endpoint)
+            user_id = kwargs["current_user"].id
+            usage = _Usage(budget, _clock_start.get())
+            token = _current.set(usage)
+            try:
+                try:
+                    result = func(**kwargs)
+                    reason = ROW_LIMIT if usage.truncated else None
+                    used_fallback = False
+                except BudgetExceeded as e:
+                    print(f"Analytics budget exceeded in {endpoint} ({e.reason}) for user {user_id}")
+                    reason = e.reason
+                    result = dict(empty)
+                    used_fallback = fallback is not None and usage.deadline > time.monotonic()
+                    if used_fallback:
+                        # An interrupted DuckDB statement aborts the session's transaction
+                        if "db" in kwargs:
+                            kwargs["db"].rollback()
+                        try:
+                            result = func(**{**kwargs, **fallback})
+                        except BudgetExceeded:
+                            used_fallback = False
+            finally:
+                _current.reset(token)
+
+            if reason is None or not isinstance(result, dict):
+                return result
+            degraded = {"reason": reason, "budget": budget.describe()}
+            if used_fallback:
+                degraded["fallback"] = fallback
+            return {**result, "degraded": degraded}
+        return wrapper
+    return decorator
+
+def is_degraded(result: Any) -> bool:
+    """Whether a response was cut short by its budget and must not be cached."""
+    return isinstance(result, dict) and "degraded" in result
+
+def _top_level_select(statement: str) -> Optional[int]:
+    """
+    Offset just past the SELECT keyword of a query's top-level query block,
+    skipping the subqueries of a WITH clause; None for other statements.
+    """
+    if not _QUERY_START.match(statement):
+        return None
+    depth = 0
+    for match in _SQL_TOKENS.finditer(statement):
+        token = match.group()
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.upper() == "SELECT":
+            return match.end()
+    return None
+
+@event.listens_for(Engine, "before_cursor_execute", retval=True)
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    usage = _current.get()
+    dialect = conn.dialect.name
+    if usage is None:
+        if dialect == "sqlite" and conn.info.pop("budget_progress_handler", False):
+            conn.connection.driver_connection.set_progress_handler(None, 0)
+        return statement, parameters
+
+    seconds = usage.statement_seconds()
+    if seconds <= 0:
+        raise BudgetExceeded(WALL_CLOCK)
+    start = _top_level_select(statement) if dialect == "mysql" else None
+    if start is not None:
+        # The hint only applies to the top-level SELECT of the statement
+        hint = f"/*+ MAX_EXECUTION_TIME({max(1, int(seconds * 1000))}) */"
+        statement = f"{statement[:start]} {hint}{statement[start:]}"
+    elif dialect == "sqlite":
+        usage.statement_deadline = time.monotonic() + seconds
+        conn.connection.driver_connection.set_progress_handler(
+            functools.partial(_sqlite_progress, usage), _SQLITE_PROGRESS_STEPS
+        )
+        conn.info["budget_progress_handler"] = True
+    elif dialect == "duckdb":
+        timer = threading.Timer(seconds, _duckdb_interrupt, (usage, conn.connection.driver_connection))
+        timer.daemon = True
+        conn.info["budget_timer"] = timer
+        timer.start()
+    return statement, parameters
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _cancel_timer(conn)
+
+def _cancel_timer(conn) -> None:
+    timer = conn.info.pop("budget_timer", None)
+    if timer is not None:
+        timer.cancel()
+        # An interrupt that fired as the statement completed has nothing left to stop
+        usage = _current.get()
+        if usage is not None:
+            usage.interrupted = None
+
+def _duckdb_interrupt(usage: _Usage, connection) -> None:
+    usage.interrupted = WALL_CLOCK if time.monotonic() >= usage.deadline else STATEMENT_TIMEOUT
+    connection.interrupt()
+
+def _sqlite_progress(usage: _Usage) -> int:
+    # A non-zero return interrupts the running statement
+    now = time.monotonic()
+    if now < usage.statement_deadline:
+        return 0
+    usage.interrupted = WALL_CLOCK if now >= usage.deadline else STATEMENT_TIMEOUT
+    return 1
+
+def watch_errors(engine: Engine) -> None:
+    """
+    Map an engine's interrupted statements to BudgetExceeded. Only needed
+    for dialects that opt out of class-level error events, as duckdb_engine
+    does; all other engines are covered by the listener below.
+    """
+    event.listen(engine, "handle_error", _handle_error)
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    usage = _current.get()
+    if usage is None:
+        return
+    error = context.original_exception
+    dialect = context.engine.dialect.name if context.engine is not None else None
+    if dialect == "duckdb":
+        timer = context.connection.info.pop("budget_timer", None) if context.connection is not None else None
+        if timer is not None:
+            timer.cancel()
+    if dialect in ("sqlite", "duckdb"):
+        if usage.interrupted is not None:
+            reason, usage.interrupted = usage.interrupted, None
+            raise BudgetExceeded(reason) from error
+    elif (getattr(error, "errno", None) or (error.args[0] if error.args else None)) == _MYSQL_QUERY_TIMEOUT:
+        raise BudgetExceeded(STATEMENT_TIMEOUT) from error
@@ -0,0 +1,271 @@
+"""
+Analytics result cache for the Personal Memo System.
+This module caches analytics responses per user and normalized query
+parameters. Redis is used when REDIS_URL is reachable; otherwise an
+in-process LRU keeps local and test runs working without it. A worker
+that could not reach Redis serves from its LRU and retries Redis with
+exponential backoff, so an outage at startup does not leave it on a
+private cache for good.
+
+Every cache key includes the user's data version (see
+backend.services.versioning), which writes bump in their own transaction.
+The key therefore changes in the same commit as the data and the ETag,
+so a cached result is never served under a newer version than the one it
+was computed from; results of older versions simply age out.
+
+Identical requests arriving while one of them is being computed share
+that computation (see backend.services.singleflight), so a burst of
+misses for the same key runs the endpoint once. A request waits for it
+at most its own wall-clock budget, then runs the endpoint itself with
+whatever is left of it, which usually means returning its degraded
+payload.
+"""
+
+import base64
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional
+from fastapi import Response
+from backend.core.config import settings
+from backend.models.user import User
+from backend.services import budgets
+from backend.services.singleflight import SingleFlight
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional at runtime
+    redis = None
+
+# Dependency arguments that never take part in the cache key
+IGNORED_PARAMS = {"db", "current_user"}
+
+# Bounds of the backoff between attempts to reach Redis again
+REDIS_RETRY_MIN_SECONDS = 1.0
+REDIS_RETRY_MAX_SECONDS = 60.0
+
+class MemoryBackend:
+    """
+    In-process LRU backend used when Redis is unavailable.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class RedisBackend:
+    """
+    Redis backend shared by all API workers.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self.client.set(key, value, ex=ttl)
+
+def _normalize(value: Any) -> Any:
+    """Convert a query parameter into a stable, JSON-serializable form."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set)):
+        return sorted(_normalize(v) for v in value)
+    if hasattr(value, "value"):  # Enum members
+        return value.value
+    return value
+
+def normalize_params(params: Dict[str, Any]) -> str:
+    """
+    Build the parameter part of a cache key.
+    Parameters left at None are dropped and the rest are sorted by name.
+    """
+    normalized = {
+        name: _normalize(value)
+        for name, value in params.items()
+        if name not in IGNORED_PARAMS and value is not None
+    }
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+
+class AnalyticsCache:
+    """
+    Cache of analytics responses keyed by user, endpoint and parameters.
+    The backend is chosen lazily on first use; while it is the in-process
+    fallback for an unreachable Redis, Redis is retried with backoff.
+    """
+
+    def __init__(self):
+        self._backend = None
+        # Monotonic time of the next Redis attempt, None when not retrying
+        self._retry_at: Optional[float] = None
+        self._retry_delay = REDIS_RETRY_MIN_SECONDS
+        self._lock = threading.Lock()
+        self.flights = SingleFlight()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        elif self._retry_at is not None and time.monotonic() >= self._retry_at:
+            self._retry_redis()
+        return self._backend
+
+    @staticmethod
+    def _connect_redis() -> Optional[RedisBackend]:
+        """Return a Redis backend, or None when Redis does not answer."""
+        try:
+            client = redis.Redis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5
+            )
+            client.ping()
+            return RedisBackend(client)
+        except Exception as e:
+            print(f"Analytics cache: Redis unavailable ({str(e)}), using in-process cache")
+            return None
+
+    def _create_backend(self):
+        if redis is None or not settings.REDIS_URL:
+            return MemoryBackend(settings.ANALYTICS_CACHE_MAX_ENTRIES)
+        backend = self._connect_redis()
+        if backend is not None:
+            return backend
+        self._retry_delay = REDIS_RETRY_MIN_SECONDS
+        self._retry_at = time.monotonic() + self._retry_delay
+        return MemoryBackend(settings.ANALYTICS_CACHE_MAX_ENTRIES)
+
+    def _retry_redis(self) -> None:
+        """Try to move from the in-process fallback back to Redis."""
+        with self._lock:
+            if self._retry_at is None or time.monotonic() < self._retry_at:
+                return
+            # Claim the attempt; other requests keep using the fallback meanwhile
+            self._retry_at = float("inf")
+        backend = self._connect_redis()
+        with self._lock:
+            if backend is not None:
+                self._backend = backend
+                self._retry_at = None
+                print("Analytics cache: Redis reachable again")
+            else:
+                self._retry_delay = min(self._retry_delay * 2, REDIS_RETRY_MAX_SECONDS)
+                self._retry_at = time.monotonic() + self._retry_delay
+
+    def reset(self) -> None:
+        """Drop the current backend; the next use chooses one again."""
+        with self._lock:
+            self._backend = None
+            self._retry_at = None
+
+    @staticmethod
+    def key_for(user: User, endpoint: str, params: Dict[str, Any]) -> str:
+        """Build the cache key for a user's request at their current data version."""
+        return f"analytics:{user.id}:{user.data_version or 0}:{endpoint}:{normalize_params(params)}"
+
+    def get_or_compute(
+        self, user: User, endpoint: str, params: Dict[str, Any], compute: Callable[[], Any]
+    ) -> Any:
+        """
+        Return the cached result for the request, computing and storing it on a miss.
+        Cache failures are never fatal; the result is then computed directly.
+        """
+        if not settings.ANALYTICS_CACHE_ENABLED:
+            return compute()
+        try:
+            key = self.key_for(user, endpoint, params)
+            cached = self.backend.get(key)
+        except Exception as e:
+            print(f"Analytics cache read failed: {str(e)}")
+            return compute()
+        if cached is not None:
+            return json.loads(cached)
+
+        result = compute()
+        if isinstance(result, Response) or budgets.is_degraded(result):
+            # Binary and streamed responses are served as they are, degraded ones recomputed
+            return result
+        try:
+            self.backend.set(key, json.dumps(result, default=str), settings.ANALYTICS_CACHE_TTL_SECONDS)
+        except Exception as e:
+            print(f"Analytics cache write failed: {str(e)}")
+        return result
+
+    def get_or_compute_bytes(self, key: str, compute: Callable[[], bytes], ttl: int) -> bytes:
+        """
+        Binary counterpart of get_or_compute for a fully built key.
+        Values are stored base64-encoded, so every backend can hold them.
+        """
+        if not settings.ANALYTICS_CACHE_ENABLED:
+            return compute()
+        try:
+            cached = self.backend.get(key)
+        except Exception as e:
+            print(f"Analytics cache read failed: {str(e)}")
+            return compute()
+        if cached is not None:
+            return base64.b64decode(cached)
+
+        result = compute()
+        try:
+            self.backend.set(key, base64.b64encode(result).decode("ascii"), ttl)
+        except Exception as e:
+            print(f"Analytics cache write failed: {str(e)}")
+        return result
+
+    def cached(self, endpoint: str) -> Callable:
+        """
+        Decorator for analytics endpoints taking db and current_user.
+        The remaining keyword arguments form the normalized cache key.
+        Concurrent calls with the same user, data version and parameters
+        share one cache lookup and computation, which each call waits for
+        no longer than its own wall-clock budget.
+        """
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(**kwargs):
+                current_user = kwargs["current_user"]
+
+                def compute() -> Any:
+                    return self.get_or_compute(
+                        current_user, endpoint, kwargs, lambda: func(**kwargs)
+                    )
+
+                if not settings.ANALYTICS_COALESCE_ENABLED:
+                    return compute()
+                key = (current_user.id, current_user.data_version or 0, endpoint, normalize_params(kwargs))
+                with budgets.clock_started():
+                    return self.flights.do(key, compute, budgets.remaining_seconds(endpoint))
+            return wrapper
+        return decorator
+
+# Global cache instance shared by the analytics and chart routers
+analytics_cache = AnalyticsCache()
@@ -0,0 +1,123 @@
+"""
+Server-side chart rendering for the Personal Memo System.
+This module renders the trend, category distribution and metric scatter
+views as PNG or SVG with matplotlib, for clients that cannot chart large
+datasets themselves.
+
+Rendering runs in a small process pool, so CPU-heavy drawing never holds
+the API process's GIL. The render functions take plain, picklable data
+and import matplotlib inside the worker; the API process never loads it.
+"""
+
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from backend.core.config import settings
+from backend.services.cache import normalize_params
+
+# Output formats and their media types
+FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+# Resolution used to turn pixel sizes into figure inches
+DPI = 100
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _figure(width: int, height: int):
+    """Create a figure and axes without pyplot, so no GUI state is involved."""
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(width / DPI, height / DPI), dpi=DPI, layout="constrained")
+    return figure, figure.subplots()
+
+def _save(figure, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+def render_trend(
+    labels: Sequence[str], values: Sequence[Optional[float]], title: str,
+    fmt: str, width: int, height: int
+) -> bytes:
+    """Render a bucketed trend as a line chart; empty buckets leave gaps."""
+    figure, axes = _figure(width, height)
+    positions = range(len(labels))
+    axes.plot(
+        positions, [float("nan") if value is None else value for value in values],
+        marker="o", markersize=3
+    )
+    step = max(len(labels) // 10, 1)
+    axes.set_xticks(list(positions)[::step], list(labels)[::step], rotation=45, ha="right")
+    axes.set_title(title)
+    axes.set_ylabel("Average value")
+    axes.grid(alpha=0.3)
+    return _save(figure, fmt)
+
+def render_distribution(
+    labels: Sequence[str], counts: Sequence[int], title: str,
+    fmt: str, width: int, height: int
+) -> bytes:
+    """Render a category distribution as a horizontal bar chart."""
+    figure, axes = _figure(width, height)
+    positions = range(len(labels))
+    axes.barh(positions, counts)
+    axes.set_yticks(list(positions), list(labels))
+    axes.invert_yaxis()
+    axes.set_title(title)
+    axes.set_xlabel("Records")
+    return _save(figure, fmt)
+
+def render_scatter(
+    series: List[Tuple[str, Sequence[datetime], Sequence[float]]], title: str,
+    fmt: str, width: int, height: int
+) -> bytes:
+    """Render one or more (name, timestamps, values) series as a scatter plot."""
+    figure, axes = _figure(width, height)
+    for name, timestamps, values in series:
+        axes.scatter(timestamps, values, s=8, label=name)
+    if len(series) > 1:
+        axes.legend(loc="best", fontsize="small")
+    axes.set_title(title)
+    axes.grid(alpha=0.3)
+    figure.autofmt_xdate()
+    return _save(figure, fmt)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers do not inherit the API process's threads and sockets
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.CHART_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def render(function, *args) -> bytes:
+    """
+    Run a render function in the chart process pool and wait for the image.
+
+    Raises:
+        concurrent.futures.TimeoutError: If rendering exceeds CHART_RENDER_TIMEOUT_SECONDS
+    """
+    future = _get_pool().submit(function, *args)
+    return future.result(timeout=settings.CHART_RENDER_TIMEOUT_SECONDS)
+
+def shutdown() -> None:
+    """Stop the chart process pool, if it was started."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def cache_key(user_id: int, data_version: int, chart: str, params: Dict) -> str:
+    """Key of a rendered chart; a new data version orphans all of a user's charts."""
+    return f"charts:{user_id}:{data_version}:{chart}:{normalize_params(params)}"
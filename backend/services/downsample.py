@@ -0,0 +1,113 @@
+"""
+Server-side downsampling of metric series for charts.
+This module reduces a series to at most max_points points with NumPy,
+so chart clients receive what they can actually draw. Supported methods:
+    lttb:   Largest-Triangle-Three-Buckets, keeps visually salient points
+    minmax: keeps the minimum and maximum point of each bucket
+    avg:    replaces each bucket by its mean timestamp and value
+lttb and minmax return a subset of the original points; avg synthesizes
+new ones.
+"""
+
+from typing import NamedTuple, Optional
+import numpy as np
+from backend.services.series import Series
+
+METHODS = ("lttb", "minmax", "avg")
+
+class Downsampled(NamedTuple):
+    """A downsampled series and, for lttb/minmax, the kept point indices."""
+    series: Series
+    indices: Optional[np.ndarray]
+
+def _bucket_starts(n: int, n_buckets: int) -> np.ndarray:
+    """Assign n points to n_buckets equal-count buckets and return each bucket's first index."""
+    bucket = (np.arange(n) * n_buckets) // n
+    return np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Select max_points indices with Largest-Triangle-Three-Buckets.
+    The first and last points are always kept; each interior bucket keeps
+    the point forming the largest triangle with the previously kept point
+    and the mean of the next bucket. Work per bucket is vectorized.
+    """
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1][:max_points])
+
+    xf = x.astype(np.float64)
+    # n_out - 2 interior buckets over points 1 .. n-2
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            avg_x = xf[end:edges[i + 2]].mean()
+            avg_y = y[end:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = xf[n - 1], y[n - 1]
+        area = np.abs(
+            (xf[a] - avg_x) * (y[start:end] - y[a])
+            - (xf[a] - xf[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Select the minimum and maximum of max_points // 2 buckets, in time order."""
+    n = len(y)
+    if max_points >= n:
+        return np.arange(n)
+    n_buckets = max(max_points // 2, 1)
+    bucket = (np.arange(n) * n_buckets) // n
+    # Sort by bucket, then value: each bucket's first is its min, last its max
+    order = np.lexsort((y, bucket))
+    sorted_bucket = bucket[order]
+    firsts = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+    lasts = np.r_[firsts[1:] - 1, n - 1]
+    return np.unique(np.concatenate([order[firsts], order[lasts]]))
+
+def bucket_means(x: np.ndarray, y: np.ndarray, max_points: int):
+    """Average timestamps and values over max_points equal-count buckets."""
+    n = len(x)
+    if max_points >= n:
+        return x, y
+    starts = _bucket_starts(n, max_points)
+    counts = np.diff(np.r_[starts, n])
+    mean_x = np.add.reduceat(x.astype(np.float64), starts) / counts
+    mean_y = np.add.reduceat(y, starts) / counts
+    return np.rint(mean_x).astype(np.int64), mean_y
+
+def downsample(series: Series, max_points: int, method: str = "lttb") -> Downsampled:
+    """
+    Reduce a series to at most max_points points.
+
+    Args:
+        series: The series to reduce
+        max_points: Maximum number of points to return
+        method: One of lttb, minmax or avg
+
+    Returns:
+        Downsampled: The reduced series; indices is None for avg
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unsupported downsampling method: {method}")
+    if len(series.values) <= max_points:
+        return Downsampled(series, np.arange(len(series.values)))
+    if method == "avg":
+        x, y = bucket_means(series.timestamps, series.values, max_points)
+        return Downsampled(series._replace(timestamps=x, values=y), None)
+    if method == "minmax":
+        indices = minmax_indices(series.values, max_points)
+    else:
+        indices = lttb_indices(series.timestamps, series.values, max_points)
+    return Downsampled(
+        series._replace(timestamps=series.timestamps[indices], values=series.values[indices]),
+        indices
+    )
@@ -0,0 +1,50 @@
+"""
+Entry loading and serialization for the Personal Memo System.
+Entry responses include the entry's tags and its metrics with their
+category names. Loading those lazily costs a query per entry and per
+metric, so entry queries go through with_relations(), which fetches
+them for a whole page at once: one query for the entries, one for their
+tags and one for their metrics joined to categories, whatever the page
+size. serialize_entry() then builds the response without touching the
+database.
+"""
+
+from sqlalchemy.orm import Query, selectinload
+from backend.models.entry import Entry
+from backend.models.metric import Metric
+
+def with_relations(query: Query) -> Query:
+    """Eager-load the tags and metrics (with categories) of the entries a query returns."""
+    return query.options(
+        selectinload(Entry.tags),
+        selectinload(Entry.metrics).joinedload(Metric.category)
+    )
+
+def serialize_metric(metric: Metric) -> dict:
+    """Build the response dict of a metric loaded with its category."""
+    return {
+        "id": metric.id,
+        "metric_name": metric.metric_name,
+        "value": float(metric.value),
+        "unit": metric.unit,
+        "entry_id": metric.entry_id,
+        "category_id": metric.category_id,
+        "category_name": metric.category.name if metric.category else None,
+        "created_at": metric.created_at,
+        "updated_at": metric.updated_at
+    }
+
+def serialize_entry(entry: Entry) -> dict:
+    """Build the EntryResponse dict of an entry loaded through with_relations()."""
+    return {
+        "id": entry.id,
+        "user_id": entry.user_id,
+        "title": entry.title,
+        "content": entry.content,
+        "priority": entry.priority,
+        "status": entry.status,
+        "created_at": entry.created_at,
+        "updated_at": entry.updated_at,
+        "tags": [tag.name for tag in entry.tags],
+        "metrics": [serialize_metric(metric) for metric in entry.metrics]
+    }
@@ -0,0 +1,79 @@
+"""
+Full data export for the Personal Memo System.
+Builds a JSON document of everything a user has recorded: categories,
+tags, and every entry with its tags and metrics. Exports run as
+background analytics jobs, since they read the user's whole history.
+"""
+
+from datetime import datetime
+from sqlalchemy.orm import Session, selectinload
+from backend.models.category import Category
+from backend.models.entry import Entry
+from backend.models.metric import Metric
+from backend.models.tag import Tag, entry_tags
+
+def export_user_data(db: Session, user_id: int) -> dict:
+    """
+    Export a user's categories, tags and entries.
+    Tags and metrics are loaded with one query each for all entries,
+    rather than one per entry.
+
+    Args:
+        db: Database session
+        user_id: Owner of the data
+
+    Returns:
+        dict: JSON-ready export document
+    """
+    categories = db.query(Category).filter(Category.user_id == user_id).order_by(Category.id).all()
+    tags = db.query(Tag.name).join(
+        entry_tags, entry_tags.c.tag_id == Tag.id
+    ).join(
+        Entry, Entry.id == entry_tags.c.entry_id
+    ).filter(Entry.user_id == user_id).distinct().order_by(Tag.name).all()
+    entries = db.query(Entry).options(
+        selectinload(Entry.tags),
+        selectinload(Entry.metrics)
+    ).filter(Entry.user_id == user_id).order_by(Entry.created_at, Entry.id).all()
+    category_names = {category.id: category.name for category in categories}
+
+    return {
+        "exportedAt": datetime.utcnow().isoformat(),
+        "categories": [
+            {
+                "id": category.id,
+                "name": category.name,
+                "description": category.description,
+                "parent_category_id": category.parent_category_id,
+                "is_active": category.is_active,
+                "created_at": category.created_at.isoformat() if category.created_at else None
+            }
+            for category in categories
+        ],
+        "tags": [row.name for row in tags],
+        "entries": [
+            {
+                "id": entry.id,
+                "title": entry.title,
+                "content": entry.content,
+                "priority": entry.priority,
+                "status": entry.status,
+                "created_at": entry.created_at.isoformat() if entry.created_at else None,
+                "updated_at": entry.updated_at.isoformat() if entry.updated_at else None,
+                "tags": sorted(tag.name for tag in entry.tags),
+                "metrics": [_export_metric(metric, category_names) for metric in entry.metrics]
+            }
+            for entry in entries
+        ]
+    }
+
+def _export_metric(metric: Metric, category_names: dict) -> dict:
+    return {
+        "id": metric.id,
+        "metric_name": metric.metric_name,
+        "value": float(metric.value),
+        "unit": metric.unit,
+        "category_id": metric.category_id,
+        "category_name": category_names.get(metric.category_id),
+        "created_at": metric.created_at.isoformat() if metric.created_at else None
+    }
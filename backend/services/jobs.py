@@ -0,0 +1,265 @@
+"""
+Background analytics jobs for the Personal Memo System.
+Expensive reports (all-time analytics, correlation matrices, full
+exports) are queued as rows in analytics_jobs and computed by a worker
+pool, so they never hold a request thread or run into proxy timeouts.
+Clients poll the job until it has succeeded or failed.
+
+Workers claim the oldest pending job with a conditional update, so any
+number of worker pools, in API processes or standalone, can share the
+queue. A job left running by a worker that died is claimed again once it
+has been running for ANALYTICS_JOB_RECLAIM_SECONDS, well past its budget.
+Each claim increments the job's attempt counter, and a worker stores its
+outcome only while the job still carries its attempt, so a slow worker
+that was presumed dead can never overwrite the outcome of the claim that
+replaced it. Jobs run under their own query budget
+(ANALYTICS_JOB_TIMEOUT_SECONDS) instead of the request budget, and
+finished jobs are deleted after ANALYTICS_JOB_RETENTION_HOURS.
+
+A standalone worker pool, sized with ANALYTICS_JOB_WORKERS independently
+of the API (set ANALYTICS_JOBS_IN_API=false there), runs with:
+    python -m backend.services.jobs
+"""
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from backend.core.config import settings
+from backend.db.session import SessionLocal
+from backend.models.analytics_job import AnalyticsJob
+from backend.models.user import User
+from backend.services import budgets
+
+# Finished states; a job in one of them never changes again
+FINISHED = ("succeeded", "failed")
+
+class JobRunner:
+    """
+    Worker pool running queued analytics jobs.
+    Each job kind maps to a function called as compute(db, user, **params),
+    and optionally to one called as validate(**params) on submission.
+    """
+
+    def __init__(self, workers: int, poll_interval: float):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._kinds: Dict[str, Callable[..., Any]] = {}
+        self._validators: Dict[str, Callable[..., None]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def register(self, kind: str, compute: Callable[..., Any], validate: Optional[Callable[..., None]] = None) -> None:
+        """Add a job kind; validate raises ValueError for parameters compute would reject."""
+        self._kinds[kind] = compute
+        if validate is not None:
+            self._validators[kind] = validate
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None and not self._runner.done()
+
+    async def start(self) -> None:
+        """Start the worker pool on the running event loop."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analytics-job")
+        self._runner = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop claiming jobs and wait for the running ones. Jobs cut short by
+        a hard shutdown are claimed again after ANALYTICS_JOB_RECLAIM_SECONDS.
+        """
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        self._runner = None
+
+    def submit(self, db: Session, user: User, kind: str, params: Dict[str, Any]) -> AnalyticsJob:
+        """
+        Queue a job for a user and wake the local worker pool.
+
+        Raises:
+            HTTPException: 400 when the kind rejects the parameters, 429 when
+                the user already has too many unfinished jobs
+        """
+        validate = self._validators.get(kind)
+        if validate is not None:
+            try:
+                validate(**params)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        unfinished = db.query(AnalyticsJob).filter(
+            AnalyticsJob.user_id == user.id,
+            AnalyticsJob.status.in_(("pending", "running"))
+        ).count()
+        if unfinished >= settings.ANALYTICS_JOB_MAX_PER_USER:
+            raise HTTPException(status_code=429, detail="Too many analytics jobs in progress")
+
+        job = AnalyticsJob(user_id=user.id, kind=kind, params=params, status="pending")
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        if self.running:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                # The loop is shutting down; another worker will claim the job
+                pass
+        return job
+
+    async def _run(self) -> None:
+        while True:
+            await self._slots.acquire()
+            claim = self._loop.run_in_executor(self._executor, self._claim)
+            try:
+                claimed = await asyncio.shield(claim)
+            except asyncio.CancelledError:
+                # Stopping mid-claim: a job claimed meanwhile still runs, and stop() waits for it
+                claimed = (await asyncio.gather(claim, return_exceptions=True))[0]
+                if isinstance(claimed, tuple):
+                    self._start(*claimed)
+                raise
+            except Exception as e:
+                print(f"Analytics job claim failed: {str(e)}")
+                claimed = None
+            if claimed is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            self._start(*claimed)
+
+    def _start(self, job_id: int, attempt: int) -> None:
+        task = self._loop.create_task(self._execute(job_id, attempt))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job_id: int, attempt: int) -> None:
+        try:
+            await self._loop.run_in_executor(self._executor, self.run_job, job_id, attempt)
+        finally:
+            self._slots.release()
+
+    def _claim(self) -> Optional[Tuple[int, int]]:
+        """Move the oldest claimable job to running; returns its id and attempt, or None."""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            stale = now - timedelta(seconds=settings.ANALYTICS_JOB_RECLAIM_SECONDS)
+            claimable = or_(
+                AnalyticsJob.status == "pending",
+                and_(AnalyticsJob.status == "running", AnalyticsJob.started_at < stale)
+            )
+            candidates = db.query(AnalyticsJob.id, AnalyticsJob.attempts).filter(claimable).order_by(
+                AnalyticsJob.created_at, AnalyticsJob.id
+            ).limit(self.workers).all()
+            for candidate in candidates:
+                # Only one worker's update matches while the job still has the attempt it was read with
+                claimed = db.query(AnalyticsJob).filter(
+                    AnalyticsJob.id == candidate.id, AnalyticsJob.attempts == candidate.attempts, claimable
+                ).update({
+                    "status": "running", "started_at": now, "attempts": candidate.attempts + 1
+                }, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    return candidate.id, candidate.attempts + 1
+
+            if not candidates:
+                db.query(AnalyticsJob).filter(
+                    AnalyticsJob.status.in_(FINISHED),
+                    AnalyticsJob.finished_at < now - timedelta(hours=settings.ANALYTICS_JOB_RETENTION_HOURS)
+                ).delete(synchronize_session=False)
+                db.commit()
+            return None
+        finally:
+            db.close()
+
+    def run_job(self, job_id: int, attempt: int) -> None:
+        """Compute a claimed job and store its outcome, unless the job was claimed again meanwhile."""
+        db = SessionLocal()
+        try:
+            job = db.query(AnalyticsJob).filter(AnalyticsJob.id == job_id).first()
+            user = db.query(User).filter(User.id == job.user_id).first() if job else None
+            if job is None or user is None:
+                return
+            kind, params = job.kind, job.params
+            try:
+                compute = self._kinds[kind]
+                budget = budgets.Budget(
+                    statement_timeout_ms=int(settings.ANALYTICS_JOB_TIMEOUT_SECONDS * 1000),
+                    wall_clock_seconds=settings.ANALYTICS_JOB_TIMEOUT_SECONDS,
+                    max_rows=settings.ANALYTICS_JOB_MAX_ROWS
+                )
+                with budgets.applied(budget) as usage:
+                    result = compute(db, user, **params)
+                if usage.truncated and isinstance(result, dict):
+                    result = {**result, "degraded": {"reason": budgets.ROW_LIMIT, "budget": budget.describe()}}
+                # Dates and decimals are stored the way the analytics cache serves them
+                outcome = {"status": "succeeded", "result": json.loads(json.dumps(result, default=str))}
+            except Exception as e:
+                print(f"Analytics job {job_id} ({kind}) failed: {str(e)}")
+                outcome = {"status": "failed", "error": e.detail if isinstance(e, HTTPException) else str(e)}
+            db.rollback()
+            stored = db.query(AnalyticsJob).filter(
+                AnalyticsJob.id == job_id,
+                AnalyticsJob.status == "running",
+                AnalyticsJob.attempts == attempt
+            ).update({**outcome, "finished_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+            if not stored:
+                print(f"Analytics job {job_id} was claimed again during attempt {attempt}; its outcome is dropped")
+        finally:
+            db.close()
+
+# Global worker pool, started with the application unless ANALYTICS_JOBS_IN_API is off
+job_runner = JobRunner(
+    workers=settings.ANALYTICS_JOB_WORKERS,
+    poll_interval=settings.ANALYTICS_JOB_POLL_SECONDS
+)
+
+async def _serve() -> None:
+    await job_runner.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_runner.stop()
+
+def main(argv: Optional[list] = None) -> None:
+    """Run a standalone worker pool until interrupted."""
+    parser = argparse.ArgumentParser(description="Run queued analytics jobs.")
+    parser.parse_args(argv)
+    # Job kinds are registered by the job endpoints module
+    import backend.api.api_v1.endpoints.analytics_jobs  # noqa: F401
+    print(f"Running analytics jobs with {job_runner.workers} workers")
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
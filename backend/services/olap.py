@@ -0,0 +1,355 @@
+"""
+Embedded DuckDB analytical replica for the Personal Memo System.
+When OLAP_ENABLED is set, the analytical tables (entries, metrics,
+entry_tags, categories, tags, the daily rollups and user_stats) are copied
+into a local DuckDB file, and read-only analytics endpoints run their
+group-bys there with columnar execution instead of on the transactional
+database.
+
+The loader is incremental. Rows whose updated_at moved past the last
+watermark are upserted, re-reading a short overlap so rows committed late
+are not missed. Deletions and tag links cannot be seen through updated_at,
+so for each user whose data_version changed the loader compares count and
+checksum fingerprints of their rows and links, and reconciles ids only
+where they differ.
+
+The replica lags the primary database by up to one sync interval. The
+loader records which data_version of each user it holds, and a request is
+routed to the replica only when that matches the user's current version,
+so cached responses never mix stale replica data with a new version.
+
+DuckDB allows one writing process per database file; with several worker
+processes, give each its own OLAP_DUCKDB_PATH. A one-off sync can be run with:
+    python -m backend.services.olap
+"""
+
+import argparse
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import Column, DateTime, Enum, Integer, MetaData, String, Table, create_engine, func, inspect, select
+from sqlalchemy.orm import Session, sessionmaker
+from backend.core.config import settings
+from backend.db import base as models
+from backend.db.session import SessionLocal
+from backend.models.user import User
+from backend.models.entry import Entry
+from backend.models.metric import Metric
+from backend.models.tag import entry_tags
+from backend.services import budgets
+
+try:
+    import duckdb
+    import pandas
+except ImportError:  # pragma: no cover - duckdb is optional at runtime
+    duckdb = None
+
+# Mirrored tables, in load order; all but entry_tags carry updated_at
+MIRRORED_TABLES = (
+    "categories",
+    "tags",
+    "entries",
+    "metrics",
+    "entry_tags",
+    "metric_daily_rollups",
+    "entry_daily_rollups",
+    "user_stats",
+)
+
+# Tables whose rows belong to a user through a user_id column
+_USER_TABLES = ("categories", "entries", "metric_daily_rollups", "entry_daily_rollups")
+
+# Rows re-read before each watermark, for transactions that committed late
+_OVERLAP = timedelta(minutes=5)
+
+# Rows per batch copied into DuckDB
+_BATCH_SIZE = 10000
+
+# Checksum of tag links: a multiplicative hash of (entry_id, tag_id) modulo a prime
+_HASH_MULTIPLIER = 2654435761
+_HASH_MODULUS = 4294967291
+
+def _replica_metadata() -> MetaData:
+    """
+    Replica schema: the mirrored tables' columns and primary keys, without
+    foreign keys or indexes, plus the loader's bookkeeping tables.
+    """
+    metadata = MetaData()
+    for name in MIRRORED_TABLES:
+        source = models.Base.metadata.tables[name]
+        Table(name, metadata, *[
+            Column(
+                column.name,
+                String(column.type.length) if isinstance(column.type, Enum) else column.type,
+                primary_key=column.primary_key,
+                autoincrement=False
+            )
+            for column in source.columns
+        ])
+    Table(
+        "replica_users", metadata,
+        Column("user_id", Integer, primary_key=True, autoincrement=False),
+        Column("data_version", Integer, nullable=False)
+    )
+    Table(
+        "replica_watermarks", metadata,
+        Column("table_name", String(64), primary_key=True),
+        Column("watermark", DateTime, nullable=False)
+    )
+    return metadata
+
+class OlapReplica:
+    """
+    DuckDB replica of the analytical tables, with its periodic loader.
+    """
+
+    def __init__(self, path: str, sync_interval: float):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._engine = None
+        self._sessions: Optional[sessionmaker] = None
+        self._versions: Dict[int, int] = {}
+        self._sync_lock = threading.Lock()
+        self._runner: Optional[asyncio.Task] = None
+
+    def _ensure_engine(self) -> None:
+        if self._engine is not None:
+            return
+        self._engine = create_engine(f"duckdb:///{self.path}")
+        budgets.watch_errors(self._engine)
+        _replica_metadata().create_all(self._engine)
+        self._add_missing_columns()
+        # Marked read-only, so shared helpers never write to the replica file
+        self._sessions = sessionmaker(autocommit=False, autoflush=False, bind=self._engine, info={"read_only": True})
+        with self._engine.connect() as connection:
+            rows = connection.execute(select(
+                _replica_metadata().tables["replica_users"]
+            )).all()
+        self._versions = {row.user_id: row.data_version for row in rows}
+
+    def _add_missing_columns(self) -> None:
+        """Add columns the mirrored tables gained since the replica file was created."""
+        inspector = inspect(self._engine)
+        with self._engine.begin() as connection:
+            for table in _replica_metadata().tables.values():
+                existing = {column["name"] for column in inspector.get_columns(table.name)}
+                missing = [column for column in table.columns if column.name not in existing]
+                for column in missing:
+                    column_type = column.type.compile(dialect=self._engine.dialect)
+                    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                if missing:
+                    # Dropping the watermark recopies the table, filling the new columns in
+                    connection.exec_driver_sql(
+                        "DELETE FROM replica_watermarks WHERE table_name = ?", (table.name,)
+                    )
+
+    def is_current(self, user: User) -> bool:
+        """Whether the replica holds the user's current data version."""
+        return self._sessions is not None and self._versions.get(user.id) == (user.data_version or 0)
+
+    def session(self) -> Session:
+        """Open a read session on the replica."""
+        return self._sessions()
+
+    async def start(self) -> None:
+        """Create the replica and start the periodic loader on the running event loop."""
+        if not settings.OLAP_ENABLED:
+            return
+        if duckdb is None:
+            print("OLAP replica: duckdb is not installed, analytics stay on the primary database")
+            return
+        if self._runner is not None and not self._runner.done():
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._ensure_engine)
+        self._runner = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic loader, waiting for a running sync."""
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sync)
+            except Exception as e:
+                print(f"OLAP replica sync failed: {str(e)}")
+            await asyncio.sleep(self.sync_interval)
+
+    def sync(self) -> int:
+        """
+        Copy changes from the primary database into the replica.
+
+        Returns:
+            int: Number of users whose replicated data version changed
+        """
+        self._ensure_engine()
+        with self._sync_lock:
+            source = SessionLocal()
+            # Through the engine: DuckDB refuses a second, differently configured handle on the file
+            connection = self._engine.raw_connection()
+            try:
+                return self._sync(source, connection.driver_connection)
+            finally:
+                connection.close()
+                source.close()
+
+    def _sync(self, source: Session, target) -> int:
+        watermarks = dict(target.execute(
+            "SELECT table_name, watermark FROM replica_watermarks"
+        ).fetchall())
+
+        # Versions first: data read afterwards includes every write they count
+        since = watermarks.get("users")
+        query = source.query(User.id, User.data_version, User.updated_at)
+        if since is not None:
+            query = query.filter(User.updated_at >= since - _OVERLAP)
+        users = query.all()
+        changed = {
+            row.id: row.data_version or 0 for row in users
+            if self._versions.get(row.id) != (row.data_version or 0)
+        }
+
+        target.begin()
+        try:
+            new_watermarks = {}
+            for name in MIRRORED_TABLES:
+                if name == "entry_tags":
+                    continue
+                latest = self._copy_changes(
+                    source, target, models.Base.metadata.tables[name], watermarks.get(name)
+                )
+                if latest is not None:
+                    new_watermarks[name] = latest
+            for user_id in changed:
+                self._reconcile_user(source, target, user_id)
+
+            if users:
+                new_watermarks["users"] = max(row.updated_at for row in users if row.updated_at)
+            for name, watermark in new_watermarks.items():
+                target.execute(
+                    "INSERT OR REPLACE INTO replica_watermarks VALUES (?, ?)", [name, watermark]
+                )
+            for user_id, version in changed.items():
+                target.execute("INSERT OR REPLACE INTO replica_users VALUES (?, ?)", [user_id, version])
+            target.commit()
+        except Exception:
+            target.rollback()
+            raise
+
+        self._versions.update(changed)
+        return len(changed)
+
+    def _write(self, target, table_name: str, columns: List[str], rows: Iterable) -> None:
+        frame = pandas.DataFrame(list(rows), columns=columns, dtype=object)
+        target.register("replica_batch", frame)
+        try:
+            target.execute(
+                f"INSERT OR REPLACE INTO {table_name} ({', '.join(columns)}) "
+                f"SELECT {', '.join(columns)} FROM replica_batch"
+            )
+        finally:
+            target.unregister("replica_batch")
+
+    def _copy_changes(self, source: Session, target, table, since) -> Optional[datetime]:
+        """Upsert rows updated since the watermark; returns the new watermark."""
+        query = select(table)
+        if since is not None:
+            query = query.where(table.c.updated_at >= since - _OVERLAP)
+        columns = [column.name for column in table.columns]
+        latest = None
+        result = source.execute(query.execution_options(yield_per=_BATCH_SIZE))
+        for batch in result.partitions():
+            self._write(target, table.name, columns, batch)
+            batch_latest = max((row.updated_at for row in batch if row.updated_at), default=None)
+            if batch_latest is not None and (latest is None or batch_latest > latest):
+                latest = batch_latest
+        return latest
+
+    def _reconcile_user(self, source: Session, target, user_id: int) -> None:
+        """
+        Remove a user's rows and links that no longer exist on the primary
+        database. Each set is compared by a (count, checksum) fingerprint
+        first and only re-read when it differs. Ids only grow, so a deletion
+        balanced by an insertion still changes the sum of ids.
+        """
+        user_entries = "SELECT id FROM entries WHERE user_id = ?"
+
+        # Metrics, through the user's entries
+        source_metrics = source.query(func.count(Metric.id), func.sum(Metric.id)).join(
+            Entry, Entry.id == Metric.entry_id
+        ).filter(Entry.user_id == user_id).one()
+        replica_metrics = target.execute(
+            f"SELECT count(id), sum(id) FROM metrics WHERE entry_id IN ({user_entries})", [user_id]
+        ).fetchone()
+        if _fingerprint(source_metrics) != _fingerprint(replica_metrics):
+            keep = [row.id for row in source.query(Metric.id).join(
+                Entry, Entry.id == Metric.entry_id
+            ).filter(Entry.user_id == user_id)]
+            target.execute(
+                f"DELETE FROM metrics WHERE entry_id IN ({user_entries}) AND NOT list_contains(?, id)",
+                [user_id, keep]
+            )
+
+        # Tag links have no id; hash each pair so moved links change the checksum
+        link_hash = (entry_tags.c.entry_id * _HASH_MULTIPLIER + entry_tags.c.tag_id) % _HASH_MODULUS
+        source_links = source.query(func.count(), func.sum(link_hash)).select_from(entry_tags).join(
+            Entry, Entry.id == entry_tags.c.entry_id
+        ).filter(Entry.user_id == user_id).one()
+        replica_links = target.execute(
+            f"SELECT count(*), sum((entry_id * {_HASH_MULTIPLIER} + tag_id) % {_HASH_MODULUS}) "
+            f"FROM entry_tags WHERE entry_id IN ({user_entries})", [user_id]
+        ).fetchone()
+        if _fingerprint(source_links) != _fingerprint(replica_links):
+            target.execute(f"DELETE FROM entry_tags WHERE entry_id IN ({user_entries})", [user_id])
+            links = source.query(entry_tags.c.entry_id, entry_tags.c.tag_id).join(
+                Entry, Entry.id == entry_tags.c.entry_id
+            ).filter(Entry.user_id == user_id).all()
+            if links:
+                self._write(target, "entry_tags", ["entry_id", "tag_id"], links)
+
+        for name in _USER_TABLES:
+            table = models.Base.metadata.tables[name]
+            source_rows = source.query(func.count(table.c.id), func.sum(table.c.id)).filter(
+                table.c.user_id == user_id
+            ).one()
+            replica_rows = target.execute(
+                f"SELECT count(id), sum(id) FROM {name} WHERE user_id = ?", [user_id]
+            ).fetchone()
+            if _fingerprint(source_rows) != _fingerprint(replica_rows):
+                keep = [row.id for row in source.query(table.c.id).filter(table.c.user_id == user_id)]
+                target.execute(
+                    f"DELETE FROM {name} WHERE user_id = ? AND NOT list_contains(?, id)",
+                    [user_id, keep]
+                )
+
+def _fingerprint(row) -> tuple:
+    count, checksum = row
+    return int(count or 0), int(checksum or 0)
+
+# Global replica, started and stopped with the application
+olap_replica = OlapReplica(
+    path=settings.OLAP_DUCKDB_PATH,
+    sync_interval=settings.OLAP_SYNC_INTERVAL_SECONDS
+)
+
+def main(argv: Optional[list] = None) -> None:
+    """Run one replica sync."""
+    parser = argparse.ArgumentParser(description="Copy changes into the DuckDB analytics replica.")
+    parser.parse_args(argv)
+    if duckdb is None:
+        raise SystemExit("duckdb is not installed")
+    changed = olap_replica.sync()
+    print(f"Synced {olap_replica.path}: {changed} users updated")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Keyset pagination for the Personal Memo System's list endpoints.
+Lists are ordered by (created_at, id) and each page starts after the last
+row of the previous one, instead of skipping an offset, so with
+indexes ending in (created_at, id) a page deep into a large account
+costs the same as the first one, and rows written meanwhile never shift
+or repeat a page.
+
+Cursors are opaque to clients. When more rows follow a page, the
+response carries the cursor of the next page in the X-Next-Cursor header;
+pass it back as ?cursor= to continue. The response body stays a plain
+list, so clients using skip/limit keep working.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Build the cursor of the page following a row."""
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Read the (created_at, id) position a cursor points after.
+
+    Raises:
+        HTTPException: 400 when the cursor was not issued by encode_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate(query: Query, model, response: Response, cursor: Optional[str] = None,
+             skip: int = 0, limit: int = 100) -> list:
+    """
+    Fetch one page of a query over a model with created_at and id columns.
+    Sets the next page's cursor on the response when more rows follow.
+
+    Args:
+        query: Filtered query over model
+        model: Mapped class whose rows are listed
+        response: Response to set the next cursor header on
+        cursor: Cursor from a previous page, or None for the first page
+        skip: Rows to skip after the cursor (kept for offset clients)
+        limit: Maximum rows in the page
+
+    Returns:
+        list: Rows of the page
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # The redundant >= bound lets every backend seek the index instead of scanning the OR
+        query = query.filter(
+            model.created_at >= created_at,
+            or_(model.created_at > created_at, and_(model.created_at == created_at, model.id > row_id))
+        )
+    query = query.order_by(model.created_at, model.id)
+    if skip:
+        query = query.offset(skip)
+    # One extra row tells whether another page follows
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if rows:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows
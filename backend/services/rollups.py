@@ -0,0 +1,431 @@
+"""
+Daily rollup maintenance for the Personal Memo System.
+This module keeps the metric and entry rollup tables in step with the raw
+records. The write endpoints call it inside their own transactions, after
+flushing, so rollups and raw rows are always committed together.
+
+Rollup writes of a user are serialized by locking the user's row
+(lock_users) for the rest of the write transaction, so concurrent writes
+can neither lose an increment nor both create the same bucket; a NULL
+category_id is not covered by the unique key, so the lock is what keeps
+such buckets unique. Buckets are read with locking reads, which see the
+latest committed row whatever snapshot the transaction started with, and
+counters are updated in place (record_count = record_count + n).
+
+Metric rollups also hold a quantile digest of each day's values, and a
+checksum of the bucket's metric ids and values that lets the series cache
+tell appends from edits without rescanning the metrics. Buckets written
+before digests or checksums existed can be filled in with:
+    python -m backend.services.rollups [--user-id ID]
+"""
+
+import argparse
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Collection, Iterable, NamedTuple, Optional
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from backend.models.entry import Entry
+from backend.models.metric import Metric
+from backend.models.tag import Tag, entry_tags
+from backend.models.rollup import MetricDailyRollup, EntryDailyRollup
+from backend.models.user import User
+from backend.core.config import settings
+from backend.services.sketches import TDigest, from_values
+
+# Metric values are stored with two decimal places
+CENT = Decimal("0.01")
+
+# Bucket checksums: a multiplicative hash of (metric id, value in cents), summed modulo a prime
+CHECKSUM_MULTIPLIER = 2654435761
+CHECKSUM_MODULUS = 4294967291
+
+class MetricPoint(NamedTuple):
+    """Snapshot of the rollup-relevant fields of a single metric."""
+    day: date
+    category_id: Optional[int]
+    metric_name: str
+    value: Decimal
+    metric_id: int
+
+class EntryPoint(NamedTuple):
+    """Snapshot of the rollup-relevant fields of a single entry."""
+    day: date
+    tag_count: int
+
+def to_day(value: Optional[datetime]) -> date:
+    """Return the calendar day of a timestamp, defaulting to today (UTC)."""
+    return (value or datetime.utcnow()).date()
+
+def parse_day(value) -> date:
+    """
+    Parse a grouped DATE() value into a date.
+    MySQL returns date objects for DATE() while SQLite returns strings.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def _to_decimal(value) -> Decimal:
+    return Decimal(str(value)).quantize(CENT)
+
+def metric_point(metric: Metric) -> MetricPoint:
+    """Capture a metric's rollup key and value. Call after the metric is flushed."""
+    return MetricPoint(
+        to_day(metric.created_at),
+        metric.category_id,
+        metric.metric_name,
+        _to_decimal(metric.value),
+        metric.id
+    )
+
+def metric_checksum(metric_id: int, value) -> int:
+    """Contribution of one metric to its bucket's checksum."""
+    cents = int(_to_decimal(value) / CENT)
+    return (metric_id * CHECKSUM_MULTIPLIER + cents) % CHECKSUM_MODULUS
+
+def bucket_checksum(rows: Iterable) -> int:
+    """Checksum of a bucket's metrics, from rows with id and value."""
+    return sum(metric_checksum(row.id, row.value) for row in rows) % CHECKSUM_MODULUS
+
+def entry_point(entry: Entry) -> EntryPoint:
+    """Capture an entry's rollup key and tag count. Call after the entry is flushed."""
+    return EntryPoint(to_day(entry.created_at), len(entry.tags))
+
+def lock_users(db: Session, user_ids: Iterable[int]) -> None:
+    """
+    Lock users' rows until the end of the transaction, serializing their
+    rollup writes. The rollup writers take it themselves; write endpoints
+    also take it before their first write, since inserting child rows
+    first would make concurrent writers deadlock upgrading to this lock.
+    """
+    user_ids = sorted(set(user_ids))
+    if user_ids:
+        # Locked in id order, so writes spanning several users cannot deadlock
+        db.query(User.id).filter(User.id.in_(user_ids)).order_by(User.id).with_for_update().all()
+
+def day_metrics(db: Session, user_id: int, day: date, category_id: Optional[int], metric_name: str,
+                lock: bool = False) -> list:
+    """
+    Read the ids and raw values of one metric rollup bucket.
+    Rollup writers pass lock=True for a locking read of the latest committed values.
+    """
+    start = datetime.combine(day, time.min)
+    query = db.query(Metric.id, Metric.value).join(Entry).filter(
+        Entry.user_id == user_id,
+        Metric.category_id == category_id,
+        Metric.metric_name == metric_name,
+        Metric.created_at >= start,
+        Metric.created_at < start + timedelta(days=1)
+    )
+    if lock:
+        query = query.with_for_update()
+    return query.all()
+
+def day_values(db: Session, user_id: int, day: date, category_id: Optional[int], metric_name: str,
+               lock: bool = False) -> list:
+    """Read the raw values of one metric rollup bucket."""
+    return [row.value for row in day_metrics(db, user_id, day, category_id, metric_name, lock)]
+
+def day_digest(db: Session, user_id: int, day: date, category_id: Optional[int], metric_name: str,
+               lock: bool = False) -> TDigest:
+    """Build the quantile digest of one metric rollup bucket from the raw values."""
+    return from_values(
+        (float(value) for value in day_values(db, user_id, day, category_id, metric_name, lock)),
+        settings.METRIC_DIGEST_COMPRESSION
+    )
+
+def _metric_rollup(db: Session, user_id: int, day: date, category_id: Optional[int], metric_name: str):
+    return db.query(MetricDailyRollup).filter(
+        MetricDailyRollup.user_id == user_id,
+        MetricDailyRollup.day == day,
+        MetricDailyRollup.category_id == category_id,
+        MetricDailyRollup.metric_name == metric_name
+    ).with_for_update().populate_existing().first()
+
+def _entry_rollup(db: Session, user_id: int, day: date):
+    return db.query(EntryDailyRollup).filter(
+        EntryDailyRollup.user_id == user_id,
+        EntryDailyRollup.day == day
+    ).with_for_update().populate_existing().first()
+
+def _update_metric_rollup(db: Session, rollup: MetricDailyRollup, values: dict) -> None:
+    db.query(MetricDailyRollup).filter(MetricDailyRollup.id == rollup.id).update(
+        values, synchronize_session=False
+    )
+    db.expire(rollup)
+
+def _group_metric_points(points: Iterable[MetricPoint]) -> dict:
+    grouped = defaultdict(list)
+    for point in points:
+        grouped[(point.day, point.category_id, point.metric_name)].append(point)
+    return grouped
+
+def add_metrics(db: Session, user_id: int, points: Iterable[MetricPoint]) -> None:
+    """
+    Fold newly written metrics into the user's metric rollups.
+
+    Args:
+        db: Database session, inside the caller's write transaction
+        user_id: Owner of the metrics
+        points: Snapshots of the metrics that were added
+    """
+    grouped = _group_metric_points(points)
+    if not grouped:
+        return
+    lock_users(db, [user_id])
+    for (day, category_id, metric_name), bucket in grouped.items():
+        values = [point.value for point in bucket]
+        low, high = min(values), max(values)
+        checksum = sum(metric_checksum(point.metric_id, point.value) for point in bucket) % CHECKSUM_MODULUS
+        rollup = _metric_rollup(db, user_id, day, category_id, metric_name)
+        if rollup is None:
+            digest = TDigest(settings.METRIC_DIGEST_COMPRESSION)
+            for value in values:
+                digest.add(float(value))
+            db.add(MetricDailyRollup(
+                user_id=user_id,
+                day=day,
+                category_id=category_id,
+                metric_name=metric_name,
+                record_count=len(values),
+                value_sum=sum(values),
+                value_min=low,
+                value_max=high,
+                digest=digest.to_json(),
+                value_checksum=checksum
+            ))
+            continue
+        if rollup.digest is None:
+            # Bucket predates digests; the new metrics are flushed, so the raw read includes them
+            digest = day_digest(db, user_id, day, category_id, metric_name, lock=True)
+        else:
+            digest = TDigest.from_json(rollup.digest)
+            for value in values:
+                digest.add(float(value))
+        if rollup.value_checksum is None:
+            # Bucket predates checksums; rebuilt from the raw metrics, which include the new ones
+            checksum = bucket_checksum(day_metrics(db, user_id, day, category_id, metric_name, lock=True))
+        else:
+            checksum = (MetricDailyRollup.value_checksum + checksum) % CHECKSUM_MODULUS
+        _update_metric_rollup(db, rollup, {
+            MetricDailyRollup.record_count: MetricDailyRollup.record_count + len(values),
+            MetricDailyRollup.value_sum: MetricDailyRollup.value_sum + sum(values),
+            MetricDailyRollup.value_min: low if rollup.value_min is None else min(Decimal(rollup.value_min), low),
+            MetricDailyRollup.value_max: high if rollup.value_max is None else max(Decimal(rollup.value_max), high),
+            MetricDailyRollup.digest: digest.to_json(),
+            MetricDailyRollup.value_checksum: checksum
+        })
+    db.flush()
+
+def remove_metrics(db: Session, user_id: int, points: Iterable[MetricPoint],
+                   pending: Collection[int] = ()) -> None:
+    """
+    Take removed metrics out of the user's metric rollups.
+    Must be called after the deletions have been flushed: digests cannot
+    remove values, so each affected bucket's digest, minimum and maximum
+    are rebuilt from its remaining raw metrics.
+
+    Args:
+        db: Database session, inside the caller's write transaction
+        user_id: Owner of the metrics
+        points: Snapshots of the metrics that were removed
+        pending: Ids of flushed metrics that add_metrics has yet to fold
+            in, left out of the rebuilt buckets
+    """
+    grouped = _group_metric_points(points)
+    if not grouped:
+        return
+    lock_users(db, [user_id])
+    for (day, category_id, metric_name), bucket in grouped.items():
+        rollup = _metric_rollup(db, user_id, day, category_id, metric_name)
+        if rollup is None:
+            continue
+        if rollup.record_count - len(bucket) <= 0:
+            db.delete(rollup)
+            continue
+        # Re-read the remaining values of this day only
+        values = [
+            row.value for row in day_metrics(db, user_id, day, category_id, metric_name, lock=True)
+            if row.id not in pending
+        ]
+        checksum = sum(metric_checksum(point.metric_id, point.value) for point in bucket) % CHECKSUM_MODULUS
+        if rollup.value_checksum is not None:
+            checksum = (MetricDailyRollup.value_checksum + CHECKSUM_MODULUS - checksum) % CHECKSUM_MODULUS
+        else:
+            # Left to the backfill command, or rebuilt when metrics are next added
+            checksum = None
+        _update_metric_rollup(db, rollup, {
+            MetricDailyRollup.record_count: MetricDailyRollup.record_count - len(bucket),
+            MetricDailyRollup.value_sum: MetricDailyRollup.value_sum - sum(point.value for point in bucket),
+            MetricDailyRollup.value_min: min(values, default=None),
+            MetricDailyRollup.value_max: max(values, default=None),
+            MetricDailyRollup.digest: from_values(
+                (float(value) for value in values), settings.METRIC_DIGEST_COMPRESSION
+            ).to_json(),
+            MetricDailyRollup.value_checksum: checksum
+        })
+    db.flush()
+
+def replace_metrics(db: Session, user_id: int, old: Iterable[MetricPoint], new: Iterable[MetricPoint]) -> None:
+    """
+    Move updated metrics' contributions from their old snapshots to their
+    new ones. Must be called after the changes have been flushed.
+    """
+    new = list(new)
+    remove_metrics(db, user_id, old, pending={point.metric_id for point in new})
+    add_metrics(db, user_id, new)
+
+def _clamped_tag_count(delta: int):
+    """tag_count + delta, floored at zero, as an in-place update expression."""
+    return case((EntryDailyRollup.tag_count + delta < 0, 0), else_=EntryDailyRollup.tag_count + delta)
+
+def _bump_entries(db: Session, user_id: int, points: Iterable[EntryPoint], sign: int) -> None:
+    totals = defaultdict(lambda: [0, 0])
+    for point in points:
+        totals[point.day][0] += sign
+        totals[point.day][1] += sign * point.tag_count
+    if not totals:
+        return
+    lock_users(db, [user_id])
+    for day, (entries, tags) in totals.items():
+        rollup = _entry_rollup(db, user_id, day)
+        if rollup is None:
+            if sign > 0:
+                db.add(EntryDailyRollup(user_id=user_id, day=day, entry_count=entries, tag_count=max(tags, 0)))
+            continue
+        if rollup.entry_count + entries <= 0:
+            db.delete(rollup)
+            continue
+        db.query(EntryDailyRollup).filter(EntryDailyRollup.id == rollup.id).update({
+            EntryDailyRollup.entry_count: EntryDailyRollup.entry_count + entries,
+            EntryDailyRollup.tag_count: _clamped_tag_count(tags)
+        }, synchronize_session=False)
+        db.expire(rollup)
+    db.flush()
+
+def add_entries(db: Session, user_id: int, points: Iterable[EntryPoint]) -> None:
+    """Fold newly written entries into the user's entry rollups."""
+    _bump_entries(db, user_id, points, 1)
+
+def remove_entries(db: Session, user_id: int, points: Iterable[EntryPoint]) -> None:
+    """Take removed entries out of the user's entry rollups."""
+    _bump_entries(db, user_id, points, -1)
+
+def replace_entry(db: Session, user_id: int, old: EntryPoint, new: EntryPoint) -> None:
+    """Move an updated entry's contribution from its old snapshot to its new one."""
+    if old != new:
+        remove_entries(db, user_id, [old])
+        add_entries(db, user_id, [new])
+
+def detach_category(db: Session, user_id: int, category_id: int) -> None:
+    """
+    Merge a category's metric rollups into the uncategorised buckets.
+    Call before deleting a category, mirroring the SET NULL on metrics.category_id.
+    """
+    lock_users(db, [user_id])
+    rollups = db.query(MetricDailyRollup).filter(
+        MetricDailyRollup.user_id == user_id,
+        MetricDailyRollup.category_id == category_id
+    ).with_for_update().populate_existing().all()
+    for rollup in rollups:
+        target = _metric_rollup(db, user_id, rollup.day, None, rollup.metric_name)
+        if target is None:
+            rollup.category_id = None
+            continue
+        if target.digest is not None and rollup.digest is not None:
+            digest = TDigest.merge_all(
+                [TDigest.from_json(target.digest), TDigest.from_json(rollup.digest)],
+                settings.METRIC_DIGEST_COMPRESSION
+            ).to_json()
+        else:
+            # Rebuilt from the raw values on read, or by the backfill command
+            digest = None
+        if target.value_checksum is not None and rollup.value_checksum is not None:
+            checksum = (int(target.value_checksum) + int(rollup.value_checksum)) % CHECKSUM_MODULUS
+        else:
+            checksum = None
+        _update_metric_rollup(db, target, {
+            MetricDailyRollup.record_count: MetricDailyRollup.record_count + rollup.record_count,
+            MetricDailyRollup.value_sum: MetricDailyRollup.value_sum + Decimal(rollup.value_sum),
+            MetricDailyRollup.value_min: min(Decimal(target.value_min), Decimal(rollup.value_min)),
+            MetricDailyRollup.value_max: max(Decimal(target.value_max), Decimal(rollup.value_max)),
+            MetricDailyRollup.digest: digest,
+            MetricDailyRollup.value_checksum: checksum
+        })
+        db.delete(rollup)
+    db.flush()
+
+def detach_tag(db: Session, tag: Tag) -> None:
+    """
+    Remove a tag's links from the entry rollups of every user that used it.
+    Call before deleting the tag.
+    """
+    day = func.date(Entry.created_at)
+    links = db.query(
+        Entry.user_id,
+        day.label("day"),
+        func.count(Entry.id).label("count")
+    ).join(
+        entry_tags, Entry.id == entry_tags.c.entry_id
+    ).filter(
+        entry_tags.c.tag_id == tag.id
+    ).group_by(Entry.user_id, day).all()
+    lock_users(db, [link.user_id for link in links])
+    for link in links:
+        db.query(EntryDailyRollup).filter(
+            EntryDailyRollup.user_id == link.user_id,
+            EntryDailyRollup.day == parse_day(link.day)
+        ).update({EntryDailyRollup.tag_count: _clamped_tag_count(-link.count)}, synchronize_session=False)
+    db.flush()
+
+def backfill_digests(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Build the missing quantile digests and checksums of metric rollups from
+    the raw metrics.
+
+    Args:
+        db: Database session; the caller commits
+        user_id: Only backfill this user's rollups
+
+    Returns:
+        int: Number of rollups updated
+    """
+    query = db.query(MetricDailyRollup).filter(
+        (MetricDailyRollup.digest.is_(None)) | (MetricDailyRollup.value_checksum.is_(None))
+    )
+    if user_id is not None:
+        query = query.filter(MetricDailyRollup.user_id == user_id)
+    updated = 0
+    for rollup in query.all():
+        metrics = day_metrics(db, rollup.user_id, rollup.day, rollup.category_id, rollup.metric_name)
+        rollup.digest = from_values(
+            (float(row.value) for row in metrics), settings.METRIC_DIGEST_COMPRESSION
+        ).to_json()
+        rollup.value_checksum = bucket_checksum(metrics)
+        updated += 1
+    db.flush()
+    return updated
+
+def main(argv: Optional[list] = None) -> None:
+    """Backfill missing metric rollup digests and checksums of one user, or of every user."""
+    from backend.db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Build missing metric rollup digests and checksums from the raw records.")
+    parser.add_argument("--user-id", type=int, help="Only backfill this user")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        updated = backfill_digests(db, args.user_id)
+        db.commit()
+        print(f"Backfilled {updated} metric rollups")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Columnar encodings of metric series for chart clients.
+This module turns metric rows into per-series NumPy arrays (timestamps
+as int64 epoch milliseconds, values as float64) and serializes them as
+Arrow IPC or as a packed binary layout, avoiding a dict per point.
+
+Packed layout (application/x-memotrack-series), all little-endian:
+    header:      4s magic b"MTS1", uint32 series_count
+    each series: uint32 category_len, uint32 name_len, uint64 point_count,
+                 category (UTF-8), metric_name (UTF-8),
+                 zero padding up to the next 8-byte boundary,
+                 int64[point_count] timestamps (epoch ms, UTC),
+                 float64[point_count] values
+Every array starts on an 8-byte boundary, so clients can wrap it in a
+BigInt64Array / Float64Array (or np.frombuffer) without copying.
+"""
+
+import struct
+from typing import List, NamedTuple, Optional, Sequence
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow is optional at runtime
+    pa = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PACKED_MEDIA_TYPE = "application/x-memotrack-series"
+PACKED_MAGIC = b"MTS1"
+
+class Series(NamedTuple):
+    """A single (category, metric_name) series in columnar form."""
+    category: str
+    metric_name: str
+    timestamps: np.ndarray  # int64 epoch milliseconds
+    values: np.ndarray  # float64
+    offset: int = 0  # index of the series' first row in the grouped input
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Pick a columnar media type from an Accept header.
+
+    Returns:
+        Optional[str]: The media type to serve, or None for the JSON default
+    """
+    if not accept:
+        return None
+    offered = {part.split(";")[0].strip().lower() for part in accept.split(",")}
+    if ARROW_MEDIA_TYPE in offered and pa is not None:
+        return ARROW_MEDIA_TYPE
+    if PACKED_MEDIA_TYPE in offered:
+        return PACKED_MEDIA_TYPE
+    return None
+
+def to_epoch_ms(timestamps: Sequence) -> np.ndarray:
+    """Convert dates or naive UTC datetimes into int64 epoch milliseconds."""
+    return np.asarray(timestamps, dtype="datetime64[ms]").astype(np.int64)
+
+def to_float64(values: Sequence) -> np.ndarray:
+    """Convert numeric values (including Decimals) into a float64 array."""
+    return np.asarray(values, dtype=np.float64)
+
+def group_series(rows: Sequence) -> List[Series]:
+    """
+    Split rows starting with (category, metric_name, created_at, value),
+    ordered by category and metric name, into one Series per
+    (category, metric_name). Any further columns are ignored.
+    """
+    if not rows:
+        return []
+    categories, names, timestamps, values = list(zip(*rows))[:4]
+    categories = np.asarray(categories, dtype=object)
+    names = np.asarray(names, dtype=object)
+    timestamps = to_epoch_ms(timestamps)
+    values = to_float64(values)
+
+    # Series boundaries are where the (category, metric_name) key changes
+    changed = (categories[1:] != categories[:-1]) | (names[1:] != names[:-1])
+    starts = np.concatenate(([0], np.flatnonzero(changed) + 1))
+    ends = np.append(starts[1:], len(rows))
+    return [
+        Series(categories[start], names[start], timestamps[start:end], values[start:end], int(start))
+        for start, end in zip(starts, ends)
+    ]
+
+def encode_packed(series: List[Series]) -> bytes:
+    """Serialize series in the packed layout described in the module docstring."""
+    chunks = [PACKED_MAGIC, struct.pack("<I", len(series))]
+    for item in series:
+        category = (item.category or "").encode()
+        name = (item.metric_name or "").encode()
+        chunks.append(struct.pack("<IIQ", len(category), len(name), len(item.values)))
+        chunks.append(category + name)
+        chunks.append(b"\0" * (-(len(category) + len(name)) % 8))
+        chunks.append(item.timestamps.astype("<i8", copy=False).tobytes())
+        chunks.append(item.values.astype("<f8", copy=False).tobytes())
+    return b"".join(chunks)
+
+def encode_arrow(series: List[Series]) -> bytes:
+    """
+    Serialize series as one Arrow IPC stream with dictionary-encoded
+    category and metric_name columns, plus timestamp (int64 epoch ms)
+    and value (float64) columns.
+    """
+    counts = np.array([len(item.values) for item in series], dtype=np.int32)
+    indices = pa.array(np.repeat(np.arange(len(series), dtype=np.int32), counts))
+    empty = np.array([], dtype=np.int64)
+    table = pa.table({
+        "category": pa.DictionaryArray.from_arrays(
+            indices, pa.array([item.category or "" for item in series], type=pa.string())
+        ),
+        "metric_name": pa.DictionaryArray.from_arrays(
+            indices, pa.array([item.metric_name or "" for item in series], type=pa.string())
+        ),
+        "timestamp": pa.array(np.concatenate([item.timestamps for item in series] or [empty])),
+        "value": pa.array(np.concatenate([item.values for item in series] or [empty.astype(np.float64)])),
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def encode(series: List[Series], media_type: str) -> bytes:
+    """Serialize series for a media type returned by negotiate()."""
+    if media_type == ARROW_MEDIA_TYPE:
+        return encode_arrow(series)
+    return encode_packed(series)
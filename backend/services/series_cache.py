@@ -0,0 +1,304 @@
+"""
+On-disk columnar cache of raw metric series for the Personal Memo System.
+Each user's metric points are kept per (category_id, metric_name) as raw
+little-endian arrays (int64 epoch-ms timestamps, float64 values, int64
+metric ids) that are memory-mapped on read. Endpoints that work on whole
+series (values, rolling statistics, downsampling, scatter charts) slice
+these arrays without copying them, instead of querying and building a
+Python object per point on every request.
+
+A manifest per user records the data_version the files reflect. While it
+matches the user's current version no query runs at all. After a write,
+the files are extended in place when the only change was new metrics
+appended after the existing points. Any other change rebuilds the user's
+files into a new generation directory. A change is anything other than an
+append if it removes a category, adds a point that sorts before a series'
+last one, or leaves the metric rollups (see backend.services.rollups)
+different from the cached metrics plus the new ones. The manifest keeps
+the record count and id/value checksum of the cached metrics per rollup
+bucket (day, category and metric name), and the rollups keep the same
+for the database in the write transaction, so edits are caught, whatever
+their updated_at says, by reading one row per bucket instead of every
+cached metric.
+
+Readers map only the point counts listed in the manifest, which is
+replaced atomically, so bytes appended by a concurrent refresh stay
+invisible until it completes. Refreshes of one user are serialized with a
+file lock.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from backend.core.config import settings
+from backend.models.category import Category
+from backend.models.entry import Entry
+from backend.models.metric import Metric
+from backend.models.rollup import MetricDailyRollup
+from backend.models.user import User
+from backend.services import analytics as analytics_engine, rollups
+from backend.services.series import Series, group_series, to_epoch_ms, to_float64
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no cross-process locking on Windows
+    fcntl = None
+
+# Array files of one series and their dtypes
+_ARRAYS = {
+    "ts": np.dtype("<i8"),
+    "val": np.dtype("<f8"),
+    "id": np.dtype("<i8"),
+}
+
+class CachedSeries(NamedTuple):
+    """A series with the metric id of each point."""
+    series: Series
+    ids: np.ndarray  # int64
+
+def _stem(category_id: Optional[int], metric_name: str) -> str:
+    digest = hashlib.sha1(metric_name.encode()).hexdigest()[:16]
+    return f"{'none' if category_id is None else category_id}-{digest}"
+
+def _bucket_key(day, category_id: Optional[int], metric_name: str) -> str:
+    return json.dumps([day.isoformat(), category_id, metric_name])
+
+def _add_to_buckets(buckets: Dict[str, list], rows) -> Dict[str, list]:
+    """Fold metric rows into per rollup bucket [record count, checksum] pairs."""
+    for row in rows:
+        key = _bucket_key(rollups.to_day(row.created_at), row.category_id, row.metric_name)
+        count, checksum = buckets.get(key, (0, 0))
+        buckets[key] = [
+            count + 1,
+            (checksum + rollups.metric_checksum(row.id, row.value)) % rollups.CHECKSUM_MODULUS
+        ]
+    return buckets
+
+class SeriesCache:
+    """Memory-mapped per-series cache rooted at a directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._locks: Dict[int, threading.Lock] = defaultdict(threading.Lock)
+
+    def _user_dir(self, user_id: int) -> str:
+        return os.path.join(self.root, str(user_id))
+
+    def _read_manifest(self, user_id: int) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._user_dir(user_id), "manifest.json")) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, user_id: int, manifest: dict) -> None:
+        user_dir = self._user_dir(user_id)
+        handle, path = tempfile.mkstemp(dir=user_dir, suffix=".json")
+        with os.fdopen(handle, "w") as temporary:
+            json.dump(manifest, temporary)
+        os.replace(path, os.path.join(user_dir, "manifest.json"))
+
+    def load(
+        self, db: Session, user: User, category: Optional[str] = None, metric_name: Optional[str] = None
+    ) -> List[CachedSeries]:
+        """
+        Return the user's series ordered by category name and metric name,
+        optionally filtered, refreshing the files first when they are behind
+        the user's data version. Like metric_values_query, metrics without a
+        category are left out.
+        """
+        manifest = self._read_manifest(user.id)
+        if manifest is None or manifest["version"] != (user.data_version or 0):
+            manifest = self._refresh(db, user)
+
+        generation_dir = os.path.join(self._user_dir(user.id), manifest["generation"])
+        names = {int(key): name for key, name in manifest["categories"].items()}
+        result = []
+        for item in manifest["series"]:
+            name = names.get(item["category_id"])
+            if name is None:
+                continue
+            if (category and name != category) or (metric_name and item["metric_name"] != metric_name):
+                continue
+            arrays = {
+                suffix: self._map(os.path.join(generation_dir, f"{item['stem']}.{suffix}"), dtype, item["count"])
+                for suffix, dtype in _ARRAYS.items()
+            }
+            result.append(CachedSeries(
+                Series(name, item["metric_name"], arrays["ts"], arrays["val"]), arrays["id"]
+            ))
+        result.sort(key=lambda cached: (cached.series.category, cached.series.metric_name))
+        return result
+
+    @staticmethod
+    def _map(path: str, dtype: np.dtype, count: int) -> np.ndarray:
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def _refresh(self, db: Session, user: User) -> dict:
+        user_dir = self._user_dir(user.id)
+        os.makedirs(user_dir, exist_ok=True)
+        with self._locks[user.id], open(os.path.join(user_dir, ".lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another request may have refreshed while this one waited
+            manifest = self._read_manifest(user.id)
+            if manifest is not None and manifest["version"] == (user.data_version or 0):
+                return manifest
+
+            categories = {
+                row.id: row.name for row in db.query(Category.id, Category.name).filter(
+                    Category.user_id == user.id
+                )
+            }
+            if manifest is not None and self._append(db, user, manifest, categories):
+                return manifest
+            return self._rebuild(db, user, categories, manifest)
+
+    def _metrics(self, db: Session, user_id: int):
+        return db.query(
+            Metric.id, Metric.category_id, Metric.metric_name, Metric.created_at, Metric.value
+        ).join(Entry, Entry.id == Metric.entry_id).filter(Entry.user_id == user_id)
+
+    def _append(self, db: Session, user: User, manifest: dict, categories: Dict[int, str]) -> bool:
+        """Extend the current generation with new metrics, if nothing else changed."""
+        cached_categories = {item["category_id"] for item in manifest["series"]} - {None}
+        if "buckets" not in manifest or not cached_categories <= set(categories):
+            return False
+        stored = {}
+        for row in db.query(
+            MetricDailyRollup.day, MetricDailyRollup.category_id, MetricDailyRollup.metric_name,
+            MetricDailyRollup.record_count, MetricDailyRollup.value_checksum
+        ).filter(MetricDailyRollup.user_id == user.id):
+            if row.value_checksum is None:
+                # Not backfilled yet, so edits cannot be ruled out
+                return False
+            stored[_bucket_key(row.day, row.category_id, row.metric_name)] = [row.record_count, int(row.value_checksum)]
+
+        rows = self._metrics(db, user.id).filter(Metric.id > manifest["max_id"]).order_by(
+            Metric.created_at, Metric.id
+        ).all()
+        buckets = _add_to_buckets({key: list(value) for key, value in manifest["buckets"].items()}, rows)
+        if buckets != stored:
+            # Something besides these appends changed the user's metrics
+            return False
+        series_by_key = {(item["category_id"], item["metric_name"]): item for item in manifest["series"]}
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[(row.category_id, row.metric_name)].append(row)
+        for key, points in grouped.items():
+            item = series_by_key.get(key)
+            if item is not None and item["count"] and to_epoch_ms([points[0].created_at])[0] < item["last"]:
+                # Out of order; the series would need rewriting
+                return False
+
+        generation_dir = os.path.join(self._user_dir(user.id), manifest["generation"])
+        for (category_id, metric_name), points in grouped.items():
+            item = series_by_key.get((category_id, metric_name))
+            if item is None:
+                item = {
+                    "category_id": category_id, "metric_name": metric_name,
+                    "stem": _stem(category_id, metric_name), "count": 0, "last": None
+                }
+                manifest["series"].append(item)
+            self._write_points(generation_dir, item, points, "ab")
+
+        manifest.update({
+            "version": user.data_version or 0,
+            "max_id": max([manifest["max_id"]] + [row.id for row in rows]),
+            "buckets": buckets,
+            "categories": {str(key): name for key, name in categories.items()},
+        })
+        self._write_manifest(user.id, manifest)
+        return True
+
+    @staticmethod
+    def _write_points(generation_dir: str, item: dict, points: list, mode: str) -> None:
+        arrays = {
+            "ts": to_epoch_ms([point.created_at for point in points]),
+            "val": to_float64([point.value for point in points]),
+            "id": np.asarray([point.id for point in points], dtype=np.int64),
+        }
+        for suffix, dtype in _ARRAYS.items():
+            with open(os.path.join(generation_dir, f"{item['stem']}.{suffix}"), mode) as handle:
+                handle.write(arrays[suffix].astype(dtype, copy=False).tobytes())
+        item["count"] += len(points)
+        item["last"] = int(arrays["ts"][-1])
+
+    def _rebuild(self, db: Session, user: User, categories: Dict[int, str], previous: Optional[dict]) -> dict:
+        """Write all of the user's series into a new generation directory."""
+        rows = self._metrics(db, user.id).order_by(
+            Metric.category_id, Metric.metric_name, Metric.created_at, Metric.id
+        ).all()
+        generation = uuid.uuid4().hex
+        generation_dir = os.path.join(self._user_dir(user.id), generation)
+        os.makedirs(generation_dir)
+
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[(row.category_id, row.metric_name)].append(row)
+        items = []
+        for (category_id, metric_name), points in grouped.items():
+            item = {
+                "category_id": category_id, "metric_name": metric_name,
+                "stem": _stem(category_id, metric_name), "count": 0, "last": None
+            }
+            self._write_points(generation_dir, item, points, "wb")
+            items.append(item)
+
+        manifest = {
+            "version": user.data_version or 0,
+            "generation": generation,
+            "max_id": max((row.id for row in rows), default=0),
+            "buckets": _add_to_buckets({}, rows),
+            "categories": {str(key): name for key, name in categories.items()},
+            "series": items,
+        }
+        self._write_manifest(user.id, manifest)
+
+        # Keep the generation before this one for readers that mapped it
+        keep = {generation, previous["generation"] if previous else None}
+        for entry in os.listdir(self._user_dir(user.id)):
+            path = os.path.join(self._user_dir(user.id), entry)
+            if os.path.isdir(path) and entry not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+        return manifest
+
+def _query_series(
+    db: Session, user_id: int, category: Optional[str], metric_name: Optional[str]
+) -> List[CachedSeries]:
+    rows = analytics_engine.metric_values_query(db, user_id, category, metric_name).with_entities(
+        Category.name, Metric.metric_name, Metric.created_at, Metric.value, Metric.id
+    ).all()
+    ids = np.asarray([row[4] for row in rows], dtype=np.int64)
+    return [
+        CachedSeries(item._replace(offset=0), ids[item.offset:item.offset + len(item.values)])
+        for item in group_series(rows)
+    ]
+
+# Global cache instance shared by the analytics and chart endpoints
+series_cache = SeriesCache(settings.SERIES_CACHE_DIR)
+
+def load_series(
+    db: Session, user: User, category: Optional[str] = None, metric_name: Optional[str] = None
+) -> List[CachedSeries]:
+    """
+    Load a user's series, ordered by category and metric name, from the
+    on-disk cache, or straight from the database when the cache is
+    disabled or unusable.
+    """
+    if settings.SERIES_CACHE_ENABLED:
+        try:
+            return series_cache.load(db, user, category, metric_name)
+        except OSError as e:
+            print(f"Series cache unavailable, reading from the database: {str(e)}")
+    return _query_series(db, user.id, category, metric_name)
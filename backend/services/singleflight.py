@@ -0,0 +1,74 @@
+"""
+Request coalescing for the Personal Memo System.
+Identical analytics requests that arrive while one of them is still being
+computed (a dashboard firing the same calls at once, many tabs polling
+together, every client reloading after a deploy) wait for that one
+computation and share its result, instead of each running the same
+queries.
+
+Coalescing is per process: endpoints run on the threadpool, so the first
+caller of a key computes on its own thread and later callers block on an
+event until it finishes, or until their own deadline passes, after which
+they compute on their own. Across workers, the shared analytics cache
+serves the result once the first computation has stored it.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional
+
+class _Flight:
+    """One in-flight computation, awaited by later callers of its key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+class SingleFlight:
+    """
+    Group of in-flight computations keyed by request.
+    A key is only shared while its computation runs; once it finishes, the
+    next call with the same key starts a new one.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Any, _Flight] = {}
+        self._lock = threading.Lock()
+        # Calls served by another caller's computation
+        self.coalesced = 0
+        # Calls that stopped waiting for another caller and computed on their own
+        self.timed_out = 0
+
+    def do(self, key: Any, compute: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Return the result of compute for the key, or of the call already
+        computing it. That call's exception is re-raised to every waiter.
+        A waiter still waiting after timeout seconds calls compute itself.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            if not flight.done.wait(timeout):
+                with self._lock:
+                    self.coalesced -= 1
+                    self.timed_out += 1
+                return compute()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
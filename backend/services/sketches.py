@@ -0,0 +1,271 @@
+"""
+Mergeable quantile sketches for the Personal Memo System.
+This module implements a merging t-digest: a compact summary of a value
+distribution from which quantiles and histograms can be estimated. Each
+metric daily rollup stores the digest of its day's values, and digests of
+any number of days are merged at query time, so percentiles over years of
+data never sort the raw values.
+
+Accuracy is highest in the tails: centroids near the minimum and maximum
+hold few values, and centroids of a single value are read back exactly,
+so p99 stays close to the exact value even after merging a year of daily
+digests. Histograms are estimated from the same centroids and flagged as
+approximate.
+"""
+
+import json
+import math
+from typing import Iterable, List, Optional, Tuple
+
+# Default compression; higher keeps more centroids and is more accurate
+DEFAULT_COMPRESSION = 100
+
+# Percentiles reported by the metrics summary
+PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+
+class TDigest:
+    """
+    Merging t-digest over weighted values.
+    Values are buffered on add and folded into the sorted centroids when
+    the buffer fills, or before any estimate is read.
+    """
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.minimum: Optional[float] = None
+        self.maximum: Optional[float] = None
+        self._centroids: List[Tuple[float, float]] = []
+        self._buffer: List[Tuple[float, float]] = []
+
+    @property
+    def count(self) -> float:
+        return sum(weight for _, weight in self._centroids) + sum(weight for _, weight in self._buffer)
+
+    def add(self, value: float, weight: float = 1) -> None:
+        """Add a value with the given weight."""
+        value = float(value)
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        self._buffer.append((value, weight))
+        if len(self._buffer) > 5 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest") -> None:
+        """Fold another digest into this one."""
+        if other.minimum is None:
+            return
+        self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        self._buffer.extend(other._centroids)
+        self._buffer.extend(other._buffer)
+        if len(self._buffer) > 5 * self.compression:
+            self._compress()
+
+    @classmethod
+    def merge_all(cls, digests: Iterable["TDigest"], compression: float = DEFAULT_COMPRESSION) -> "TDigest":
+        """Merge any number of digests into a new one, compressing once."""
+        merged = cls(compression)
+        for digest in digests:
+            if digest.minimum is None:
+                continue
+            merged.minimum = digest.minimum if merged.minimum is None else min(merged.minimum, digest.minimum)
+            merged.maximum = digest.maximum if merged.maximum is None else max(merged.maximum, digest.maximum)
+            merged._buffer.extend(digest._centroids)
+            merged._buffer.extend(digest._buffer)
+        merged._compress()
+        return merged
+
+    def _k(self, q: float) -> float:
+        # Scale function k1: centroids shrink towards both tails; a digest
+        # holds at most about `compression` centroids
+        return self.compression / math.pi * math.asin(2 * q - 1)
+
+    def _q(self, k: float) -> float:
+        return (math.sin(min(k * math.pi / self.compression, math.pi / 2)) + 1) / 2
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in points)
+
+        centroids = []
+        mean, weight = points[0]
+        done = 0.0
+        limit = total * self._q(self._k(0) + 1)
+        for next_mean, next_weight in points[1:]:
+            if done + weight + next_weight <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                centroids.append((mean, weight))
+                done += weight
+                limit = total * self._q(self._k(done / total) + 1)
+                mean, weight = next_mean, next_weight
+        centroids.append((mean, weight))
+        self._centroids = centroids
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the value at quantile q (0..1), or None when empty.
+        Values are interpolated between centroid means, except that a
+        centroid of weight 1 is a single known value, and the minimum and
+        maximum are one value each at the ends.
+        """
+        self._compress()
+        centroids = self._centroids
+        if not centroids:
+            return None
+        total = sum(weight for _, weight in centroids)
+        index = q * total
+        if index < 1:
+            return self.minimum
+        if index > total - 1:
+            return self.maximum
+        if len(centroids) == 1:
+            return centroids[0][0]
+
+        first_mean, first_weight = centroids[0]
+        if first_weight > 1 and index < first_weight / 2:
+            return self.minimum + (index - 1) / (first_weight / 2 - 1) * (first_mean - self.minimum)
+        last_mean, last_weight = centroids[-1]
+        if last_weight > 1 and total - index <= last_weight / 2:
+            return self.maximum - (total - index - 1) / (last_weight / 2 - 1) * (self.maximum - last_mean)
+
+        # Weight up to the middle of the current centroid
+        done = first_weight / 2
+        for (left_mean, left_weight), (right_mean, right_weight) in zip(centroids, centroids[1:]):
+            between = (left_weight + right_weight) / 2
+            if done + between > index:
+                left_unit = right_unit = 0.0
+                if left_weight == 1:
+                    if index - done < 0.5:
+                        return left_mean
+                    left_unit = 0.5
+                if right_weight == 1:
+                    if done + between - index <= 0.5:
+                        return right_mean
+                    right_unit = 0.5
+                to_left = index - done - left_unit
+                to_right = done + between - index - right_unit
+                return (left_mean * to_right + right_mean * to_left) / (to_left + to_right)
+            done += between
+        # Between the middle of the last centroid and the maximum
+        to_left = index - (total - last_weight / 2)
+        to_right = last_weight / 2 - to_left
+        return (last_mean * to_right + self.maximum * to_left) / (to_left + to_right)
+
+    def cdf(self, value: float) -> float:
+        """Estimate the fraction of the weight at or below value."""
+        return self._rank(value, 1.0)
+
+    def _rank(self, value: float, at: float) -> float:
+        """
+        Estimate the fraction of the weight below value, plus the given
+        share of the weight at value, with the same interpolation as quantile.
+        """
+        self._compress()
+        centroids = self._centroids
+        if not centroids or value < self.minimum:
+            return 0.0
+        if value > self.maximum:
+            return 1.0
+        if self.maximum == self.minimum:
+            return at
+        total = sum(weight for _, weight in centroids)
+
+        first_mean, first_weight = centroids[0]
+        if value < first_mean:
+            if value == self.minimum:
+                return at / total
+            return (1 + (value - self.minimum) / (first_mean - self.minimum) * (first_weight / 2 - 1)) / total
+        last_mean, last_weight = centroids[-1]
+        if value > last_mean:
+            if value == self.maximum:
+                return 1 - (1 - at) / total
+            return 1 - (1 + (self.maximum - value) / (self.maximum - last_mean) * (last_weight / 2 - 1)) / total
+
+        done = 0.0
+        i = 0
+        while i < len(centroids):
+            mean, weight = centroids[i]
+            if mean == value:
+                at_value = 0.0
+                while i < len(centroids) and centroids[i][0] == value:
+                    at_value += centroids[i][1]
+                    i += 1
+                return (done + at * at_value) / total
+            next_mean, next_weight = centroids[i + 1]
+            if mean < value < next_mean:
+                left_unit = right_unit = 0.0
+                if weight == 1:
+                    if next_weight == 1:
+                        # Between two single values, nothing is in the gap
+                        return (done + 1) / total
+                    left_unit = 0.5
+                elif next_weight == 1:
+                    right_unit = 0.5
+                between = (weight + next_weight) / 2
+                base = done + weight / 2 + left_unit
+                fraction = (value - mean) / (next_mean - mean)
+                return (base + (between - left_unit - right_unit) * fraction) / total
+            done += weight
+            i += 1
+        return 1.0
+
+    def histogram(self, bins: int) -> dict:
+        """
+        Estimate counts of values in bins equal-width bins between the
+        minimum and the maximum; like numpy, each bin holds values from its
+        lower edge up to, but excluding, its upper edge, and the last bin
+        also holds the maximum. Counts sum to the digest's count, but are
+        approximate wherever several values share a centroid.
+        """
+        self._compress()
+        if not self._centroids:
+            return {"edges": [], "counts": [], "approximate": True}
+        total = sum(weight for _, weight in self._centroids)
+        width = (self.maximum - self.minimum) / bins
+        edges = [self.minimum + width * i for i in range(bins)] + [self.maximum]
+        # Round the cumulative counts so the bins add up exactly
+        cumulative = [0] + [round(total * self._rank(edge, 0.0)) for edge in edges[1:-1]] + [round(total)]
+        return {
+            "edges": edges,
+            "counts": [cumulative[i + 1] - cumulative[i] for i in range(bins)],
+            "approximate": True
+        }
+
+    def to_json(self) -> str:
+        """Serialize the digest for storage in a rollup row."""
+        self._compress()
+        return json.dumps({
+            "c": self.compression,
+            "min": self.minimum,
+            "max": self.maximum,
+            "m": [[round(mean, 6), weight] for mean, weight in self._centroids]
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, value: str) -> "TDigest":
+        """Load a digest serialized by to_json."""
+        data = json.loads(value)
+        digest = cls(data["c"])
+        digest.minimum = data["min"]
+        digest.maximum = data["max"]
+        digest._centroids = [(mean, weight) for mean, weight in data["m"]]
+        return digest
+
+def from_values(values: Iterable, compression: float = DEFAULT_COMPRESSION) -> TDigest:
+    """Build a digest from raw values."""
+    digest = TDigest(compression)
+    for value in values:
+        digest.add(value)
+    digest._compress()
+    return digest
+
+def describe(digest: TDigest, bins: int) -> dict:
+    """Percentiles and histogram of a merged digest, for the metrics summary."""
+    result = {name: digest.quantile(q) for name, q in PERCENTILES}
+    result["histogram"] = digest.histogram(bins)
+    return result
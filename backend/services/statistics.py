@@ -0,0 +1,122 @@
+"""
+Statistics over metric series for the Personal Memo System.
+This module computes smoothing and anomaly statistics for a single
+(category, metric_name) series, and correlations across all of a user's
+series, with pandas in one vectorized pass, so clients no longer need
+every raw value to compute them themselves.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+# Supported correlation coefficients
+CORRELATION_METHODS = ("pearson", "spearman")
+
+# Statistics returned for every point, in response order
+STATISTICS = (
+    "rolling_mean",
+    "rolling_median",
+    "rolling_std",
+    "ewma",
+    "rate_of_change",
+    "zscore",
+)
+
+def rolling_statistics(
+    timestamps: Sequence, values: Sequence, window: int = 7, span: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Compute rolling statistics for a time-ordered series.
+
+    Args:
+        timestamps: Point timestamps, in ascending order
+        values: Point values
+        window: Number of points in the rolling window
+        span: EWMA span in points, defaults to window
+
+    Returns:
+        pd.DataFrame: One row per point with value and the STATISTICS columns.
+        rate_of_change is the change per day since the previous point and
+        zscore is relative to the rolling mean and standard deviation.
+    """
+    frame = pd.DataFrame({
+        "created_at": pd.to_datetime(pd.Series(timestamps, dtype=object)),
+        "value": np.asarray(values, dtype=np.float64),
+    })
+    rolling = frame["value"].rolling(window, min_periods=1)
+    frame["rolling_mean"] = rolling.mean()
+    frame["rolling_median"] = rolling.median()
+    frame["rolling_std"] = rolling.std()
+    frame["ewma"] = frame["value"].ewm(span=span or window, adjust=False).mean()
+
+    elapsed_days = frame["created_at"].diff().dt.total_seconds() / 86400
+    frame["rate_of_change"] = frame["value"].diff() / elapsed_days.where(elapsed_days > 0)
+    frame["zscore"] = (frame["value"] - frame["rolling_mean"]) / frame["rolling_std"].where(frame["rolling_std"] > 0)
+    return frame
+
+def to_columns(frame: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Convert a rolling statistics frame into JSON-ready column lists.
+    Undefined values (e.g. the standard deviation of a single point) become None.
+    """
+    columns: Dict[str, Any] = {
+        "created_at": [timestamp.isoformat() for timestamp in frame["created_at"]],
+    }
+    for name in ("value",) + STATISTICS:
+        column = frame[name].replace([np.inf, -np.inf], np.nan)
+        columns[name] = column.astype(object).where(column.notna(), None).tolist()
+    return columns
+
+def _json_matrix(matrix: np.ndarray) -> List[List[Optional[float]]]:
+    """Convert a float matrix into nested lists with NaN as None."""
+    return [
+        [None if np.isnan(value) else float(value) for value in row]
+        for row in matrix
+    ]
+
+def correlation_matrix(
+    rows: Sequence, method: str = "pearson", min_periods: int = 3
+) -> Dict[str, Any]:
+    """
+    Correlate every series with every other over a shared time grid.
+
+    Args:
+        rows: Rows of (category, metric_name, bucket, value), one per
+            series and grid bucket (e.g. the daily mean)
+        method: pearson or spearman
+        min_periods: Minimum number of shared buckets for a coefficient;
+            pairs with fewer get None
+
+    Returns:
+        Dict[str, Any]: series (in matrix order), the correlation matrix
+        and the number of shared buckets behind each coefficient
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unsupported correlation method: {method}")
+    if not rows:
+        return {"series": [], "matrix": [], "observations": []}
+
+    frame = pd.DataFrame.from_records(
+        rows, columns=["category", "metric_name", "bucket", "value"]
+    )
+    frame["value"] = frame["value"].astype(np.float64)
+    # Uncategorised series would otherwise be dropped as missing group keys
+    frame["category"] = frame["category"].fillna("")
+    # One column per series, one row per bucket; missing buckets are NaN
+    grid = frame.pivot_table(
+        index="bucket", columns=["category", "metric_name"], values="value", aggfunc="mean"
+    )
+
+    present = grid.notna().to_numpy(dtype=np.float64)
+    observations = present.T @ present
+    matrix = grid.corr(method=method, min_periods=min_periods).to_numpy()
+
+    return {
+        "series": [
+            {"category": category or None, "metric_name": metric_name}
+            for category, metric_name in grid.columns
+        ],
+        "matrix": _json_matrix(matrix),
+        "observations": observations.astype(np.int64).tolist()
+    }
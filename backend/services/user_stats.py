@@ -0,0 +1,184 @@
+"""
+Per-user counters for the Personal Memo System.
+This module keeps the user_stats row of each user in step with the raw
+records. The write endpoints call it inside their own transactions, after
+flushing, so counters and raw rows are always committed together.
+
+Counters that drift (e.g. after manual database edits) can be rebuilt with:
+    python -m backend.services.user_stats [--user-id ID]
+"""
+
+import argparse
+from typing import Iterable, Optional
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from backend.models.user import User
+from backend.models.entry import Entry
+from backend.models.metric import Metric
+from backend.models.category import Category
+from backend.models.tag import entry_tags
+from backend.models.user_stats import UserStats
+
+def _last_entry_at(db: Session, user_id: int):
+    # Served by the (user_id, created_at) index
+    return db.query(func.max(Entry.created_at)).filter(Entry.user_id == user_id).scalar()
+
+def _count(db: Session, user_id: int) -> dict:
+    """Count a user's records; the values of their counters row."""
+    return {
+        "entry_count": db.query(func.count(Entry.id)).filter(
+            Entry.user_id == user_id
+        ).scalar() or 0,
+        "category_count": db.query(func.count(Category.id)).filter(
+            Category.user_id == user_id
+        ).scalar() or 0,
+        "distinct_tag_count": db.query(func.count(func.distinct(entry_tags.c.tag_id))).join(
+            Entry, Entry.id == entry_tags.c.entry_id
+        ).filter(
+            Entry.user_id == user_id
+        ).scalar() or 0,
+        "metric_count": db.query(func.count(Metric.id)).join(
+            Entry, Entry.id == Metric.entry_id
+        ).filter(
+            Entry.user_id == user_id
+        ).scalar() or 0,
+        "last_entry_at": _last_entry_at(db, user_id),
+    }
+
+def recount(db: Session, user_id: int) -> UserStats:
+    """
+    Rebuild a user's counters from the raw records.
+
+    Args:
+        db: Database session; the caller commits
+        user_id: User to recount
+
+    Returns:
+        UserStats: The user's refreshed counters row
+    """
+    stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
+    if stats is None:
+        stats = UserStats(user_id=user_id)
+        db.add(stats)
+
+    for field, value in _count(db, user_id).items():
+        setattr(stats, field, value)
+    db.flush()
+    return stats
+
+def get_stats(db: Session, user_id: int) -> UserStats:
+    """
+    Return a user's counters row for reading.
+    A missing row is built and committed; if a concurrent request inserted
+    it first, that row is used instead. On a read-only session (the
+    analytics replica) a missing row is counted but not stored.
+    """
+    stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
+    if stats is not None:
+        return stats
+    if db.info.get("read_only"):
+        return UserStats(user_id=user_id, **_count(db, user_id))
+    try:
+        stats = recount(db, user_id)
+        db.commit()
+        return stats
+    except IntegrityError:
+        db.rollback()
+        return db.query(UserStats).filter(UserStats.user_id == user_id).one()
+
+def _tag_delta(db: Session, user_id: int, linked: Iterable[int], unlinked: Iterable[int]) -> int:
+    """
+    Change in the user's distinct tag count after tags were linked to or
+    unlinked from one of their entries. A linked tag is new to the user if
+    that is now its only link; an unlinked tag is gone if no link remains.
+    """
+    linked, unlinked = set(linked) - set(unlinked), set(unlinked) - set(linked)
+    if not linked and not unlinked:
+        return 0
+    rows = db.query(
+        entry_tags.c.tag_id,
+        func.count().label("links")
+    ).join(
+        Entry, Entry.id == entry_tags.c.entry_id
+    ).filter(
+        Entry.user_id == user_id,
+        entry_tags.c.tag_id.in_(linked | unlinked)
+    ).group_by(entry_tags.c.tag_id).all()
+    links = {row.tag_id: row.links for row in rows}
+    return (
+        sum(1 for tag_id in linked if links.get(tag_id) == 1)
+        - sum(1 for tag_id in unlinked if tag_id not in links)
+    )
+
+def update(
+    db: Session,
+    user_id: int,
+    entries: int = 0,
+    categories: int = 0,
+    metrics: int = 0,
+    linked_tags: Iterable[int] = (),
+    unlinked_tags: Iterable[int] = (),
+    entry_dates_changed: bool = False
+) -> None:
+    """
+    Apply a write to the user's counters. Call after the write is flushed.
+
+    Args:
+        db: Database session, inside the caller's write transaction
+        user_id: Owner of the changed records
+        entries: Change in the number of entries
+        categories: Change in the number of categories
+        metrics: Change in the number of metrics
+        linked_tags: Ids of tags newly linked to one of the user's entries
+        unlinked_tags: Ids of tags removed from one of the user's entries
+        entry_dates_changed: Whether an entry's created_at may have changed
+    """
+    stats = db.query(UserStats).filter(
+        UserStats.user_id == user_id
+    ).with_for_update().first()
+    if stats is None:
+        # First write since the counters existed; count what is there now
+        recount(db, user_id)
+        return
+
+    tags = _tag_delta(db, user_id, linked_tags, unlinked_tags)
+    db.query(UserStats).filter(UserStats.user_id == user_id).update({
+        UserStats.entry_count: UserStats.entry_count + entries,
+        UserStats.category_count: UserStats.category_count + categories,
+        UserStats.metric_count: UserStats.metric_count + metrics,
+        UserStats.distinct_tag_count: UserStats.distinct_tag_count + tags,
+    }, synchronize_session=False)
+    if entries or entry_dates_changed:
+        db.query(UserStats).filter(UserStats.user_id == user_id).update({
+            UserStats.last_entry_at: _last_entry_at(db, user_id)
+        }, synchronize_session=False)
+    db.expire(stats)
+    db.flush()
+
+def main(argv: Optional[list] = None) -> None:
+    """Recount the counters of one user, or of every user."""
+    from backend.db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild per-user counters from the raw records.")
+    parser.add_argument("--user-id", type=int, help="Only recount this user")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.user_id is not None:
+            user_ids = [args.user_id]
+        else:
+            user_ids = [row.id for row in db.query(User.id).order_by(User.id)]
+        for user_id in user_ids:
+            stats = recount(db, user_id)
+            db.commit()
+            print(
+                f"User {user_id}: {stats.entry_count} entries, {stats.category_count} categories, "
+                f"{stats.distinct_tag_count} tags, {stats.metric_count} metrics"
+            )
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Per-user data versions and conditional GETs for the Personal Memo System.
+Every write to a user's entries, metrics, tags or categories increments
+users.data_version in the same transaction. GET responses carry a weak
+ETag derived from it, and a request whose If-None-Match still matches is
+answered with 304 Not Modified before any endpoint query runs.
+
+The ETag also includes the current UTC hour, so responses over relative
+time windows (e.g. "last 30 days") are refreshed at least hourly, and a
+hash of the Accept header, since one URL can serve JSON or binary series.
+"""
+
+import zlib
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy.orm import Session
+from backend.models.user import User
+
+def bump(db: Session, user_ids: Iterable[int]) -> None:
+    """
+    Increment the data version of users whose data was written.
+    Call inside the write transaction, before it commits.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    db.query(User).filter(User.id.in_(user_ids)).update(
+        {User.data_version: User.data_version + 1},
+        synchronize_session=False
+    )
+
+def etag_for(user: User, accept: Optional[str] = None, now: Optional[datetime] = None) -> str:
+    """Build the weak ETag of a user's current data for a given Accept header."""
+    hour = (now or datetime.utcnow()).strftime("%Y%m%d%H")
+    variant = zlib.crc32((accept or "").encode()) & 0xFFFFFFFF
+    return f'W/"{user.id}-{user.data_version or 0}-{hour}-{variant:08x}"'
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    if "*" in candidates:
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in candidates)
+
+class ETagHeaderMiddleware:
+    """
+    ASGI middleware adding the ETag computed by the conditional GET
+    dependency to successful responses, including streamed and binary ones.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                etag = scope.get("state", {}).get("etag")
+                if etag:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"etag", etag.encode("latin-1")),
+                        (b"cache-control", b"private, no-cache"),
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,152 @@
+"""
+Background cache warm-up for analytics.
+After a user's entries or metrics change, their cached analytics no
+longer match the new data version. This module recomputes the most requested payloads in the
+background so the next dashboard view is a cache hit.
+
+Requests are debounced and coalesced per user: a burst of writes leads to
+one recomputation once the user has been quiet for the debounce delay.
+The number of waiting users is capped, and recomputations run on a small
+dedicated thread pool so they never take threads from request handling.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from backend.core.config import settings
+from backend.db.session import SessionLocal
+from backend.models.user import User
+
+class CacheWarmer:
+    """
+    Debounced per-user scheduler for cache warm-up.
+    Targets are cached endpoint functions, called with fixed parameters.
+    """
+
+    def __init__(self, debounce_seconds: float, max_pending: int, concurrency: int):
+        self.debounce_seconds = debounce_seconds
+        self.max_pending = max_pending
+        self.concurrency = concurrency
+        self._targets: List[Tuple[Callable, Dict[str, Any]]] = []
+        self._pending: Dict[int, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def register(self, endpoint: Callable, **params: Any) -> None:
+        """
+        Add a cached endpoint to warm.
+        params must list every non-dependency parameter, exactly as a request
+        would pass it, so the warmed result lands under the request's key.
+        """
+        self._targets.append((endpoint, params))
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None and not self._runner.done()
+
+    async def start(self) -> None:
+        """Start the scheduler on the running event loop."""
+        if self.running or not (settings.ANALYTICS_CACHE_ENABLED and settings.ANALYTICS_WARMUP_ENABLED):
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="cache-warmup"
+        )
+        self._runner = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the scheduler, dropping pending work and waiting for running work."""
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        self._pending.clear()
+        self._runner = None
+
+    def schedule(self, user_id: int) -> None:
+        """
+        Request a warm-up for a user. Safe to call from request threads;
+        does nothing while the scheduler is not running.
+        """
+        if not self.running:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._enqueue, user_id)
+        except RuntimeError:
+            # The loop is shutting down
+            pass
+
+    def _enqueue(self, user_id: int) -> None:
+        if user_id not in self._pending and len(self._pending) >= self.max_pending:
+            print(f"Cache warm-up queue full, skipping user {user_id}")
+            return
+        # A new write restarts the user's debounce delay
+        self._pending[user_id] = self._loop.time() + self.debounce_seconds
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            user_id, due_at = min(self._pending.items(), key=lambda item: item[1])
+            delay = due_at - self._loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            await self._slots.acquire()
+            # The user may have written again while waiting for a slot
+            if self._pending.get(user_id) != due_at:
+                self._slots.release()
+                continue
+            del self._pending[user_id]
+            task = self._loop.create_task(self._warm(user_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _warm(self, user_id: int) -> None:
+        try:
+            await self._loop.run_in_executor(self._executor, self._warm_user, user_id)
+        finally:
+            self._slots.release()
+
+    def _warm_user(self, user_id: int) -> None:
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is None:
+                return
+            for endpoint, params in self._targets:
+                try:
+                    endpoint(db=db, current_user=user, **params)
+                except Exception as e:
+                    print(f"Cache warm-up of {endpoint.__name__} failed for user {user_id}: {str(e)}")
+                    db.rollback()
+        finally:
+            db.close()
+
+# Global warmer, started and stopped with the application
+cache_warmer = CacheWarmer(
+    debounce_seconds=settings.ANALYTICS_WARMUP_DEBOUNCE_SECONDS,
+    max_pending=settings.ANALYTICS_WARMUP_MAX_PENDING,
+    concurrency=settings.ANALYTICS_WARMUP_CONCURRENCY
+)
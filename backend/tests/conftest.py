@@ -0,0 +1,47 @@
+"""
+Test fixtures for the Personal Memo System.
+The app runs against a throwaway SQLite database, recreated for every test.
+"""
+
+import os
+import tempfile
+
+_TEST_DIR = tempfile.mkdtemp(prefix="memotrack-tests-")
+# Settings are read at import time, so they are set before importing the app
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}"
+os.environ["SERIES_CACHE_DIR"] = os.path.join(_TEST_DIR, "series")
+os.environ["ANALYTICS_CACHE_ENABLED"] = "false"
+os.environ["ANALYTICS_WARMUP_ENABLED"] = "false"
+os.environ["ANALYTICS_JOBS_IN_API"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+from backend.db import base  # noqa: F401
+from backend.db.session import SessionLocal, engine
+from backend.models.base import Base
+from backend.models.user import User
+from backend.core.security import create_access_token
+from backend.main import app
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def user(db):
+    user = User(email="user@example.com", username="user", password_hash="x", status="active")
+    db.add(user)
+    db.commit()
+    return user
+
+@pytest.fixture
+def client(user):
+    client = TestClient(app)
+    client.headers["Authorization"] = f"Bearer {create_access_token(user.id)}"
+    return client
@@ -0,0 +1,71 @@
+"""
+Sampled analytics are deterministic, and the intervals of their counts
+cover the exact counts at about their stated confidence, including
+category counts, to which one sampled entry can add many metrics.
+"""
+
+import random
+from backend.core.config import settings
+from backend.models.metric import Metric
+from backend.services import analytics as analytics_engine
+
+def _post_entries(client, count):
+    for i in range(count):
+        response = client.post("/api/v1/entries/", json={
+            "title": f"t{i}", "content": "c", "tags": [f"tag{i % 3}"],
+            "metrics": [
+                {"metric_name": "steps", "value": j, "unit": "n", "category": "walks"} for j in range(i % 5)
+            ] + [{"metric_name": "weight", "value": 70, "unit": "kg", "category": "health"}]
+        })
+        assert response.status_code == 200, response.text
+
+def test_sampled_analytics_are_deterministic(client, db, user, monkeypatch):
+    _post_entries(client, 60)
+    monkeypatch.setattr(settings, "ANALYTICS_APPROX_SAMPLE_SIZE", 20)
+
+    first = analytics_engine.compute_analytics(db, user.id, time_range="all", accuracy="approx")
+    second = analytics_engine.compute_analytics(db, user.id, time_range="all", accuracy="approx")
+    assert first == second
+    assert first["approximation"]["sampleRate"] == 20 / 60
+    assert 0 < first["approximation"]["sampledEntries"] < 60
+
+def test_category_squares_sum_each_sampled_entrys_metrics(client, db, user):
+    _post_entries(client, 60)
+    rate = 0.4
+    rows = analytics_engine._grouped_scan(db, analytics_engine.scoped_entries(user.id, rate=rate), squares=True)
+
+    per_entry = {}
+    for metric in db.query(Metric).filter(Metric.user_id == user.id):
+        if analytics_engine.sampled(metric.entry_id, rate):
+            key = (metric.category.name, metric.entry_id)
+            per_entry[key] = per_entry.get(key, 0) + 1
+    expected = {}
+    for (name, _), count in per_entry.items():
+        total, squares = expected.get(name, (0, 0))
+        expected[name] = (total + count, squares + count * count)
+    assert {row.label: (row.count, row.count_squares) for row in rows if row.kind == "category"} == expected
+
+    start_date, end_date = analytics_engine.resolve_time_range("all")
+    payload = analytics_engine._payload(rows, "count", start_date, end_date, rate)
+    for item in payload["entriesByCategory"]:
+        count, squares = expected[item["category"]]
+        _, interval = analytics_engine.count_estimate(count, rate, squares)
+        assert item["interval"] == [round(bound) for bound in interval]
+
+def test_count_intervals_cover_clustered_counts():
+    rng = random.Random(7)
+    trials, covered, covered_unclustered = 300, 0, 0
+    for trial in range(trials):
+        # Metrics of one category per entry: mostly none, sometimes many
+        metrics = [rng.choice([0, 0, 0, 1, 2, 8]) for _ in range(1000)]
+        ids = range(trial * 100003 + 1, trial * 100003 + 1 + len(metrics))
+        sample = [count for entry_id, count in zip(ids, metrics) if analytics_engine.sampled(entry_id, 0.1)]
+
+        _, (low, high) = analytics_engine.count_estimate(sum(sample), 0.1, sum(count * count for count in sample))
+        covered += low <= sum(metrics) <= high
+        # Treating every metric as sampled on its own understates the variance
+        _, (low, high) = analytics_engine.count_estimate(sum(sample), 0.1)
+        covered_unclustered += low <= sum(metrics) <= high
+
+    assert covered / trials >= 0.93
+    assert covered_unclustered / trials < 0.8
@@ -0,0 +1,48 @@
+"""
+Listing entries costs the same few statements whatever the page size: one
+for the entries, one for their tags and one for their metrics with
+categories.
+"""
+
+import contextlib
+import pytest
+from sqlalchemy import event
+from backend.db.session import engine
+
+@contextlib.contextmanager
+def _statements():
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+@pytest.mark.parametrize("page_size", [1, 100])
+def test_entry_pages_take_three_queries(client, page_size):
+    for i in range(page_size):
+        response = client.post("/api/v1/entries/", json={
+            "title": f"t{i}", "content": "c", "tags": ["a", f"t{i % 7}"],
+            "metrics": [
+                {"metric_name": "weight", "value": 70 + i, "unit": "kg", "category": "health"},
+                {"metric_name": "spend", "value": i, "unit": "eur", "category": f"money{i % 3}"},
+            ]
+        })
+        assert response.status_code == 200, response.text
+
+    with _statements() as statements:
+        response = client.get("/api/v1/entries/", params={"limit": page_size})
+    assert response.status_code == 200, response.text
+    entries = response.json()
+    assert len(entries) == page_size
+    assert all(len(entry["tags"]) == 2 and len(entry["metrics"]) == 2 for entry in entries)
+    assert all(metric["category_name"] for entry in entries for metric in entry["metrics"])
+
+    # The remaining statement looks up the authenticated user
+    listing = [statement for statement in statements if not statement.lstrip().startswith("SELECT users.")]
+    assert len(statements) - len(listing) == 1
+    assert len(listing) <= 3, listing
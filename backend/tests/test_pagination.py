@@ -0,0 +1,68 @@
+"""
+Keyset pages list each of the user's rows exactly once, in (created_at, id)
+order, whatever the page size and however many rows share a timestamp.
+"""
+
+from datetime import datetime
+from fastapi.testclient import TestClient
+from backend.core.security import create_access_token
+from backend.models.entry import Entry
+from backend.models.metric import Metric
+from backend.models.user import User
+from backend.main import app
+from backend.services.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+def _post(client, count):
+    response = client.post("/api/v1/entries/", json={
+        "title": "t", "content": "c",
+        "metrics": [{"metric_name": "steps", "value": i, "unit": "n", "category": "walks"} for i in range(count)]
+    })
+    assert response.status_code == 200, response.text
+
+def _pages(client, limit, most=50):
+    pages, cursor = [], None
+    while len(pages) < most:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/v1/metrics/", params=params)
+        assert response.status_code == 200, response.text
+        pages.append([metric["id"] for metric in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+    raise AssertionError(f"Still paging after {most} pages")
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 250000)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+def test_invalid_cursor_is_rejected(client):
+    for cursor in ("not-a-cursor", "e30", encode_cursor(datetime(2026, 3, 1), 1)[:-3]):
+        response = client.get("/api/v1/metrics/", params={"cursor": cursor})
+        assert response.status_code == 400, cursor
+        assert response.json() == {"detail": "Invalid cursor"}
+
+def test_metric_pages_cover_the_users_metrics_once(db, user, client):
+    other = User(email="other@example.com", username="other", password_hash="x", status="active")
+    db.add(other)
+    db.commit()
+    other_client = TestClient(app)
+    other_client.headers["Authorization"] = f"Bearer {create_access_token(other.id)}"
+    for _ in range(3):
+        _post(client, 4)
+        _post(other_client, 3)
+
+    # Rows sharing a timestamp are ordered, and split across pages, by id
+    tied = datetime(2026, 1, 1)
+    db.query(Metric).filter(Metric.id % 3 == 0).update({"created_at": tied}, synchronize_session=False)
+    db.commit()
+    expected = [
+        metric.id for metric in db.query(Metric).join(Entry).filter(Entry.user_id == user.id).order_by(
+            Metric.created_at, Metric.id
+        )
+    ]
+    assert len(expected) == 12
+
+    for limit in (1, 5, 12, 100):
+        pages = _pages(client, limit)
+        assert [metric_id for page in pages for metric_id in page] == expected, limit
+        assert all(len(page) == limit for page in pages[:-1])
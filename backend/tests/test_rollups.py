@@ -0,0 +1,108 @@
+"""
+The daily rollups must always equal a GROUP BY over the raw records, and
+each digest must hold exactly its bucket's values.
+"""
+
+from decimal import Decimal
+from sqlalchemy import func
+from backend.models.entry import Entry
+from backend.models.metric import Metric
+from backend.models.rollup import EntryDailyRollup, MetricDailyRollup
+from backend.models.tag import entry_tags
+from backend.services.rollups import bucket_checksum, parse_day
+from backend.services.sketches import TDigest
+
+def _metric_rollups(db, user_id):
+    return {
+        (r.day, r.category_id, r.metric_name): (
+            r.record_count, Decimal(r.value_sum), Decimal(r.value_min), Decimal(r.value_max), r.value_checksum,
+            TDigest.from_json(r.digest).count
+        )
+        for r in db.query(MetricDailyRollup).filter(MetricDailyRollup.user_id == user_id)
+    }
+
+def _grouped_metrics(db, user_id):
+    day = func.date(Metric.created_at)
+    rows = db.query(
+        day.label("day"),
+        Metric.category_id,
+        Metric.metric_name,
+        func.count(Metric.id).label("count"),
+        func.sum(Metric.value).label("total"),
+        func.min(Metric.value).label("low"),
+        func.max(Metric.value).label("high")
+    ).join(Entry).filter(Entry.user_id == user_id).group_by(day, Metric.category_id, Metric.metric_name)
+    buckets = {}
+    for metric in db.query(Metric.id, Metric.value, Metric.created_at, Metric.category_id, Metric.metric_name).join(
+        Entry
+    ).filter(Entry.user_id == user_id):
+        buckets.setdefault((metric.created_at.date(), metric.category_id, metric.metric_name), []).append(metric)
+    return {
+        (parse_day(r.day), r.category_id, r.metric_name): (
+            r.count, Decimal(str(r.total)).quantize(Decimal("0.01")), Decimal(str(r.low)), Decimal(str(r.high)),
+            bucket_checksum(buckets[(parse_day(r.day), r.category_id, r.metric_name)]),
+            r.count
+        )
+        for r in rows
+    }
+
+def _entry_rollups(db, user_id):
+    return {
+        r.day: (r.entry_count, r.tag_count)
+        for r in db.query(EntryDailyRollup).filter(EntryDailyRollup.user_id == user_id)
+    }
+
+def _grouped_entries(db, user_id):
+    day = func.date(Entry.created_at)
+    links = func.count(entry_tags.c.tag_id)
+    rows = db.query(
+        day.label("day"),
+        func.count(func.distinct(Entry.id)).label("entries"),
+        links.label("links")
+    ).outerjoin(entry_tags, entry_tags.c.entry_id == Entry.id).filter(
+        Entry.user_id == user_id
+    ).group_by(day)
+    return {parse_day(r.day): (r.entries, r.links) for r in rows}
+
+def _assert_consistent(db, user_id):
+    db.expire_all()
+    assert _metric_rollups(db, user_id) == _grouped_metrics(db, user_id)
+    assert _entry_rollups(db, user_id) == _grouped_entries(db, user_id)
+
+def test_rollups_match_raw_records_after_writes(client, db, user):
+    metrics = [
+        {"metric_name": "weight", "value": 70.5, "unit": "kg", "category": "health"},
+        {"metric_name": "weight", "value": 71.25, "unit": "kg", "category": "health"},
+        {"metric_name": "steps", "value": 5000, "unit": "steps"}
+    ]
+    first = client.post("/api/v1/entries/", json={
+        "title": "first", "content": "c", "tags": ["a", "b"],
+        "created_at": "2026-01-02T08:00:00", "metrics": metrics
+    })
+    assert first.status_code == 200, first.text
+    second = client.post("/api/v1/entries/", json={
+        "title": "second", "content": "c", "tags": ["a"],
+        "created_at": "2026-01-02T20:00:00", "metrics": metrics[:1]
+    })
+    assert second.status_code == 200, second.text
+    _assert_consistent(db, user.id)
+
+    updated = client.put(f"/api/v1/entries/{first.json()['id']}", json={
+        "tags": ["c"],
+        "created_at": "2026-01-03T08:00:00",
+        "metrics": [{"metric_name": "weight", "value": 69.75, "unit": "kg", "category": "health"}]
+    })
+    assert updated.status_code == 200, updated.text
+    _assert_consistent(db, user.id)
+
+    metric_id = second.json()["metrics"][0]["id"]
+    assert client.put(f"/api/v1/metrics/{metric_id}", json={"value": 80}).status_code == 200
+    added = client.post("/api/v1/metrics/", json={
+        "metric_name": "steps", "value": 1200, "entry_id": second.json()["id"]
+    })
+    assert added.status_code == 200, added.text
+    _assert_consistent(db, user.id)
+
+    assert client.delete(f"/api/v1/metrics/{added.json()['id']}").status_code == 200
+    assert client.delete(f"/api/v1/entries/{second.json()['id']}").status_code == 200
+    _assert_consistent(db, user.id)
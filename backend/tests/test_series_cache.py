@@ -0,0 +1,56 @@
+"""
+The series cache extends its files in place for appended metrics and
+rebuilds them for any other change, however soon after the last refresh.
+"""
+
+import pytest
+from backend.core.config import settings
+from backend.services.series_cache import series_cache
+
+@pytest.fixture
+def load(db, user):
+    def load():
+        db.expire_all()
+        cached = series_cache.load(db, user)
+        manifest = series_cache._read_manifest(user.id)
+        values = {
+            (item.series.category, item.series.metric_name): item.series.values.tolist() for item in cached
+        }
+        return manifest["generation"], values
+    return load
+
+def _post(client, values):
+    response = client.post("/api/v1/entries/", json={
+        "title": "t", "content": "c", "tags": ["a"],
+        "metrics": [{"metric_name": "weight", "value": value, "unit": "kg", "category": "health"} for value in values]
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_appended_metrics_extend_the_cached_series(client, load):
+    _post(client, [70.0])
+    generation, values = load()
+    assert values == {("health", "weight"): [70.0]}
+
+    _post(client, [71.5])
+    assert load() == (generation, {("health", "weight"): [70.0, 71.5]})
+
+    # Writes that touch no metrics keep the files as they are
+    assert client.post("/api/v1/entries/", json={"title": "t", "content": "c", "tags": ["b"]}).status_code == 200
+    assert load() == (generation, {("health", "weight"): [70.0, 71.5]})
+
+def test_edits_rebuild_the_cached_series(client, load):
+    entry = _post(client, [70.0, 72.0])
+    generation, _ = load()
+
+    # Edited within the same second as the refresh, so updated_at cannot tell
+    metric_id = entry["metrics"][0]["id"]
+    assert client.put(f"/api/v1/metrics/{metric_id}", json={"value": 70.25}).status_code == 200
+    edited, values = load()
+    assert edited != generation
+    assert values == {("health", "weight"): [70.25, 72.0]}
+
+    assert client.delete(f"/api/v1/metrics/{metric_id}").status_code == 200
+    deleted, values = load()
+    assert deleted != edited
+    assert values == {("health", "weight"): [72.0]}